@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Addon, AddonScreenshot, AddonVideo
+from django.utils.timezone import now
+from .jobs import enqueue
+from .models import Addon, AddonPack, AddonScreenshot, AddonVideo
 
 
 class AddonScreenshotInline(admin.TabularInline):
@@ -14,13 +16,25 @@ class AddonVideoInline(admin.TabularInline):
     fields = ['video_type', 'video_file', 'video_url', 'thumbnail', 'caption', 'order']
 
 
+class AddonPackInline(admin.TabularInline):
+    """manifest.json から読み取ったパック（読み取り専用）"""
+    model = AddonPack
+    extra = 0
+    can_delete = False
+    fields = ['path', 'name', 'uuid', 'version', 'pack_type', 'min_engine_version']
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Addon)
 class AddonAdmin(admin.ModelAdmin):
-    list_display = ['name', 'addon_type', 'version', 'author', 'owner', 'downloads', 'published', 'created_at']
-    list_filter = ['addon_type', 'published', 'created_at']
+    list_display = ['name', 'addon_type', 'version', 'author', 'owner', 'downloads', 'published', 'media_status', 'created_at']
+    list_filter = ['addon_type', 'published', 'media_status', 'created_at']
     search_fields = ['name', 'author', 'description']
     prepopulated_fields = {'slug': ('name',)}
-    readonly_fields = ['downloads', 'likes', 'created_at', 'updated_at']
+    readonly_fields = ['downloads', 'likes', 'popularity_score', 'trending_score', 'media_status', 'created_at', 'updated_at']
     
     fieldsets = (
         ('基本情報', {
@@ -33,10 +47,10 @@ class AddonAdmin(admin.ModelAdmin):
             'fields': ('version', 'minecraft_version')
         }),
         ('メディア', {
-            'fields': ('thumbnail', 'download_file')
+            'fields': ('thumbnail', 'download_file', 'media_status')
         }),
         ('統計', {
-            'fields': ('downloads', 'likes'),
+            'fields': ('downloads', 'likes', 'popularity_score', 'trending_score'),
             'classes': ('collapse',)
         }),
         ('公開設定', {
@@ -44,12 +58,12 @@ class AddonAdmin(admin.ModelAdmin):
         }),
     )
     
-    inlines = [AddonScreenshotInline, AddonVideoInline]
+    inlines = [AddonScreenshotInline, AddonVideoInline, AddonPackInline]
 
 
 @admin.register(AddonScreenshot)
 class AddonScreenshotAdmin(admin.ModelAdmin):
-    list_display = ['addon', 'caption', 'order']
+    list_display = ['addon', 'caption', 'order', 'media_status']
     list_filter = ['addon']
     search_fields = ['addon__name', 'caption']
     ordering = ['addon', 'order']
@@ -57,7 +71,7 @@ class AddonScreenshotAdmin(admin.ModelAdmin):
 
 @admin.register(AddonVideo)
 class AddonVideoAdmin(admin.ModelAdmin):
-    list_display = ['addon', 'video_type', 'caption', 'order']
+    list_display = ['addon', 'video_type', 'caption', 'order', 'media_status']
     list_filter = ['addon', 'video_type']
     search_fields = ['addon__name', 'caption']
     ordering = ['addon', 'order']
@@ -108,9 +122,10 @@ from .models import BanRecord
 
 @admin.register(BanRecord)
 class BanRecordAdmin(admin.ModelAdmin):
-    list_display = ['user', 'banned_by', 'reason', 'created_at', 'expires_at']
+    list_display = ['user', 'banned_by', 'reason', 'created_at', 'expires_at', 'processed_at']
     search_fields = ['user__username', 'banned_by__username', 'reason']
     list_filter = ['created_at']
+    readonly_fields = ['processed_at']
 
 
 from .models import TermsPage, Report
@@ -272,3 +287,58 @@ class WikiAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['task', 'status', 'attempts', 'max_attempts', 'run_after', 'created_at', 'finished_at']
+    list_filter = ['status', 'task']
+    search_fields = ['task', 'last_error']
+    readonly_fields = ['attempts', 'locked_at', 'last_error', 'created_at', 'finished_at']
+    actions = ['retry_jobs']
+
+    @admin.action(description='選択したジョブを再実行する')
+    def retry_jobs(self, request, queryset):
+        updated = queryset.exclude(status='running').update(status='pending', attempts=0, run_after=now(), finished_at=None)
+        self.message_user(request, f'{updated} 件のジョブを再実行待ちにしました')
+
+
+from .models import StoredBlob
+
+
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    list_display = ['sha256', 'name', 'size', 'ref_count', 'created_at']
+    search_fields = ['sha256', 'name']
+    readonly_fields = ['sha256', 'name', 'size', 'ref_count', 'created_at']
+
+
+from .models import ScheduledRun
+
+
+@admin.register(ScheduledRun)
+class ScheduledRunAdmin(admin.ModelAdmin):
+    list_display = ['name', 'scheduled_for', 'status', 'started_at', 'duration']
+    list_filter = ['status', 'name']
+    readonly_fields = ['name', 'scheduled_for', 'status', 'started_at', 'finished_at', 'output', 'error']
+
+
+from .models import OutboundEmail
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'from_email', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['subject', 'to', 'last_error']
+    readonly_fields = ['reply', 'attempts', 'locked_at', 'last_error', 'created_at', 'sent_at']
+    actions = ['resend_emails']
+
+    @admin.action(description='選択したメールを送り直す')
+    def resend_emails(self, request, queryset):
+        updated = queryset.exclude(status='sending').update(status='pending', attempts=0, next_attempt_at=now(), sent_at=None)
+        enqueue('send_queued_mail')
+        self.message_user(request, f'{updated} 件のメールを送信待ちにしました')
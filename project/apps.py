@@ -5,3 +5,7 @@ class ProjectConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'project'
     verbose_name = 'Minecraft アドオン配布'
+
+    def ready(self):
+        # シグナルハンドラを登録する
+        from . import signals  # noqa: F401
@@ -1,8 +1,6 @@
 from django.contrib.auth.backends import ModelBackend
-from django.utils.timezone import now
-from django.db.models import Q
 
-from .models import BanRecord
+from . import bans
 
 
 class BanProtectBackend(ModelBackend):
@@ -17,10 +15,5 @@ class BanProtectBackend(ModelBackend):
         if not super().user_can_authenticate(user):
             return False
 
-        # BanRecord が存在してかつ現在有効であればログイン不可
-        now_dt = now()
-        has_active_ban = BanRecord.objects.filter(
-            user=user
-        ).filter(Q(expires_at__isnull=True) | Q(expires_at__gt=now_dt)).exists()
-
-        return not has_active_ban
+        # 有効な BAN があればログイン不可（期限はキャッシュから引く。project/bans.py を参照）
+        return not bans.is_banned(user.pk)
@@ -0,0 +1,66 @@
+"""ユーザーごとの有効な BAN の期限をキャッシュする（ログインのたびに BanRecord を検索しないように）。
+
+キャッシュの値は「有効な BAN が無い」(0)、「永久 BAN」(PERMANENT)、または BAN が切れる時刻（UNIX 時間）。
+期限はキャッシュに入っているので、期限切れになったかどうかは DB を見ずに判定できる。
+BanRecord の保存・削除時（シグナル）と、update() で期限を書き換えたときに invalidate() で捨てる。
+
+invalidate() は他のプロセスのキャッシュには届かないので、プロセスごとのキャッシュ（REDIS_URL が無いとき）では
+BAN_CACHE_TIMEOUT を短く（既定 60 秒）して、他のプロセスで変えた BAN もその秒数で反映されるようにする。
+BAN するときはユーザーの is_active も False にするので、古いキャッシュで BAN 済みのユーザーが通ることは無い。
+BAN_CACHE_TIMEOUT が 0 なら毎回 BanRecord を検索する。
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Q
+from django.utils.timezone import now
+
+CACHE_PREFIX = 'ban-expiry'
+NOT_BANNED = 0
+PERMANENT = -1
+
+
+def _cache_key(user_id):
+    return f'{CACHE_PREFIX}:{user_id}'
+
+
+def active_q(at=None):
+    """at（省略時は今）の時点で有効な BanRecord の条件。"""
+    return Q(expires_at__isnull=True) | Q(expires_at__gt=at or now())
+
+
+def _load_expiry(user_id):
+    from .models import BanRecord
+
+    active = BanRecord.objects.filter(user_id=user_id).filter(active_q())
+    result = active.aggregate(permanent=Count('pk', filter=Q(expires_at__isnull=True)), latest=Max('expires_at'))
+    if result['permanent']:
+        return PERMANENT
+    return result['latest'].timestamp() if result['latest'] else NOT_BANNED
+
+
+def active_ban_expiry(user_id):
+    """有効な BAN の期限（UNIX 時間）。永久 BAN なら PERMANENT、BAN されていなければ NOT_BANNED。"""
+    timeout = getattr(settings, 'BAN_CACHE_TIMEOUT', 0)
+    if not timeout:
+        return _load_expiry(user_id)
+    key = _cache_key(user_id)
+    expiry = cache.get(key)
+    if expiry is None:
+        expiry = _load_expiry(user_id)
+        cache.set(key, expiry, timeout)
+    return expiry
+
+
+def is_banned(user_id):
+    expiry = active_ban_expiry(user_id)
+    return expiry == PERMANENT or expiry > time.time()
+
+
+def invalidate(user_id):
+    cache.delete(_cache_key(user_id))
+
+
+def invalidate_many(user_ids):
+    cache.delete_many([_cache_key(user_id) for user_id in user_ids])
@@ -0,0 +1,234 @@
+"""主要なページのベンチマーク（`manage.py benchmark`）。
+
+- client: Django のテストクライアントで 1 リクエストずつ実行し、処理時間と SQL 件数を測る
+- http  : 起動中のサーバー（または --gunicorn で起動したローカルの gunicorn）に複数スレッドで負荷をかけ、
+          処理時間とスループットを測る（SQL 件数は別プロセスなので測らない）
+
+対象の URL は random.Random(seed) で選ぶので、同じデータ・同じ seed なら同じ順に同じ URL を叩く。
+結果は JSON に保存でき、--compare で前回の結果と比べられる。
+"""
+import http.client
+import json
+import math
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+from django.utils.encoding import iri_to_uri
+
+from .metrics import RequestMetrics
+from .models import Addon, Comment, Wiki
+
+ENDPOINTS = ('home', 'addon_list', 'addon_detail', 'download_addon')
+# download_addon は本物のダウンロードとして数えられる（ダウンロード数・サイト統計・ランキングに入る）ので、
+# 既定では測らない。--endpoints で指定したときも DEBUG=True の環境でしか測らない
+DEFAULT_ENDPOINTS = ('home', 'addon_list', 'addon_detail')
+COUNTING_ENDPOINTS = {'download_addon'}
+LIST_QUERIES = ['', '?type=behavior', '?type=resource', '?page=2', '?page=50', '?sort=downloads', '?sort=trending', '?sort=name', '?q=block', '?q=ダンジョン']
+
+
+def build_targets(seed=1, per_endpoint=200, endpoints=DEFAULT_ENDPOINTS):
+    """{エンドポイント名: [URL, ...]} を作る。"""
+    rng = random.Random(seed)
+    slugs = list(Addon.objects.filter(published=True).order_by('pk').values_list('slug', flat=True))
+    if not slugs and {'addon_detail', 'download_addon'} & set(endpoints):
+        raise ValueError('公開中のアドオンがありません（--seed-addons でデータを作ってください）')
+    targets = {}
+    for name in endpoints:
+        if name == 'home':
+            urls = [reverse('home')] * per_endpoint
+        elif name == 'addon_list':
+            urls = [iri_to_uri(reverse('addon_list') + rng.choice(LIST_QUERIES)) for _ in range(per_endpoint)]
+        elif name == 'addon_detail':
+            urls = [reverse('addon_detail', args=[rng.choice(slugs)]) for _ in range(per_endpoint)]
+        elif name == 'download_addon':
+            urls = [reverse('download_addon', args=[rng.choice(slugs)]) for _ in range(per_endpoint)]
+        else:
+            raise ValueError(f'未対応のエンドポイントです: {name}')
+        targets[name] = urls
+    return targets
+
+
+def percentile(values, p):
+    """values（昇順）の p パーセンタイル（最近傍順位法）。"""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def summarize(endpoint, mode, latencies, errors, elapsed, queries=None):
+    latencies = sorted(latencies)
+    result = {
+        'endpoint': endpoint,
+        'mode': mode,
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+    }
+    if queries is not None:
+        result['avg_queries'] = round(sum(queries) / len(queries), 2) if queries else 0.0
+        result['max_queries'] = max(queries, default=0)
+    return result
+
+
+def default_host():
+    """リクエストの Host ヘッダー（ALLOWED_HOSTS のうち最初の具体的なホスト名）。"""
+    return next((h for h in settings.ALLOWED_HOSTS if h and '*' not in h and not h.startswith('.')), 'localhost')
+
+
+def run_client(targets, warmup=5, user=None):
+    """テストクライアントで順番に実行する。user を渡すとログインした状態で実行する（ページキャッシュを通らない）。"""
+    client = Client(HTTP_HOST=default_host())
+    if user is not None:
+        client.force_login(user)
+    results = []
+    for endpoint, urls in targets.items():
+        for url in urls[:warmup]:
+            _consume(client.get(url))
+        latencies, queries = [], []
+        errors = 0
+        started = time.perf_counter()
+        for url in urls:
+            request_metrics = RequestMetrics()
+            begin = time.perf_counter()
+            with connection.execute_wrapper(request_metrics):
+                response = client.get(url)
+                _consume(response)
+            latencies.append(time.perf_counter() - begin)
+            queries.append(request_metrics.queries)
+            errors += response.status_code >= 400
+        results.append(summarize(endpoint, 'client', latencies, errors, time.perf_counter() - started, queries))
+    return results
+
+
+def _consume(response):
+    # ファイルの配信はストリーミングなので、最後まで読んで閉じる
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    response.close()
+
+
+def _http_get(base, host, path):
+    parts = urlsplit(base)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    try:
+        conn.request('GET', path, headers={'Host': host})
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def run_http(targets, base_url, concurrency=8, duration=10.0, host=None):
+    """base_url のサーバーに concurrency 本のスレッドで duration 秒ずつ負荷をかける。"""
+    host = host or urlsplit(base_url).netloc
+    results = []
+    for endpoint, urls in targets.items():
+        latencies = []
+        errors = [0]
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+
+        def worker(offset):
+            i = offset
+            local, local_errors = [], 0
+            while time.perf_counter() < deadline:
+                begin = time.perf_counter()
+                try:
+                    status = _http_get(base_url, host, urls[i % len(urls)])
+                except OSError:
+                    status = 599
+                local.append(time.perf_counter() - begin)
+                local_errors += status >= 400
+                i += concurrency
+            with lock:
+                latencies.extend(local)
+                errors[0] += local_errors
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, range(concurrency)))
+        results.append(summarize(endpoint, 'http', latencies, errors[0], time.perf_counter() - started))
+    return results
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(workers=2, timeout=30):
+    """ローカルに gunicorn を起動する。(プロセス, ベース URL) を返す。"""
+    port = _free_port()
+    # 子プロセスが同じ DB に接続するので、こちらの接続は閉じておく
+    connections.close_all()
+    process = subprocess.Popen([
+        sys.executable, '-m', 'gunicorn', 'project.wsgi:application',
+        '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--log-level', 'warning',
+    ])
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn が起動できませんでした')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('gunicorn の起動を待ちきれませんでした')
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def catalog_size():
+    return {
+        'addons': Addon.objects.count(),
+        'published_addons': Addon.objects.filter(published=True).count(),
+        'comments': Comment.objects.count(),
+        'wiki_pages': Wiki.objects.count(),
+    }
+
+
+def compare(previous, current):
+    """前回の結果と比べた行（エンドポイント・モード・p50/p95 の変化率・SQL 件数の差）を返す。"""
+    before = {(r['mode'], r['endpoint']): r for r in previous.get('results', [])}
+    rows = []
+    for result in current['results']:
+        old = before.get((result['mode'], result['endpoint']))
+        if old is None:
+            continue
+        row = {'endpoint': result['endpoint'], 'mode': result['mode']}
+        for key in ('p50_ms', 'p95_ms', 'throughput_rps'):
+            row[key] = (old[key], result[key], (result[key] - old[key]) / old[key] * 100 if old[key] else 0.0)
+        if 'avg_queries' in result and 'avg_queries' in old:
+            row['avg_queries'] = (old['avg_queries'], result['avg_queries'], result['avg_queries'] - old['avg_queries'])
+        rows.append(row)
+    return rows
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
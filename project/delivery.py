@@ -0,0 +1,248 @@
+"""アップロードファイル（アドオン本体・動画）の配信。
+
+FILE_DELIVERY_BACKEND で送信方法を切り替える:
+  'django'   : FileResponse で gunicorn ワーカーから送信する（デフォルト・フォールバック）
+  'nginx'    : X-Accel-Redirect を返し、転送は nginx の internal location に任せる
+  'sendfile' : X-Sendfile を返す（Apache mod_xsendfile / lighttpd など）
+
+nginx の場合は FILE_DELIVERY_ACCEL_PREFIX を MEDIA_ROOT を指す internal location にしておく:
+
+    location /protected/ {
+        internal;
+        alias /path/to/media/;
+    }
+
+どのバックエンドでも ETag（内容の SHA-256）/ Last-Modified による条件付き GET に対応し、
+'django' バックエンドでは Range（単一・multipart/byteranges）で 206 を返す。
+nginx / sendfile の場合、Range はフロントプロキシ側で処理される。
+"""
+import hashlib
+import mimetypes
+import os
+import secrets
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+from .storage import content_hash
+
+# これを超える数の範囲指定は無視して全体を返す（細切れの Range による負荷対策）
+MAX_RANGES = 16
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _backend():
+    return getattr(settings, 'FILE_DELIVERY_BACKEND', 'django')
+
+
+def _offload_response(fieldfile, filename, as_attachment):
+    """フロントプロキシに転送を任せるレスポンスを作る。対応できない場合は None。"""
+    backend = _backend()
+    if backend == 'nginx':
+        prefix = getattr(settings, 'FILE_DELIVERY_ACCEL_PREFIX', '/protected/')
+        # CAS ストレージ（project.storage）では実体のパスを渡す
+        name = getattr(fieldfile.storage, 'blob_name', lambda name: name)(fieldfile.name)
+        header, value = 'X-Accel-Redirect', prefix.rstrip('/') + '/' + quote(name)
+    elif backend == 'sendfile':
+        try:
+            value = fieldfile.path
+        except NotImplementedError:
+            # ローカルパスを持たないストレージ（S3 等）は Python から送る
+            return None
+        header = 'X-Sendfile'
+    else:
+        return None
+
+    content_type, encoding = mimetypes.guess_type(filename)
+    response = HttpResponse(content_type=content_type or 'application/octet-stream')
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response[header] = value
+    response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    return response
+
+
+def file_sha256(fieldfile):
+    """ストレージ上のファイル内容の SHA-256 を計算する。"""
+    digest = hashlib.sha256()
+    with fieldfile.storage.open(fieldfile.name, 'rb') as f:
+        for chunk in f.chunks(STREAM_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stored_sha256(instance, file_attr, hash_attr):
+    """モデルに保存済みのハッシュを返す。未計算なら計算して保存する。
+
+    CAS ストレージのファイルは名前にハッシュが含まれるので、ファイルを読まずに済む。
+    """
+    value = content_hash(getattr(instance, file_attr).name) or getattr(instance, hash_attr)
+    if not value:
+        value = file_sha256(getattr(instance, file_attr))
+        # auto_now やシグナルを動かさないよう update で保存する
+        type(instance)._default_manager.filter(pk=instance.pk).update(**{hash_attr: value})
+        setattr(instance, hash_attr, value)
+    return value
+
+
+def _last_modified(fieldfile):
+    try:
+        return int(fieldfile.storage.get_modified_time(fieldfile.name).timestamp())
+    except NotImplementedError:
+        return None
+
+
+def parse_range_header(header, size):
+    """Range ヘッダを (start, end) のリストにする（end を含む）。
+
+    書式が不正なら None（ヘッダを無視して全体を返す）、満たせる範囲が無ければ空リストを返す。
+    """
+    unit, sep, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not sep:
+        return None
+    ranges = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, sep, last = part.partition('-')
+        first, last = first.strip(), last.strip()
+        if not sep or (first and not first.isdigit()) or (last and not last.isdigit()):
+            return None
+        if not first:
+            # bytes=-500 は末尾 500 バイト
+            if not last:
+                return None
+            length = int(last)
+            if length:
+                ranges.append((max(0, size - length), size - 1))
+            continue
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start < size:
+            ranges.append((start, min(int(last) if last else size - 1, size - 1)))
+    return ranges
+
+
+def _if_range_passes(request, etag, last_modified):
+    """If-Range が無いか、現在の ETag / Last-Modified と一致すれば True。"""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith(('"', 'W/')):
+        # 弱い ETag は If-Range では一致とみなさない
+        return etag is not None and not if_range.startswith('W/') and if_range == etag
+    since = parse_http_date_safe(if_range)
+    return since is not None and last_modified is not None and last_modified <= since
+
+
+def _read_range(f, start, end):
+    f.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield chunk
+
+
+def _range_response(fieldfile, ranges, size, content_type):
+    """206 Partial Content を返す。範囲が複数なら multipart/byteranges にする。"""
+    f = fieldfile.storage.open(fieldfile.name, 'rb')
+    if len(ranges) == 1:
+        start, end = ranges[0]
+
+        def single():
+            try:
+                yield from _read_range(f, start, end)
+            finally:
+                f.close()
+
+        response = StreamingHttpResponse(single(), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+        return response
+
+    boundary = secrets.token_hex(16)
+    part_headers = [
+        (
+            f'--{boundary}\r\nContent-Type: {content_type}\r\n'
+            f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n'
+        ).encode('ascii')
+        for start, end in ranges
+    ]
+    closing = f'--{boundary}--\r\n'.encode('ascii')
+    length = len(closing) + sum(
+        len(head) + (end - start + 1) + 2 for head, (start, end) in zip(part_headers, ranges)
+    )
+
+    def multipart():
+        try:
+            for head, (start, end) in zip(part_headers, ranges):
+                yield head
+                yield from _read_range(f, start, end)
+                yield b'\r\n'
+            yield closing
+        finally:
+            f.close()
+
+    response = StreamingHttpResponse(
+        multipart(), status=206, content_type=f'multipart/byteranges; boundary={boundary}'
+    )
+    response['Content-Length'] = str(length)
+    return response
+
+
+def serve_file(request, fieldfile, filename=None, as_attachment=False, sha256=None):
+    """FieldFile を設定されたバックエンドで配信する。
+
+    sha256 を渡すと強い ETag として使い、If-None-Match / If-Match / If-Range を評価する。
+    """
+    # ファイル名がパスを含む可能性があるため basename を使う
+    filename = filename or os.path.basename(fieldfile.name)
+    etag = f'"{sha256}"' if sha256 else None
+    last_modified = _last_modified(fieldfile)
+
+    validators = HttpResponse()
+    if etag:
+        validators['ETag'] = etag
+    if last_modified is not None:
+        validators['Last-Modified'] = http_date(last_modified)
+    conditional = get_conditional_response(
+        request, etag=etag, last_modified=last_modified, response=validators
+    )
+    if conditional is not validators:
+        # 304 Not Modified / 412 Precondition Failed
+        return conditional
+
+    response = _offload_response(fieldfile, filename, as_attachment)
+    if response is None:
+        size = fieldfile.size
+        content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        range_header = request.META.get('HTTP_RANGE')
+        ranges = None
+        if range_header and request.method in ('GET', 'HEAD') and _if_range_passes(request, etag, last_modified):
+            ranges = parse_range_header(range_header, size)
+        if ranges is not None and len(ranges) > MAX_RANGES:
+            ranges = None
+        if ranges == []:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if ranges:
+            response = _range_response(fieldfile, ranges, size, content_type)
+            response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+        else:
+            response = FileResponse(fieldfile.open('rb'), as_attachment=as_attachment, filename=filename)
+        response['Accept-Ranges'] = 'bytes'
+
+    for header in ('ETag', 'Last-Modified'):
+        if header in validators:
+            response[header] = validators[header]
+    return response
@@ -0,0 +1,64 @@
+"""ダウンロード数の集計。
+
+download_addon からは record_download() でシャード行に加算するだけにして、
+Addon.downloads への反映は flush_download_counts() でまとめて F() 更新する。
+反映はリクエストの中では行わず、`manage.py flush_downloads`（SCHEDULED_JOBS で 5 分ごとに実行）で行う。
+"""
+import random
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from . import stats
+from .models import Addon, DownloadCounterShard
+
+
+def _shard_count():
+    return max(1, int(getattr(settings, 'DOWNLOAD_COUNTER_SHARDS', 8)))
+
+
+def record_download(addon):
+    """ダウンロード 1 回をランダムなシャードに記録する。Addon 行はロックしない。"""
+    shard = random.randrange(_shard_count())
+    shards = DownloadCounterShard.objects.filter(addon_id=addon.pk, shard=shard)
+    if not shards.update(count=F('count') + 1):
+        try:
+            with transaction.atomic():
+                DownloadCounterShard.objects.create(addon_id=addon.pk, shard=shard, count=1)
+        except IntegrityError:
+            # 別のワーカーが同時にシャード行を作成した場合はそちらに加算する
+            shards.update(count=F('count') + 1)
+
+
+def flush_download_counts(batch_size=500):
+    """シャードに溜まった件数を Addon.downloads に加算する。
+
+    読み取った件数だけをシャードから差し引くので、反映中に加算されたダウンロードも失われない。
+    戻り値は反映したダウンロード数の合計。
+    """
+    flushed = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                DownloadCounterShard.objects.select_for_update()
+                .filter(count__gt=0)
+                .order_by('pk')
+                .values_list('pk', 'addon_id', 'count')[:batch_size]
+            )
+            if not rows:
+                break
+            per_addon = defaultdict(int)
+            for _pk, addon_id, count in rows:
+                per_addon[addon_id] += count
+            # デッドロックを避けるため常に id 順で更新する
+            for addon_id in sorted(per_addon):
+                Addon.objects.filter(pk=addon_id).update(downloads=F('downloads') + per_addon[addon_id])
+            for pk, _addon_id, count in rows:
+                DownloadCounterShard.objects.filter(pk=pk).update(count=F('count') - count)
+            stats.add_downloads(per_addon)
+            flushed += sum(per_addon.values())
+        if len(rows) < batch_size:
+            break
+    return flushed
@@ -4,6 +4,8 @@ from tinymce.widgets import TinyMCE
 
 
 class AddonForm(forms.ModelForm):
+    upload_session = forms.UUIDField(required=False, widget=forms.HiddenInput)
+
     class Meta:
         model = Addon
         fields = [
@@ -15,6 +17,13 @@ class AddonForm(forms.ModelForm):
             'long_description': TinyMCE(attrs={'cols': 80, 'rows': 10}),
         }
 
+    def __init__(self, *args, upload_sessions=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 分割アップロード（project/uploads.py）したファイルはこのセッションの ID で受け取る
+        self.upload_sessions = upload_sessions
+        self.upload_session = None
+        self.fields['download_file'].required = False
+
     def clean_slug(self):
         # slug が空文字列の場合は None にして自動生成させる
         slug = self.cleaned_data.get('slug')
@@ -22,6 +31,23 @@ class AddonForm(forms.ModelForm):
             return None
         return slug
 
+    def clean(self):
+        cleaned_data = super().clean()
+        session_id = cleaned_data.get('upload_session')
+        if session_id:
+            session = None
+            if self.upload_sessions is not None:
+                session = self.upload_sessions.filter(pk=session_id, status='complete').exclude(stored_file='').first()
+            if session is None:
+                self.add_error('download_file', 'アップロードが見つからないか、まだ完了していません。')
+            else:
+                self.upload_session = session
+                # ファイルはワーカーが保存済みなので、名前を入れるだけ（ここでは開かない）
+                cleaned_data['download_file'] = session.stored_file
+        elif not cleaned_data.get('download_file') and not self.instance.download_file:
+            self.add_error('download_file', 'このフィールドは必須です。')
+        return cleaned_data
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
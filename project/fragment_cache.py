@@ -0,0 +1,66 @@
+"""アドオン詳細ページの断片キャッシュ。
+
+説明・スクリーンショット・動画やコメントの 1 ページ目など、閲覧者に依存しない部分の HTML を
+キャッシュする。キーは「アドオン id + updated_at + コメント数 + メディア処理の状態 + 世代」で、
+スクリーンショット・動画・コメントの保存/削除時にはシグナルから Addon.fragment_version を上げて無効化する。
+世代は DB に持つので、キャッシュがプロセスごと（LocMemCache）でも全プロセスで古い断片が使われなくなる。
+ヒット/ミス数は stats() で取得できる（管理コンソールの /cachestats）。
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+KEY_PREFIX = 'addon-fragment'
+HITS_KEY = f'{KEY_PREFIX}:stats:hits'
+MISSES_KEY = f'{KEY_PREFIX}:stats:misses'
+
+
+def invalidate(addon_id):
+    """アドオンの断片キャッシュをすべて無効にする。"""
+    from .models import Addon
+
+    Addon.objects.filter(pk=addon_id).update(fragment_version=F('fragment_version') + 1)
+
+
+def fragment_key(addon, name):
+    updated = int(addon.updated_at.timestamp() * 1_000_000)
+    return (
+        f'{KEY_PREFIX}:{addon.pk}:{name}:{updated}:{addon.comment_count}:'
+        f'{addon.media_status}:{addon.fragment_version}'
+    )
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def get_or_render(addon, name, render):
+    """キャッシュ済みの断片を返す。無ければ render() の結果を保存して返す。"""
+    timeout = getattr(settings, 'ADDON_FRAGMENT_CACHE_TIMEOUT', 3600)
+    if not timeout:
+        return render()
+    key = fragment_key(addon, name)
+    content = cache.get(key)
+    if content is not None:
+        _count(HITS_KEY)
+        return content
+    _count(MISSES_KEY)
+    content = render()
+    cache.set(key, content, timeout)
+    return content
+
+
+def stats():
+    """{'hits', 'misses', 'hit_ratio'} を返す。"""
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_ratio': hits / total if total else 0.0}
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
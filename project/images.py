@@ -0,0 +1,110 @@
+"""アップロード画像の派生画像（縮小版・WebP）の生成。
+
+元画像 `dir/name.png` に対して、IMAGE_DERIVATIVE_SIZES の幅ごとに
+`dir/derivatives/name_<サイズ名>.jpg`（透過画像は .png）と `.webp` を作り、
+`dir/derivatives/name.json` に一覧（マニフェスト）を書く。元画像より大きいサイズは作らない。
+テンプレートでは media_tags の {% responsive_image %} が srcset 付きの <picture> を出力する。
+"""
+import json
+import logging
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = {'card': 400, 'detail': 1024, 'full': 1920}
+CACHE_PREFIX = 'image-derivatives'
+
+
+def derivative_sizes():
+    """{サイズ名: 幅} を幅の小さい順に返す。"""
+    sizes = getattr(settings, 'IMAGE_DERIVATIVE_SIZES', DEFAULT_SIZES)
+    return dict(sorted(sizes.items(), key=lambda item: item[1]))
+
+
+def _derivative_path(name, suffix):
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, 'derivatives', f'{stem}{suffix}')
+
+
+def _cache_key(name):
+    return f'{CACHE_PREFIX}:{name}'
+
+
+def _write(storage, name, data):
+    # 同名ファイルがあると別名で保存されてしまうので先に消す
+    if storage.exists(name):
+        storage.delete(name)
+    storage.save(name, ContentFile(data))
+
+
+def _encode(image, image_format, **options):
+    buffer = BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return buffer.getvalue()
+
+
+def generate_derivatives(fieldfile):
+    """派生画像を生成してマニフェストを返す。画像として読めない・アニメーション画像なら None。"""
+    storage = fieldfile.storage
+    # ファイルが読めない場合の例外はそのまま投げる（ジョブとして再実行される）
+    with storage.open(fieldfile.name, 'rb') as f:
+        try:
+            with Image.open(f) as original:
+                if getattr(original, 'is_animated', False):
+                    return None
+                image = ImageOps.exif_transpose(original)
+                has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+                image = image.convert('RGBA' if has_alpha else 'RGB')
+        except (UnidentifiedImageError, OSError):
+            logger.warning('派生画像を生成できませんでした: %s', fieldfile.name, exc_info=True)
+            return None
+
+    fallback_ext, fallback_format = ('png', 'PNG') if has_alpha else ('jpg', 'JPEG')
+    manifest = {}
+    for size_name, width in derivative_sizes().items():
+        resized = image.copy()
+        resized.thumbnail((width, width * 10), Image.Resampling.LANCZOS)
+        fallback = _derivative_path(fieldfile.name, f'_{size_name}.{fallback_ext}')
+        webp = _derivative_path(fieldfile.name, f'_{size_name}.webp')
+        if fallback_format == 'JPEG':
+            _write(storage, fallback, _encode(resized, 'JPEG', quality=82, optimize=True, progressive=True))
+        else:
+            _write(storage, fallback, _encode(resized, 'PNG', optimize=True))
+        _write(storage, webp, _encode(resized, 'WEBP', quality=80, method=4))
+        manifest[size_name] = {'width': resized.width, 'fallback': fallback, 'webp': webp}
+        if width >= image.width:
+            # 元画像より大きいサイズは作らない
+            break
+
+    _write(storage, _derivative_path(fieldfile.name, '.json'), json.dumps(manifest).encode())
+    cache.set(_cache_key(fieldfile.name), manifest, None)
+    return manifest
+
+
+def load_manifest(fieldfile):
+    """生成済みの派生画像のマニフェスト。未生成なら空の dict。"""
+    if not fieldfile:
+        return {}
+    manifest = cache.get(_cache_key(fieldfile.name))
+    if manifest is None:
+        path = _derivative_path(fieldfile.name, '.json')
+        try:
+            with fieldfile.storage.open(path, 'rb') as f:
+                manifest = json.loads(f.read())
+        except (FileNotFoundError, ValueError):
+            manifest = {}
+        cache.set(_cache_key(fieldfile.name), manifest, None if manifest else 60)
+    return manifest
+
+
+def ensure_derivatives(fieldfile):
+    """派生画像が未生成なら生成する（project.tasks.process_media から呼ばれる）。"""
+    if fieldfile and not load_manifest(fieldfile):
+        generate_derivatives(fieldfile)
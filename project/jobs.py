@@ -0,0 +1,149 @@
+"""DB をキューにした簡易ジョブ実行の仕組み（外部のブローカーは使わない）。
+
+タスクは @task で登録し、`some_task.delay(**payload)` か `enqueue(name, **payload)` で Job 行を作る。
+Job 行は呼び出し元と同じトランザクションで作られるので、ロールバックされればジョブも消える。
+`manage.py run_jobs` が実行予定のジョブを取り出してプロセスプールで実行する。
+
+JOB_QUEUE_ASYNC=False のときはキューを使わず、コミット後にその場で実行する（開発用）。
+
+ワーカーのプロセスはこのモジュールを読み込んでから django.setup() するので、
+モデルは関数の中で import すること。
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+def task(name, on_failure=None):
+    """関数をタスクとして登録するデコレータ。
+
+    on_failure は最大回数まで失敗したときに同じ引数で呼ばれる。
+    """
+    def decorator(func):
+        TASKS[name] = func
+        func.task_name = name
+        func.on_failure = on_failure
+        func.delay = lambda **payload: enqueue(name, **payload)
+        return func
+    return decorator
+
+
+def enqueue(name, delay=0, **payload):
+    """ジョブを登録する。同じタスク・引数のジョブが待機中ならそれを返す。"""
+    from .models import Job
+
+    if not getattr(settings, 'JOB_QUEUE_ASYNC', True):
+        transaction.on_commit(lambda: _run_inline(name, payload))
+        return None
+    existing = Job.objects.filter(task=name, payload=payload, status='pending').first()
+    if existing is not None:
+        return existing
+    return Job.objects.create(
+        task=name,
+        payload=payload,
+        max_attempts=getattr(settings, 'JOB_MAX_ATTEMPTS', 5),
+        run_after=now() + timedelta(seconds=delay),
+    )
+
+
+def _run_inline(name, payload):
+    try:
+        TASKS[name](**payload)
+    except Exception:
+        logger.exception('ジョブ %s の実行に失敗しました: %s', name, payload)
+        func = TASKS.get(name)
+        if func is not None and func.on_failure:
+            func.on_failure(**payload)
+
+
+def retry_delay(attempts):
+    """attempts 回目の失敗後、次に実行するまでの秒数（指数バックオフ）。"""
+    return getattr(settings, 'JOB_RETRY_BACKOFF', 30) * 2 ** (attempts - 1)
+
+
+def claim_jobs(limit):
+    """実行予定のジョブを最大 limit 件取り出して実行中にし、その ID を返す。
+
+    状態が pending のままのときだけ更新するので、複数のワーカーが同時に動いても
+    同じジョブを二重に実行しない。
+    """
+    from .models import Job
+
+    candidates = (
+        Job.objects.filter(status='pending', run_after__lte=now())
+        .order_by('run_after', 'pk')
+        .values_list('pk', flat=True)[:limit]
+    )
+    claimed = []
+    for pk in list(candidates):
+        updated = Job.objects.filter(pk=pk, status='pending').update(
+            status='running', locked_at=now(), attempts=F('attempts') + 1,
+        )
+        if updated:
+            claimed.append(pk)
+    return claimed
+
+
+def release_stale_jobs():
+    """JOB_TIMEOUT 秒以上実行中のまま（ワーカーが落ちたなど）のジョブを待機中に戻す。"""
+    from .models import Job
+
+    timeout = getattr(settings, 'JOB_TIMEOUT', 600)
+    return Job.objects.filter(status='running', locked_at__lt=now() - timedelta(seconds=timeout)).update(
+        status='pending', locked_at=None,
+    )
+
+
+def purge_finished_jobs(days=None):
+    """完了してから days 日以上経ったジョブを削除する。"""
+    from .models import Job
+
+    days = getattr(settings, 'JOB_RETENTION_DAYS', 7) if days is None else days
+    deleted, _ = Job.objects.filter(status='done', finished_at__lt=now() - timedelta(days=days)).delete()
+    return deleted
+
+
+def init_worker():
+    """ワーカープロセスの初期化（ProcessPoolExecutor の initializer）。"""
+    import django
+    django.setup()
+
+
+def run_job(pk):
+    """ジョブを 1 件実行する。成功したら True。ワーカープロセスの中で呼ばれる。"""
+    from .models import Job
+
+    close_old_connections()
+    job = Job.objects.get(pk=pk)
+    func = TASKS.get(job.task)
+    try:
+        if func is None:
+            raise LookupError(f'未登録のタスクです: {job.task}')
+        func(**job.payload)
+    except Exception:
+        logger.exception('ジョブ %s の実行に失敗しました', job)
+        error = traceback.format_exc()[-4000:]
+        if func is None or job.attempts >= job.max_attempts:
+            Job.objects.filter(pk=pk).update(status='failed', last_error=error, locked_at=None, finished_at=now())
+            if func is not None and func.on_failure:
+                func.on_failure(**job.payload)
+        else:
+            Job.objects.filter(pk=pk).update(
+                status='pending', last_error=error, locked_at=None,
+                run_after=now() + timedelta(seconds=retry_delay(job.attempts)),
+            )
+        return False
+    else:
+        Job.objects.filter(pk=pk).update(status='done', locked_at=None, finished_at=now())
+        return True
+    finally:
+        close_old_connections()
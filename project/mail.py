@@ -0,0 +1,119 @@
+"""送信メールのキュー。
+
+メールはリクエストの中では送らず OutboundEmail の行にして、ワーカー（run_jobs の send_queued_mail タスク、
+または定期実行の `manage.py send_queued_mail`）が 1 つの接続でまとめて送る。
+失敗したメールは間隔を空けて max_attempts 回まで送り直す。
+
+ローカルで試すときは手元の SMTP サーバー（`python -m aiosmtpd -n -l localhost:1025` など）に向ける:
+
+    EMAIL_BACKEND=django.core.mail.backends.smtp.EmailBackend EMAIL_HOST=localhost EMAIL_PORT=1025
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F
+from django.utils.timezone import now
+
+from .jobs import enqueue
+
+logger = logging.getLogger(__name__)
+
+
+def queue_mail(subject, body, recipients, from_email=None, reply=None):
+    """メールを送信キューに入れる。呼び出し元のトランザクションがコミットされたら送られる。"""
+    from .models import OutboundEmail
+
+    email = OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(recipients),
+        reply=reply,
+        max_attempts=getattr(settings, 'MAIL_MAX_ATTEMPTS', 5),
+    )
+    enqueue('send_queued_mail')
+    return email
+
+
+def retry_delay(attempts):
+    """attempts 回目の失敗後、次に送るまでの秒数（指数バックオフ）。"""
+    return getattr(settings, 'MAIL_RETRY_BACKOFF', 60) * 2 ** (attempts - 1)
+
+
+def claim_batch(limit):
+    """送信予定のメールを最大 limit 件取り出して送信中にし、その ID を返す（jobs.claim_jobs と同じ方法）。"""
+    from .models import OutboundEmail
+
+    candidates = (
+        OutboundEmail.objects.filter(status='pending', next_attempt_at__lte=now())
+        .order_by('next_attempt_at', 'pk')
+        .values_list('pk', flat=True)[:limit]
+    )
+    claimed = []
+    for pk in list(candidates):
+        updated = OutboundEmail.objects.filter(pk=pk, status='pending').update(
+            status='sending', locked_at=now(), attempts=F('attempts') + 1,
+        )
+        if updated:
+            claimed.append(pk)
+    return claimed
+
+
+def release_stale():
+    """MAIL_SEND_TIMEOUT 秒以上送信中のまま（ワーカーが落ちたなど）のメールを送信待ちに戻す。"""
+    from .models import OutboundEmail
+
+    timeout = getattr(settings, 'MAIL_SEND_TIMEOUT', 300)
+    return OutboundEmail.objects.filter(status='sending', locked_at__lt=now() - timedelta(seconds=timeout)).update(
+        status='pending', locked_at=None,
+    )
+
+
+def _mark_failed(email, error):
+    from .models import OutboundEmail
+
+    if email.attempts >= email.max_attempts:
+        OutboundEmail.objects.filter(pk=email.pk).update(status='failed', last_error=error, locked_at=None)
+    else:
+        OutboundEmail.objects.filter(pk=email.pk).update(
+            status='pending', last_error=error, locked_at=None,
+            next_attempt_at=now() + timedelta(seconds=retry_delay(email.attempts)),
+        )
+
+
+def send_queued(batch_size=None):
+    """送信予定のメールを batch_size 件ずつ、同じ接続を使い回して送る。(送信数, 失敗数) を返す。"""
+    from .models import OutboundEmail
+
+    batch_size = batch_size or getattr(settings, 'MAIL_BATCH_SIZE', 50)
+    release_stale()
+    sent = failed = 0
+    connection = get_connection()
+    try:
+        while True:
+            claimed = claim_batch(batch_size)
+            if not claimed:
+                break
+            for email in OutboundEmail.objects.filter(pk__in=claimed).order_by('pk'):
+                message = EmailMessage(email.subject, email.body, email.from_email, email.to, connection=connection)
+                try:
+                    # 開いていれば何もしない（切断された後は開き直す）
+                    connection.open()
+                    connection.send_messages([message])
+                except Exception as exc:
+                    logger.warning('メールを送れませんでした: %s', email, exc_info=True)
+                    _mark_failed(email, f'{type(exc).__name__}: {exc}'[:4000])
+                    failed += 1
+                    # 接続が壊れているかもしれないので、次のメールでつなぎ直す
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+                else:
+                    OutboundEmail.objects.filter(pk=email.pk).update(status='sent', last_error='', locked_at=None, sent_at=now())
+                    sent += 1
+    finally:
+        connection.close()
+    return sent, failed
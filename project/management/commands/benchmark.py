@@ -0,0 +1,107 @@
+import json
+import platform
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils.timezone import now
+
+from project import benchmark, seeding
+from project.models import Addon
+
+
+class Command(BaseCommand):
+    help = '主要なページ（ホーム・一覧・詳細・ダウンロード）の処理時間・スループット・SQL 件数を測ります'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--endpoints', default=','.join(benchmark.DEFAULT_ENDPOINTS),
+            help=f'測るエンドポイント（カンマ区切り。{", ".join(benchmark.ENDPOINTS)}。download_addon はダウンロード数に数えられるので DEBUG=True のときだけ）',
+        )
+        parser.add_argument('--requests', type=int, default=200, help='client モードでエンドポイントごとに送るリクエスト数')
+        parser.add_argument('--warmup', type=int, default=5, help='計測前に送るリクエスト数')
+        parser.add_argument('--seed', type=int, default=1, help='URL を選ぶ乱数の種')
+        parser.add_argument('--login', metavar='USERNAME', help='このユーザーでログインした状態で測る（ページキャッシュを通らない）')
+        parser.add_argument('--url', help='このサーバーにも HTTP で負荷をかける（例: http://127.0.0.1:8000）')
+        parser.add_argument('--gunicorn', action='store_true', help='ローカルに gunicorn を起動して HTTP で負荷をかける')
+        parser.add_argument('--workers', type=int, default=2, help='--gunicorn のワーカー数')
+        parser.add_argument('--concurrency', type=int, default=8, help='HTTP の同時接続数')
+        parser.add_argument('--duration', type=float, default=10.0, help='HTTP でエンドポイントごとに負荷をかける秒数')
+        parser.add_argument('--seed-addons', type=int, default=0, help='アドオンがこの件数より少なければダミーデータを作る')
+        parser.add_argument('--output', help='結果を JSON で保存するファイル')
+        parser.add_argument('--compare', help='前回の結果（JSON）と比べる')
+
+    def handle(self, *args, **options):
+        if options['seed_addons'] and Addon.objects.count() < options['seed_addons']:
+            self.stdout.write(f'ダミーデータを作ります（アドオン {options["seed_addons"]} 件）')
+            try:
+                seeding.seed_catalog(addons=options['seed_addons'], seed=options['seed'], log=self.stdout.write)
+            except seeding.SeedError as exc:
+                raise CommandError(str(exc))
+
+        endpoints = [name.strip() for name in options['endpoints'].split(',') if name.strip()]
+        counting = benchmark.COUNTING_ENDPOINTS.intersection(endpoints)
+        if counting and not settings.DEBUG:
+            raise CommandError(f'{", ".join(sorted(counting))} は本物のダウンロードとして数えられるので、DEBUG=False の環境では測れません')
+        try:
+            targets = benchmark.build_targets(options['seed'], options['requests'], endpoints)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        user = None
+        if options['login']:
+            user = get_user_model().objects.filter(username=options['login']).first()
+            if user is None:
+                raise CommandError(f'ユーザー {options["login"]} が見つかりません')
+
+        results = benchmark.run_client(targets, options['warmup'], user)
+        base_url = options['url']
+        process = None
+        if options['gunicorn']:
+            try:
+                process, base_url = benchmark.start_gunicorn(options['workers'])
+            except RuntimeError as exc:
+                raise CommandError(str(exc))
+        try:
+            if base_url:
+                results += benchmark.run_http(targets, base_url, options['concurrency'], options['duration'], benchmark.default_host())
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+        report = {
+            'created_at': now().isoformat(),
+            'git_commit': benchmark.git_commit(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'catalog': benchmark.catalog_size(),
+            'options': {key: options[key] for key in ('endpoints', 'requests', 'warmup', 'seed', 'login', 'concurrency', 'duration', 'workers')},
+            'results': results,
+        }
+        self._print_results(results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f'結果を保存しました: {options["output"]}')
+        if options['compare']:
+            self._print_comparison(benchmark.compare(benchmark.load(options['compare']), report))
+
+    def _print_results(self, results):
+        self.stdout.write(f'{"mode":<7}{"endpoint":<16}{"req":>7}{"err":>5}{"p50":>9}{"p95":>9}{"p99":>9}{"rps":>9}{"SQL":>7}')
+        for r in results:
+            queries = f'{r["avg_queries"]:.1f}' if 'avg_queries' in r else '-'
+            self.stdout.write(
+                f'{r["mode"]:<7}{r["endpoint"]:<16}{r["requests"]:>7}{r["errors"]:>5}'
+                f'{r["p50_ms"]:>9.1f}{r["p95_ms"]:>9.1f}{r["p99_ms"]:>9.1f}{r["throughput_rps"]:>9.1f}{queries:>7}'
+            )
+
+    def _print_comparison(self, rows):
+        self.stdout.write('前回との比較（p50 / p95 / rps の変化率、SQL 件数の差）:')
+        for row in rows:
+            line = f'{row["mode"]:<7}{row["endpoint"]:<16}'
+            for key in ('p50_ms', 'p95_ms', 'throughput_rps'):
+                line += f'{key.split("_")[0]} {row[key][2]:+.1f}%  '
+            if 'avg_queries' in row:
+                line += f'SQL {row["avg_queries"][2]:+.1f}'
+            self.stdout.write(line)
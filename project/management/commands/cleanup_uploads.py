@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from project.uploads import cleanup_stale_sessions
+
+
+class Command(BaseCommand):
+    help = '放置された分割アップロードのセッションと一時ファイルを削除します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=getattr(settings, 'UPLOAD_SESSION_TTL_HOURS', 24), help='この時間以上更新の無いセッションを削除する')
+
+    def handle(self, *args, **options):
+        deleted = cleanup_stale_sessions(options['hours'])
+        self.stdout.write(self.style.SUCCESS(f'処理完了: {deleted} 件のアップロードを削除しました'))
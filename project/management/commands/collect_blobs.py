@@ -0,0 +1,35 @@
+import posixpath
+import shutil
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from project.models import StoredBlob
+from project.storage import cas_storage
+
+
+class Command(BaseCommand):
+    help = 'どの行からも参照されなくなったファイル実体（CAS の blob）と派生画像を削除します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=int, default=24, help='作成からこの時間が経っていない blob は残す（アップロード途中のもの）')
+        parser.add_argument('--dry-run', action='store_true', help='削除せずに対象だけ表示する')
+
+    def handle(self, *args, **options):
+        cutoff = now() - timedelta(hours=options['grace_hours'])
+        removed = freed = 0
+        for blob in StoredBlob.objects.filter(ref_count__lte=0, created_at__lt=cutoff).iterator():
+            self.stdout.write(f'削除: {blob.name} ({blob.size} バイト)')
+            if options['dry_run']:
+                continue
+            # 参照されていないことを確かめてから消す（直前に同じ内容がアップロードされた場合）
+            if not StoredBlob.objects.filter(pk=blob.pk, ref_count__lte=0).delete()[0]:
+                continue
+            cas_storage.delete(blob.name)
+            # 派生画像は cas/ab/cd/<sha256><拡張子>/ 以下にある
+            cas_dir = 'cas/' + posixpath.relpath(blob.name, 'blobs')
+            shutil.rmtree(cas_storage.path(cas_dir), ignore_errors=True)
+            removed += 1
+            freed += blob.size
+        self.stdout.write(self.style.SUCCESS(f'処理完了: {removed} 件 / {freed} バイトを削除しました'))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from project import storage
+from project.models import Addon, AddonScreenshot, AddonVideo
+from project.tasks import process_media
+
+
+class Command(BaseCommand):
+    help = '既存のアップロードファイルを内容アドレス（CAS）ストレージに移し、重複をまとめます'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete-originals', action='store_true', help='移した後に元のファイルを削除する')
+
+    def handle(self, *args, **options):
+        converted = 0
+        for model in (Addon, AddonScreenshot, AddonVideo):
+            fields = storage.cas_fields(model)
+            for obj in model._default_manager.all().iterator():
+                changes = {}
+                for field_name in fields:
+                    fieldfile = getattr(obj, field_name)
+                    if not fieldfile or storage.content_hash(fieldfile.name):
+                        continue
+                    if not fieldfile.storage.exists(fieldfile.name):
+                        self.stderr.write(f'ファイルがありません: {fieldfile.name}')
+                        continue
+                    with fieldfile.storage.open(fieldfile.name, 'rb') as f:
+                        changes[field_name] = fieldfile.storage.save(fieldfile.name, f)
+                if not changes:
+                    continue
+                with transaction.atomic():
+                    # シグナルやカウンタ列を動かさないよう update で書き換える
+                    model._default_manager.filter(pk=obj.pk).update(**changes)
+                    for field_name, name in changes.items():
+                        storage.retain(name)
+                    process_media.delay(model=model._meta.label_lower, pk=obj.pk)
+                for field_name, name in changes.items():
+                    old_name = getattr(obj, field_name).name
+                    self.stdout.write(f'{old_name} -> {name}')
+                    if options['delete_originals']:
+                        storage.cas_storage.delete(old_name)
+                converted += len(changes)
+        self.stdout.write(self.style.SUCCESS(f'処理完了: {converted} 件のファイルを移しました'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from project import queryplans
+
+
+class Command(BaseCommand):
+    help = 'よく実行されるクエリの実行計画を確認し、シーケンシャルスキャンとインデックスを使わないソートを報告します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plan', action='store_true', help='問題が無いクエリの実行計画も表示する')
+        parser.add_argument('--allow-sort', action='store_true', help='ソートは問題にしない（シーケンシャルスキャンだけを報告する）')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'データベース: {connection.vendor}')
+        flagged = 0
+        for name, queryset, sort_ok in queryplans.hot_queries():
+            plan, issues = queryplans.explain(queryset)
+            if sort_ok or options['allow_sort']:
+                issues = [issue for issue in issues if issue[0] != queryplans.SORT]
+            if issues:
+                flagged += 1
+                labels = ', '.join(f'シーケンシャルスキャン（{table}）' if kind == queryplans.SEQ_SCAN else 'ソート' for kind, table in issues)
+                self.stdout.write(self.style.WARNING(f'NG  {name}: {labels}'))
+            else:
+                self.stdout.write(f'OK  {name}')
+            if issues or options['verbose_plan']:
+                for line in plan.splitlines():
+                    self.stdout.write(f'      {line}')
+        if flagged:
+            raise CommandError(f'{flagged} 件のクエリがインデックスを使っていません')
+        self.stdout.write(self.style.SUCCESS('すべてのクエリがインデックスを使っています'))
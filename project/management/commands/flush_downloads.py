@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from project.downloads import flush_download_counts
+
+
+class Command(BaseCommand):
+    help = 'シャードに溜まったダウンロード数を Addon.downloads にまとめて反映します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='1 トランザクションで処理するシャード行数')
+
+    def handle(self, *args, **options):
+        flushed = flush_download_counts(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'処理完了: {flushed} 件のダウンロードを反映しました'))
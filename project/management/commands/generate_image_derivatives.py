@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from project import images
+from project.tasks import IMAGE_FIELDS
+
+
+class Command(BaseCommand):
+    help = 'アップロード済み画像の派生画像（縮小版・WebP）を生成します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='生成済みの画像も作り直す')
+
+    def handle(self, *args, **options):
+        generated = 0
+        for model, field_names in IMAGE_FIELDS.items():
+            for obj in model.objects.all().iterator():
+                for field_name in field_names:
+                    fieldfile = getattr(obj, field_name)
+                    if not fieldfile or (not options['force'] and images.load_manifest(fieldfile)):
+                        continue
+                    if images.generate_derivatives(fieldfile):
+                        generated += 1
+                        self.stdout.write(f'生成: {fieldfile.name}')
+        self.stdout.write(self.style.SUCCESS(f'処理完了: {generated} 枚の画像を処理しました'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from project.manifests import index_addon
+from project.models import Addon
+
+
+class Command(BaseCommand):
+    help = 'アドオンのファイルの manifest.json を読み取り、パック情報（UUID・必要エンジンバージョンなど）を保存し直します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--missing', action='store_true', help='パック情報が無いアドオンだけ処理する')
+
+    def handle(self, *args, **options):
+        addons = Addon.objects.order_by('pk')
+        if options['missing']:
+            addons = addons.filter(packs__isnull=True)
+        indexed = packs = 0
+        for addon in addons.iterator():
+            count = index_addon(addon)
+            self.stdout.write(f'{addon.slug}: {count} パック')
+            indexed += 1
+            packs += count
+        self.stdout.write(self.style.SUCCESS(f'処理完了: {indexed} 件のアドオンから {packs} 個のパックを読み取りました'))
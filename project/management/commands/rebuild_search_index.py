@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from project import search
+from project.models import Addon
+
+
+class Command(BaseCommand):
+    help = 'すべてのアドオンの検索インデックスを作り直します'
+
+    def handle(self, *args, **options):
+        total = 0
+        for addon in Addon.objects.all().iterator():
+            search.index_addon(addon)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f'処理完了: {total} 件のアドオンを登録しました'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from project import stats
+
+
+class Command(BaseCommand):
+    help = '公開中アドオンを集計し直し、サイト統計（種類ごとの件数・ダウンロード数）を作り直します'
+
+    def handle(self, *args, **options):
+        stats.rebuild()
+        totals = stats.site_totals()
+        for addon_type, (count, downloads) in sorted(totals['by_type'].items()):
+            self.stdout.write(f'{addon_type}: {count} 件 / {downloads} ダウンロード')
+        self.stdout.write(self.style.SUCCESS(
+            f'処理完了: {totals["addon_count"]} 件 / {totals["total_downloads"]} ダウンロード'
+        ))
@@ -0,0 +1,48 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from project import jobs
+
+
+class Command(BaseCommand):
+    help = 'キューに入ったバックグラウンドジョブをプロセスプールで実行します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=getattr(settings, 'JOB_WORKER_PROCESSES', 2), help='ワーカープロセス数')
+        parser.add_argument('--sleep', type=float, default=2.0, help='ジョブが無いときに待つ秒数')
+        parser.add_argument('--once', action='store_true', help='実行予定のジョブが無くなったら終了する')
+
+    def handle(self, *args, **options):
+        processes = max(1, options['processes'])
+        purged = jobs.purge_finished_jobs()
+        if purged:
+            self.stdout.write(f'古い完了ジョブを {purged} 件削除しました')
+
+        done = failed = 0
+        # spawn にして、子プロセスが親の DB 接続を引き継がないようにする
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=jobs.init_worker) as pool:
+            try:
+                while True:
+                    jobs.release_stale_jobs()
+                    claimed = jobs.claim_jobs(processes * 2)
+                    if not claimed:
+                        if options['once']:
+                            break
+                        connections.close_all()
+                        time.sleep(options['sleep'])
+                        continue
+                    for pk, ok in zip(claimed, pool.map(jobs.run_job, claimed)):
+                        if ok:
+                            done += 1
+                        else:
+                            failed += 1
+                            self.stderr.write(f'ジョブ #{pk} が失敗しました')
+            except KeyboardInterrupt:
+                pass
+        self.stdout.write(self.style.SUCCESS(f'処理完了: 成功 {done} 件 / 失敗 {failed} 件'))
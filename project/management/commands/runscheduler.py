@@ -0,0 +1,70 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from django.utils.timezone import now
+
+from project import scheduler
+
+
+class Command(BaseCommand):
+    help = 'SCHEDULED_JOBS の管理コマンドを cron 形式のスケジュールで実行します（複数起動しても 1 つだけが実行する）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sleep', type=float, default=20.0, help='予定を確認する間隔（秒）')
+        parser.add_argument('--once', action='store_true', help='今実行すべきジョブを実行したら終了する')
+        parser.add_argument('--list', action='store_true', help='ジョブと次の実行予定を表示して終了する')
+
+    def handle(self, *args, **options):
+        try:
+            jobs = scheduler.scheduled_jobs()
+        except scheduler.CronError as exc:
+            raise CommandError(str(exc))
+        started = now()
+        if options['list']:
+            for name, (schedule, command, command_args) in jobs.items():
+                next_run = timezone.localtime(schedule.next_after(started))
+                self.stdout.write(f'{name}: {schedule.expression} → {" ".join([command] + command_args)} (次回 {next_run:%Y-%m-%d %H:%M})')
+            return
+
+        # 実行記録の無いジョブは、起動後の予定から実行する。
+        # --once（外部の定期実行から呼ぶ場合）は直近 1 日の予定があれば実行する
+        since = started - timedelta(days=1) if options['once'] else started
+        holder = scheduler.make_holder()
+        leader = False
+        last_purge = None
+        try:
+            while True:
+                if scheduler.acquire_lease(holder):
+                    if not leader:
+                        self.stdout.write(f'リーダーになりました: {holder}')
+                        scheduler.fail_interrupted_runs()
+                    leader = True
+                    if last_purge is None or now() - last_purge > timedelta(hours=1):
+                        scheduler.purge_runs()
+                        last_purge = now()
+                    for name, (schedule, command, command_args) in jobs.items():
+                        scheduled_for = scheduler.due_time(name, schedule, since)
+                        if scheduled_for is None:
+                            continue
+                        # 実行前にリースを延長し、取られていたらやめる
+                        if not scheduler.acquire_lease(holder):
+                            leader = False
+                            break
+                        record = scheduler.run(name, command, command_args, scheduled_for)
+                        if record is not None:
+                            self.stdout.write(f'{name}: {record.get_status_display()} ({record.duration.total_seconds():.1f} 秒)')
+                elif leader:
+                    self.stdout.write('リーダーではなくなりました')
+                    leader = False
+                if options['once']:
+                    break
+                connections.close_all()
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if leader:
+                scheduler.release_lease(holder)
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from project import seeding
+
+
+class Command(BaseCommand):
+    help = '負荷試験用のダミーデータ（ユーザー・アドオン・スクリーンショット・動画・コメント・Wiki・通報・お問い合わせ）を作ります'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--addons', type=int, default=20000, help='アドオンの件数')
+        parser.add_argument('--users', type=int, default=500, help='ユーザーの件数')
+        parser.add_argument('--comments', type=int, help='コメントの件数（省略時はアドオンの 10 倍）')
+        parser.add_argument('--screenshots', type=int, help='スクリーンショットの件数（省略時はアドオンの 3 倍）')
+        parser.add_argument('--videos', type=int, help='動画の件数（省略時はアドオンの 1/5）')
+        parser.add_argument('--wiki-pages', type=int, default=300, help='Wiki ページの件数')
+        parser.add_argument('--reports', type=int, help='通報の件数（省略時はアドオンの 1/20）')
+        parser.add_argument('--contacts', type=int, help='お問い合わせの件数（省略時はアドオンの 1/20）')
+        parser.add_argument('--seed', type=int, default=1, help='乱数の種（同じ種なら同じデータ。作れるのは種ごとに 1 回）')
+        parser.add_argument('--batch-size', type=int, default=2000, help='1 回の INSERT で作る件数')
+
+    def handle(self, *args, **options):
+        try:
+            created = seeding.seed_catalog(
+                addons=options['addons'],
+                users=options['users'],
+                comments=options['comments'],
+                screenshots=options['screenshots'],
+                videos=options['videos'],
+                wiki_pages=options['wiki_pages'],
+                reports=options['reports'],
+                contact_messages=options['contacts'],
+                seed=options['seed'],
+                batch_size=options['batch_size'],
+                log=self.stdout.write,
+            )
+        except seeding.SeedError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(f'ダミーデータを作りました（合計 {sum(created.values())} 件）'))
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from project.mail import send_queued
+
+
+class Command(BaseCommand):
+    help = '送信キューのメールを 1 つの接続でまとめて送ります（失敗したものは間隔を空けて送り直します）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, 'MAIL_BATCH_SIZE', 50), help='一度に取り出すメールの数')
+
+    def handle(self, *args, **options):
+        sent, failed = send_queued(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'処理完了: 送信 {sent} 件 / 失敗 {failed} 件'))
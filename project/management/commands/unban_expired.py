@@ -1,25 +1,56 @@
+import time
+
+from django.contrib.auth import get_user_model
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
 from django.utils.timezone import now
+
+from project import bans
 from project.models import BanRecord
 
 
 class Command(BaseCommand):
     help = '期限切れの BAN を検出してユーザーの is_active を True に戻します'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='1 回の UPDATE で処理する BAN レコードの数')
+        parser.add_argument('--dry-run', action='store_true', help='更新せずに件数だけ表示する')
+
     def handle(self, *args, **options):
+        User = get_user_model()
+        started = time.monotonic()
         now_dt = now()
-        # expires_at が設定され、期限が切れているレコードを取得
-        expired = BanRecord.objects.filter(expires_at__isnull=False, expires_at__lte=now_dt)
-        total = expired.count()
-        self.stdout.write(f'見つかった期限切れBAN: {total} 件')
-        restored = 0
-        for b in expired:
-            user = b.user
-            if not user.is_active:
-                user.is_active = True
-                user.save(update_fields=['is_active'])
-                restored += 1
-                self.stdout.write(f'解除: {user.username} (Ban id={b.id})')
-            # 期限切れとして処理済みの目印を残したい場合はここで b.processed=True などを設定する
-
-        self.stdout.write(self.style.SUCCESS(f'処理完了: {restored} ユーザーを有効化しました'))
+        batch_size = max(options['batch_size'], 1)
+        # 期限が切れていて、まだ処理していないレコード（処理済みのものは processed_at で除く）
+        pending = BanRecord.objects.filter(processed_at__isnull=True, expires_at__isnull=False, expires_at__lte=now_dt)
+        # 他に有効な BAN が残っているユーザーは戻さない
+        still_banned = Exists(BanRecord.objects.filter(user=OuterRef('pk')).filter(bans.active_q(now_dt)))
+
+        records = restored = 0
+        would_restore = set()
+        last_pk = 0
+        while True:
+            batch = list(pending.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'user_id')[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            user_ids = {user_id for _, user_id in batch}
+            users = User.objects.filter(pk__in=user_ids, is_active=False).exclude(still_banned)
+            records += len(batch)
+            if options['dry_run']:
+                # 同じユーザーが複数のバッチに出てくることがあるので、ID で数える
+                would_restore.update(users.values_list('pk', flat=True))
+                continue
+            with transaction.atomic():
+                restored += users.update(is_active=True)
+                BanRecord.objects.filter(pk__in=[pk for pk, _ in batch]).update(processed_at=now_dt)
+            # update() ではシグナルが飛ばないので、BAN のキャッシュを直接捨てる
+            bans.invalidate_many(user_ids)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(f'見つかった期限切れBAN: {records} 件')
+        if options['dry_run']:
+            self.stdout.write(f'[dry-run] 有効化されるユーザー: {len(would_restore)} 人 ({elapsed:.2f} 秒)')
+            return
+        self.stdout.write(self.style.SUCCESS(f'処理完了: {restored} ユーザーを有効化しました ({elapsed:.2f} 秒)'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from project import ranking
+
+
+class Command(BaseCommand):
+    help = 'アドオン一覧の人気順・注目順に使うスコアを計算し直します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='1 回の UPDATE で計算する id の範囲')
+
+    def handle(self, *args, **options):
+        updated = ranking.update_rankings(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'処理完了: {updated} 件のアドオンのスコアを更新しました'))
@@ -0,0 +1,180 @@
+"""アップロードされた .mcaddon / .mcpack の manifest.json を読み取って保存する。
+
+アーカイブはディスクに展開せず、zipfile でストレージから直接読む。
+.mcaddon の中の .mcpack のように入れ子になった zip も MAX_NESTING 段まで読む（一時ファイルに書き出してから読む）。
+結果は AddonPack / AddonPackDependency に保存し、Addon.min_engine_code（必要なエンジンバージョン）を更新する。
+"""
+import json
+import logging
+import re
+import shutil
+import tempfile
+import zipfile
+
+from django.db import transaction
+
+from .middleware import purge_pages
+
+logger = logging.getLogger(__name__)
+
+MAX_NESTING = 3
+# これより大きい manifest.json は読まない（圧縮爆弾対策）
+MAX_MANIFEST_SIZE = 1024 * 1024
+# 入れ子のアーカイブの展開後のサイズと圧縮率の上限（これを超えるものは読まない）
+MAX_NESTED_ARCHIVE_SIZE = 512 * 1024 * 1024
+MAX_COMPRESSION_RATIO = 100
+# 入れ子のアーカイブをメモリに置く上限（超えたらディスクの一時ファイルにする）
+NESTED_SPOOL_SIZE = 16 * 1024 * 1024
+NESTED_ARCHIVE_EXTENSIONS = ('.mcpack', '.mcaddon', '.mctemplate', '.zip')
+
+# manifest の module type からパックの種類（Addon.addon_type と同じ値）を決める
+MODULE_PACK_TYPES = {
+    'resources': 'resource',
+    'data': 'behavior',
+    'script': 'behavior',
+    'client_data': 'behavior',
+    'javascript': 'behavior',
+    'skin_pack': 'skin',
+    'world_template': 'world',
+}
+
+_COMMENT_RE = re.compile(r'"(?:\\.|[^"\\])*"|//[^\n]*|/\*.*?\*/', re.S)
+_TRAILING_COMMA_RE = re.compile(r',(\s*[}\]])')
+
+
+class ManifestError(ValueError):
+    pass
+
+
+def _loads(data):
+    """manifest.json を読む。Minecraft が許容するコメントや末尾のカンマも受け付ける。"""
+    text = data.decode('utf-8-sig')
+    try:
+        return json.loads(text)
+    except ValueError:
+        text = _COMMENT_RE.sub(lambda m: m.group(0) if m.group(0).startswith('"') else '', text)
+        return json.loads(_TRAILING_COMMA_RE.sub(r'\1', text))
+
+
+def version_string(value):
+    """[1, 20, 0] や "1.20.0" を "1.20.0" にする。"""
+    if isinstance(value, (list, tuple)):
+        return '.'.join(str(part) for part in value)
+    return str(value or '')
+
+
+def engine_code(value):
+    """バージョンを比較できる整数にする（1.20.30 → 1020030）。読めなければ None。"""
+    parts = re.findall(r'\d+', version_string(value))[:3]
+    if not parts:
+        return None
+    parts = [int(part) for part in parts] + [0] * (3 - len(parts))
+    return parts[0] * 1_000_000 + min(parts[1], 999) * 1000 + min(parts[2], 999)
+
+
+def parse_manifest(data, path=''):
+    """manifest.json の内容を dict にする。"""
+    try:
+        manifest = _loads(data)
+        header = manifest['header']
+    except (ValueError, KeyError, TypeError) as exc:
+        raise ManifestError(f'{path}: manifest.json を読めません ({exc})') from exc
+
+    module_types = [str(module.get('type', '')) for module in manifest.get('modules') or [] if isinstance(module, dict)]
+    pack_type = next((MODULE_PACK_TYPES[t] for t in module_types if t in MODULE_PACK_TYPES), 'other')
+    dependencies = []
+    for dependency in manifest.get('dependencies') or []:
+        if not isinstance(dependency, dict):
+            continue
+        dependencies.append({
+            'uuid': str(dependency.get('uuid', '')).lower(),
+            'module_name': str(dependency.get('module_name', '')),
+            'version': version_string(dependency.get('version')),
+        })
+    min_engine = header.get('min_engine_version')
+    return {
+        'path': path,
+        'uuid': str(header.get('uuid', '')).lower(),
+        'name': str(header.get('name', ''))[:200],
+        'version': version_string(header.get('version'))[:50],
+        'pack_type': pack_type,
+        'module_types': module_types,
+        'min_engine_version': version_string(min_engine)[:50],
+        'min_engine_code': engine_code(min_engine) if min_engine else None,
+        'dependencies': dependencies,
+    }
+
+
+def read_manifests(fileobj, prefix='', depth=0):
+    """zip の中の manifest.json をすべて読む（入れ子の zip も読む）。"""
+    manifests = []
+    with zipfile.ZipFile(fileobj) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            path = prefix + info.filename
+            lower = info.filename.lower()
+            if lower == 'manifest.json' or lower.endswith('/manifest.json'):
+                if info.file_size > MAX_MANIFEST_SIZE:
+                    logger.warning('manifest.json が大きすぎるので読み飛ばします: %s', path)
+                    continue
+                try:
+                    manifests.append(parse_manifest(archive.read(info), path))
+                except ManifestError:
+                    logger.warning('manifest.json を読めませんでした: %s', path, exc_info=True)
+            elif lower.endswith(NESTED_ARCHIVE_EXTENSIONS) and depth < MAX_NESTING:
+                if info.file_size > MAX_NESTED_ARCHIVE_SIZE or info.file_size > max(info.compress_size, 1) * MAX_COMPRESSION_RATIO:
+                    logger.warning('入れ子のアーカイブが大きすぎるので読み飛ばします: %s', path)
+                    continue
+                # ZipExtFile は後ろにシークするたびに先頭から展開し直すので、一度書き出してから読む。
+                # 書き出すのはヘッダーの file_size まで（ZipExtFile はそれ以上返さない）
+                with archive.open(info) as nested, tempfile.SpooledTemporaryFile(max_size=NESTED_SPOOL_SIZE) as spool:
+                    try:
+                        shutil.copyfileobj(nested, spool)
+                        spool.seek(0)
+                        manifests.extend(read_manifests(spool, path + '/', depth + 1))
+                    except zipfile.BadZipFile:
+                        logger.warning('入れ子のアーカイブを読めませんでした: %s', path)
+    return manifests
+
+
+def index_addon(addon):
+    """アドオンのファイルを読み、パック情報を保存し直す。読めたパックの数を返す。"""
+    from .models import Addon, AddonPack, AddonPackDependency
+
+    manifests = []
+    if addon.download_file:
+        try:
+            with addon.download_file.storage.open(addon.download_file.name, 'rb') as f:
+                manifests = read_manifests(f)
+        except zipfile.BadZipFile:
+            logger.warning('アドオンのファイルが zip ではありません: %s', addon.download_file.name)
+
+    codes = [m['min_engine_code'] for m in manifests if m['min_engine_code'] is not None]
+    with transaction.atomic():
+        AddonPack.objects.filter(addon=addon).delete()
+        packs = AddonPack.objects.bulk_create([
+            AddonPack(
+                addon=addon,
+                path=m['path'][:255],
+                uuid=m['uuid'][:36],
+                name=m['name'],
+                version=m['version'],
+                pack_type=m['pack_type'],
+                module_types=m['module_types'],
+                min_engine_version=m['min_engine_version'],
+                min_engine_code=m['min_engine_code'],
+            )
+            for m in manifests
+        ])
+        AddonPackDependency.objects.bulk_create([
+            AddonPackDependency(pack=pack, uuid=d['uuid'][:36], module_name=d['module_name'][:100], version=d['version'][:50])
+            for pack, m in zip(packs, manifests)
+            for d in m['dependencies']
+        ])
+        # 必要なエンジンバージョンは、含まれるパックの中で一番新しいもの
+        Addon.objects.filter(pk=addon.pk).update(min_engine_code=max(codes) if codes else None)
+    addon.min_engine_code = max(codes) if codes else None
+    # 一覧の絞り込み結果が変わるので、キャッシュしたページを捨てる
+    purge_pages('addon_list')
+    return len(packs)
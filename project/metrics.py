@@ -0,0 +1,217 @@
+"""リクエストごとの SQL 件数・DB 時間・テンプレート描画時間・全体の処理時間の集計。
+
+InstrumentationMiddleware（project/middleware.py）が URL 名ごとに記録し、
+スタッフ向けの /admin/metrics/ と Prometheus 形式の /metrics で見られる。
+集計はプロセスごとにメモリに持ち、METRICS_FLUSH_INTERVAL 秒ごとにキャッシュに書き出す（表示するときに全プロセス分を合計する）。
+全プロセス分が合計されるのはキャッシュを共有しているとき（REDIS_URL）だけで、LocMemCache では
+/admin/metrics/ や /metrics に応答したプロセスの分しか出ない。
+プロセスが再起動すると、そのプロセスの分は 0 からになる。
+
+テンプレート描画時間は TEMPLATES の BACKEND を InstrumentedDjangoTemplates にすると測れる（描画中の SQL の時間も含む）。
+
+QUERY_BUDGETS で URL 名ごとの SQL 件数の上限を決められる。超えると警告をログに出し、
+QUERY_BUDGET_RAISE=True（テストでは project.test_runner が有効にする）なら QueryBudgetExceeded を送出する。
+"""
+import contextvars
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'metrics'
+REGISTRY_KEY = f'{CACHE_PREFIX}:processes'
+# 処理時間のヒストグラムの区切り（秒）
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SUM_FIELDS = ('requests', 'errors', 'queries', 'db_seconds', 'template_seconds', 'total_seconds', 'budget_exceeded')
+MAX_FIELDS = ('max_queries', 'max_seconds')
+
+_process_key = f'{CACHE_PREFIX}:process:{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+_lock = threading.Lock()
+_stats = {}
+_last_flush = 0.0
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class RequestMetrics:
+    """1 リクエスト分の計測値。connection.execute_wrapper() にそのまま渡せる。"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self._rendering = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_seconds += time.perf_counter() - started
+
+
+def start_request():
+    """このリクエストの計測を始める。(RequestMetrics, end_request に渡すトークン) を返す。"""
+    request_metrics = RequestMetrics()
+    return request_metrics, _current.set(request_metrics)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+class InstrumentedTemplate(Template):
+    def render(self, context=None, request=None):
+        request_metrics = _current.get()
+        # 描画中に別のテンプレートを描画しても二重に数えない
+        if request_metrics is None or request_metrics._rendering:
+            return super().render(context, request)
+        request_metrics._rendering += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            request_metrics._rendering -= 1
+            request_metrics.template_seconds += time.perf_counter() - started
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """描画時間を記録する DjangoTemplates。"""
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return InstrumentedTemplate(super().get_template(template_name).template, self)
+
+
+def query_budget(view):
+    """URL 名ごとの SQL 件数の上限。無ければ QUERY_BUDGET_DEFAULT（None なら上限なし）。"""
+    return getattr(settings, 'QUERY_BUDGETS', {}).get(view, getattr(settings, 'QUERY_BUDGET_DEFAULT', None))
+
+
+def _empty():
+    stats = dict.fromkeys(SUM_FIELDS + MAX_FIELDS, 0)
+    stats['buckets'] = [0] * len(LATENCY_BUCKETS)
+    return stats
+
+
+def record(view, request_metrics, total_seconds, status_code, budget_exceeded=False):
+    """1 リクエスト分を集計に加える。"""
+    with _lock:
+        stats = _stats.setdefault(view, _empty())
+        stats['requests'] += 1
+        stats['errors'] += status_code >= 500
+        stats['queries'] += request_metrics.queries
+        stats['db_seconds'] += request_metrics.db_seconds
+        stats['template_seconds'] += request_metrics.template_seconds
+        stats['total_seconds'] += total_seconds
+        stats['budget_exceeded'] += budget_exceeded
+        stats['max_queries'] = max(stats['max_queries'], request_metrics.queries)
+        stats['max_seconds'] = max(stats['max_seconds'], total_seconds)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if total_seconds <= bound:
+                stats['buckets'][i] += 1
+    _maybe_flush()
+
+
+def _maybe_flush():
+    global _last_flush
+    if time.monotonic() - _last_flush >= getattr(settings, 'METRICS_FLUSH_INTERVAL', 10):
+        flush()
+
+
+def flush():
+    """このプロセスの集計をキャッシュに書き出す。"""
+    global _last_flush
+    _last_flush = time.monotonic()
+    with _lock:
+        snapshot = {view: dict(stats, buckets=list(stats['buckets'])) for view, stats in _stats.items()}
+    # 止まったプロセスの分は METRICS_RETENTION 秒で消える
+    cache.set(_process_key, snapshot, getattr(settings, 'METRICS_RETENTION', 86400))
+    processes = cache.get(REGISTRY_KEY) or []
+    if _process_key not in processes:
+        cache.set(REGISTRY_KEY, processes + [_process_key], None)
+
+
+def collect():
+    """全プロセスの集計を合計して {URL 名: 集計} で返す。"""
+    flush()
+    processes = cache.get(REGISTRY_KEY) or []
+    snapshots = cache.get_many(processes)
+    if len(snapshots) != len(processes):
+        cache.set(REGISTRY_KEY, [key for key in processes if key in snapshots], None)
+    totals = {}
+    for snapshot in snapshots.values():
+        for view, stats in snapshot.items():
+            total = totals.setdefault(view, _empty())
+            for field in SUM_FIELDS:
+                total[field] += stats[field]
+            for field in MAX_FIELDS:
+                total[field] = max(total[field], stats[field])
+            total['buckets'] = [a + b for a, b in zip(total['buckets'], stats['buckets'])]
+    return dict(sorted(totals.items()))
+
+
+def dashboard_rows(totals):
+    """スタッフ向けの一覧に表示する行（平均は 1 リクエストあたり、時間はミリ秒）。"""
+    rows = []
+    for view, stats in totals.items():
+        count = stats['requests'] or 1
+        rows.append({
+            'view': view,
+            'requests': stats['requests'],
+            'errors': stats['errors'],
+            'avg_queries': stats['queries'] / count,
+            'max_queries': stats['max_queries'],
+            'budget': query_budget(view),
+            'budget_exceeded': stats['budget_exceeded'],
+            'avg_db_ms': stats['db_seconds'] / count * 1000,
+            'avg_template_ms': stats['template_seconds'] / count * 1000,
+            'avg_ms': stats['total_seconds'] / count * 1000,
+            'max_ms': stats['max_seconds'] * 1000,
+        })
+    return sorted(rows, key=lambda row: row['avg_ms'] * row['requests'], reverse=True)
+
+
+def _label(view):
+    return view.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def prometheus_text(totals):
+    """Prometheus のテキスト形式にする。"""
+    lines = []
+
+    def metric(name, kind, help_text, field):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for view, stats in totals.items():
+            lines.append(f'{name}{{view="{_label(view)}"}} {stats[field]}')
+
+    lines.append('# HELP addon_http_request_duration_seconds Request latency by URL name.')
+    lines.append('# TYPE addon_http_request_duration_seconds histogram')
+    for view, stats in totals.items():
+        label = _label(view)
+        for bound, count in zip(LATENCY_BUCKETS, stats['buckets']):
+            lines.append(f'addon_http_request_duration_seconds_bucket{{view="{label}",le="{bound}"}} {count}')
+        lines.append(f'addon_http_request_duration_seconds_bucket{{view="{label}",le="+Inf"}} {stats["requests"]}')
+        lines.append(f'addon_http_request_duration_seconds_sum{{view="{label}"}} {stats["total_seconds"]}')
+        lines.append(f'addon_http_request_duration_seconds_count{{view="{label}"}} {stats["requests"]}')
+    metric('addon_http_server_errors_total', 'counter', 'Responses with status 5xx.', 'errors')
+    metric('addon_db_queries_total', 'counter', 'SQL queries executed.', 'queries')
+    metric('addon_db_query_seconds_total', 'counter', 'Time spent executing SQL.', 'db_seconds')
+    metric('addon_template_render_seconds_total', 'counter', 'Time spent rendering templates.', 'template_seconds')
+    metric('addon_query_budget_exceeded_total', 'counter', 'Requests over the query budget.', 'budget_exceeded')
+    return '\n'.join(lines) + '\n'
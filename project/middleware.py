@@ -0,0 +1,137 @@
+"""プロジェクト独自のミドルウェア。"""
+import hashlib
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.http import quote_etag
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+PAGE_CACHE_PREFIX = 'page-cache'
+
+
+def _generation_key(url_name):
+    return f'{PAGE_CACHE_PREFIX}:{url_name}:generation'
+
+
+def purge_pages(*url_names):
+    """指定した URL 名のページキャッシュをすべて無効にする。"""
+    for url_name in url_names:
+        try:
+            cache.incr(_generation_key(url_name))
+        except ValueError:
+            cache.set(_generation_key(url_name), 1, None)
+
+
+def page_cache_key(url_name, request):
+    """URL 名・世代・パス・クエリ文字列（順序を正規化）からキーを作る。"""
+    generation = cache.get(_generation_key(url_name), 0)
+    query = sorted((key, sorted(values)) for key, values in request.GET.lists())
+    digest = hashlib.md5(f'{request.path}?{query}'.encode()).hexdigest()
+    return f'{PAGE_CACHE_PREFIX}:{url_name}:{generation}:{digest}'
+
+
+class AnonymousPageCacheMiddleware(MiddlewareMixin):
+    """未ログインの GET/HEAD に対して、一覧系ページの HTML をまるごとキャッシュする。
+
+    対象は settings.ANONYMOUS_PAGE_CACHE_VIEWS の URL 名。クエリ文字列（type, q, sort, page など）
+    ごとに別のキーで保存し、ETag / Cache-Control を付けて返す。内容が変わったときは
+    signals.py から purge_pages() を呼んで世代を上げる。
+    AuthenticationMiddleware と MessageMiddleware より後ろに置くこと。
+    """
+
+    def _cacheable_request(self, request):
+        if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+            return False
+        match = request.resolver_match
+        if not match or match.url_name not in getattr(settings, 'ANONYMOUS_PAGE_CACHE_VIEWS', ()):
+            return False
+        # フラッシュメッセージはキャッシュしたページに混ぜられない
+        return not len(get_messages(request))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self._cacheable_request(request):
+            return None
+        key = page_cache_key(request.resolver_match.url_name, request)
+        cached = cache.get(key)
+        if cached is None:
+            request._page_cache_key = key
+            return None
+        response = HttpResponse(cached['content'], content_type=cached['content_type'])
+        self._add_headers(response, cached['etag'])
+        response['X-Page-Cache'] = 'hit'
+        return get_conditional_response(request, etag=cached['etag'], response=response)
+
+    def process_response(self, request, response):
+        key = getattr(request, '_page_cache_key', None)
+        if (
+            key is None
+            or response.status_code != 200
+            or response.streaming
+            or response.cookies
+            # CSRF トークンを埋め込んだページは閲覧者ごとに内容が違う
+            or request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+        ):
+            return response
+        etag = quote_etag(hashlib.md5(response.content).hexdigest())
+        cache.set(
+            key,
+            {'content': response.content, 'content_type': response['Content-Type'], 'etag': etag},
+            getattr(settings, 'ANONYMOUS_PAGE_CACHE_TIMEOUT', 300),
+        )
+        self._add_headers(response, etag)
+        response['X-Page-Cache'] = 'miss'
+        return get_conditional_response(request, etag=etag, response=response)
+
+    def _add_headers(self, response, etag):
+        response['ETag'] = etag
+        patch_cache_control(response, max_age=getattr(settings, 'ANONYMOUS_PAGE_CACHE_MAX_AGE', 60))
+        # ログイン後にブラウザが未ログイン時のページを使わないようにする
+        patch_vary_headers(response, ('Cookie',))
+
+
+class InstrumentationMiddleware:
+    """リクエストごとの SQL 件数・DB 時間・テンプレート描画時間・処理時間を URL 名ごとに記録する（project/metrics.py）。
+
+    SQL 件数が QUERY_BUDGETS の上限を超えたら警告を出す（QUERY_BUDGET_RAISE=True なら例外にする）。
+    キャッシュしたページの分も測れるように、MIDDLEWARE の先頭近くに置く。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            return self.get_response(request)
+        request_metrics, token = metrics.start_request()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(request_metrics))
+                response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.url_name if match and match.url_name else '(unresolved)'
+        budget = metrics.query_budget(view)
+        exceeded = budget is not None and request_metrics.queries > budget
+        metrics.record(view, request_metrics, elapsed, response.status_code, exceeded)
+        if exceeded:
+            message = f'{view}: SQL が {request_metrics.queries} 件実行されました（上限 {budget} 件）: {request.get_full_path()}'
+            if getattr(settings, 'QUERY_BUDGET_RAISE', False):
+                raise metrics.QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0010_add_media_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DownloadCounterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField(verbose_name='シャード番号')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='未反映のダウンロード数')),
+                ('addon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='download_shards', to='project.addon')),
+            ],
+            options={
+                'verbose_name': 'ダウンロード数シャード',
+                'verbose_name_plural': 'ダウンロード数シャード',
+                'constraints': [models.UniqueConstraint(fields=('addon', 'shard'), name='unique_download_counter_shard')],
+            },
+        ),
+    ]
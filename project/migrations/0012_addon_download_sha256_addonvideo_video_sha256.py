@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0011_downloadcountershard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='addon',
+            name='download_sha256',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='ファイルの SHA-256'),
+        ),
+        migrations.AddField(
+            model_name='addonvideo',
+            name='video_sha256',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='動画ファイルの SHA-256'),
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:59
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils.html import strip_tags
+
+# project.search はこの先も変わるので、インデックスの作成に必要なものはここに写しておく
+FTS_TABLE = 'project_addon_fts'
+DOCUMENT_TABLE = 'project_addonsearchdocument'
+PG_VECTOR_SQL = (
+    "to_tsvector('simple', coalesce(title_tokens, '') || ' ' || coalesce(body_tokens, ''))"
+)
+
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3005\u3006'
+_TOKEN_RE = re.compile(rf'([{_CJK}]+)|([^\W_{_CJK}]+)')
+
+
+def tokenize(text):
+    tokens = []
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    for match in _TOKEN_RE.finditer(text):
+        cjk, word = match.groups()
+        if word:
+            tokens.append(word)
+            continue
+        tokens.extend(cjk)
+        tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+    return tokens
+
+
+def build_document(name, author, description, long_description):
+    title = ' '.join(tokenize(f'{name} {author}'))
+    body = ' '.join(tokenize(f'{description} {strip_tags(long_description or "")}'))
+    return title, body
+
+
+def create_search_index(apps, schema_editor):
+    """DB ごとの全文検索インデックスを作成し、既存アドオンを登録する。"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+            f"USING fts5(title, body, tokenize='unicode61 remove_diacritics 0')"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS project_addonsearch_gin '
+            f'ON {DOCUMENT_TABLE} USING gin (({PG_VECTOR_SQL}))'
+        )
+
+    Addon = apps.get_model('project', 'Addon')
+    AddonSearchDocument = apps.get_model('project', 'AddonSearchDocument')
+    with schema_editor.connection.cursor() as cursor:
+        for addon in Addon.objects.all().iterator():
+            title, body = build_document(addon.name, addon.author, addon.description, addon.long_description)
+            AddonSearchDocument.objects.create(addon=addon, title_tokens=title, body_tokens=body)
+            if vendor == 'sqlite':
+                cursor.execute(
+                    f'INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES (%s, %s, %s)', [addon.pk, title, body]
+                )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS project_addonsearch_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0012_addon_download_sha256_addonvideo_video_sha256'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AddonSearchDocument',
+            fields=[
+                ('addon', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='project.addon')),
+                ('title_tokens', models.TextField(blank=True, verbose_name='名前・作成者のトークン')),
+                ('body_tokens', models.TextField(blank=True, verbose_name='説明のトークン')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日')),
+            ],
+            options={
+                'verbose_name': '検索インデックス',
+                'verbose_name_plural': '検索インデックス',
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
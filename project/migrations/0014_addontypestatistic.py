@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:01
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def build_statistics(apps, schema_editor):
+    Addon = apps.get_model('project', 'Addon')
+    AddonTypeStatistic = apps.get_model('project', 'AddonTypeStatistic')
+    rows = (
+        Addon.objects.filter(published=True)
+        .values('addon_type')
+        .annotate(count=Count('pk'), downloads=Sum('downloads'))
+        .order_by()
+    )
+    AddonTypeStatistic.objects.bulk_create(
+        AddonTypeStatistic(addon_type=row['addon_type'], addon_count=row['count'], total_downloads=row['downloads'] or 0)
+        for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0013_addonsearchdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AddonTypeStatistic',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('addon_type', models.CharField(choices=[('behavior', 'ビヘイビアパック'), ('resource', 'リソースパック'), ('skin', 'スキンパック'), ('world', 'ワールドテンプレート'), ('other', 'その他')], max_length=20, unique=True, verbose_name='種類')),
+                ('addon_count', models.IntegerField(default=0, verbose_name='アドオン数')),
+                ('total_downloads', models.BigIntegerField(default=0, verbose_name='合計ダウンロード数')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日')),
+            ],
+            options={
+                'verbose_name': 'サイト統計',
+                'verbose_name_plural': 'サイト統計',
+                'ordering': ['addon_type'],
+            },
+        ),
+        migrations.RunPython(build_statistics, migrations.RunPython.noop),
+    ]
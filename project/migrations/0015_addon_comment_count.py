@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:03
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_comments(apps, schema_editor):
+    Addon = apps.get_model('project', 'Addon')
+    Comment = apps.get_model('project', 'Comment')
+    counts = Comment.objects.filter(addon=OuterRef('pk')).order_by().values('addon').annotate(n=Count('pk')).values('n')
+    Addon.objects.update(comment_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0014_addontypestatistic'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='addon',
+            name='comment_count',
+            field=models.IntegerField(default=0, verbose_name='コメント数'),
+        ),
+        migrations.RunPython(count_comments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:09
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0015_addon_comment_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='addon',
+            name='media_status',
+            field=models.CharField(choices=[('pending', '処理待ち'), ('processing', '処理中'), ('ready', '完了'), ('failed', '失敗')], default='ready', editable=False, max_length=20, verbose_name='メディア処理'),
+        ),
+        migrations.AddField(
+            model_name='addonscreenshot',
+            name='media_status',
+            field=models.CharField(choices=[('pending', '処理待ち'), ('processing', '処理中'), ('ready', '完了'), ('failed', '失敗')], default='ready', editable=False, max_length=20, verbose_name='メディア処理'),
+        ),
+        migrations.AddField(
+            model_name='addonvideo',
+            name='media_status',
+            field=models.CharField(choices=[('pending', '処理待ち'), ('processing', '処理中'), ('ready', '完了'), ('failed', '失敗')], default='ready', editable=False, max_length=20, verbose_name='メディア処理'),
+        ),
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=100, verbose_name='タスク名')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='引数')),
+                ('status', models.CharField(choices=[('pending', '待機中'), ('running', '実行中'), ('done', '完了'), ('failed', '失敗')], default='pending', max_length=20, verbose_name='状態')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='実行回数')),
+                ('max_attempts', models.PositiveIntegerField(default=5, verbose_name='最大実行回数')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='実行予定日時')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='実行開始日時')),
+                ('last_error', models.TextField(blank=True, verbose_name='最後のエラー')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='完了日時')),
+            ],
+            options={
+                'verbose_name': 'ジョブ',
+                'verbose_name_plural': 'ジョブ',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='project_job_due_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:12
+
+import project.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0016_job_media_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True, verbose_name='SHA-256')),
+                ('name', models.CharField(max_length=255, verbose_name='保存先')),
+                ('size', models.BigIntegerField(default=0, verbose_name='サイズ')),
+                ('ref_count', models.IntegerField(default=0, verbose_name='参照数')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日')),
+            ],
+            options={
+                'verbose_name': 'ファイル実体',
+                'verbose_name_plural': 'ファイル実体',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='addon',
+            name='download_file',
+            field=models.FileField(max_length=255, storage=project.storage.get_media_storage, upload_to='addons/files/', verbose_name='ダウンロードファイル'),
+        ),
+        migrations.AlterField(
+            model_name='addon',
+            name='thumbnail',
+            field=models.ImageField(blank=True, max_length=255, null=True, storage=project.storage.get_media_storage, upload_to='addons/thumbnails/', verbose_name='サムネイル'),
+        ),
+        migrations.AlterField(
+            model_name='addonscreenshot',
+            name='image',
+            field=models.ImageField(max_length=255, storage=project.storage.get_media_storage, upload_to='addons/screenshots/', verbose_name='スクリーンショット'),
+        ),
+        migrations.AlterField(
+            model_name='addonvideo',
+            name='thumbnail',
+            field=models.ImageField(blank=True, max_length=255, null=True, storage=project.storage.get_media_storage, upload_to='addons/video_thumbnails/', verbose_name='サムネイル'),
+        ),
+        migrations.AlterField(
+            model_name='addonvideo',
+            name='video_file',
+            field=models.FileField(blank=True, max_length=255, null=True, storage=project.storage.get_media_storage, upload_to='addons/videos/', verbose_name='動画ファイル'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0017_storedblob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='addon',
+            name='min_engine_code',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='必要エンジンバージョン'),
+        ),
+        migrations.CreateModel(
+            name='AddonPack',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255, verbose_name='アーカイブ内のパス')),
+                ('uuid', models.CharField(db_index=True, max_length=36, verbose_name='UUID')),
+                ('name', models.CharField(blank=True, max_length=200, verbose_name='パック名')),
+                ('version', models.CharField(blank=True, max_length=50, verbose_name='バージョン')),
+                ('pack_type', models.CharField(choices=[('behavior', 'ビヘイビアパック'), ('resource', 'リソースパック'), ('skin', 'スキンパック'), ('world', 'ワールドテンプレート'), ('other', 'その他')], default='other', max_length=20, verbose_name='種類')),
+                ('module_types', models.JSONField(blank=True, default=list, verbose_name='モジュールの種類')),
+                ('min_engine_version', models.CharField(blank=True, max_length=50, verbose_name='min_engine_version')),
+                ('min_engine_code', models.PositiveIntegerField(blank=True, db_index=True, null=True, verbose_name='必要エンジンバージョン')),
+                ('addon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='packs', to='project.addon')),
+            ],
+            options={
+                'verbose_name': 'パック',
+                'verbose_name_plural': 'パック',
+                'ordering': ['addon', 'path'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AddonPackDependency',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.CharField(blank=True, db_index=True, max_length=36, verbose_name='UUID')),
+                ('module_name', models.CharField(blank=True, max_length=100, verbose_name='モジュール名')),
+                ('version', models.CharField(blank=True, max_length=50, verbose_name='バージョン')),
+                ('pack', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dependencies', to='project.addonpack')),
+            ],
+            options={
+                'verbose_name': 'パックの依存関係',
+                'verbose_name_plural': 'パックの依存関係',
+            },
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:16
+
+import re
+
+import django.db.models.deletion
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+from django.db.models import F
+
+# project.storage はこの先も変わるので、CAS の名前の形式はここに写しておく
+CAS_NAME_RE = re.compile(r'^cas/([0-9a-f]{2})/([0-9a-f]{2})/(?P<sha256>[0-9a-f]{64})(?P<ext>[^/]*)/(?P<filename>[^/]+)$')
+
+
+def _file_size(name, digest):
+    # CAS の名前なら実際のファイルは blobs/ の下にある
+    if digest:
+        ext = CAS_NAME_RE.match(name).group('ext')
+        name = f'blobs/{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+    try:
+        return default_storage.size(name)
+    except OSError:
+        return 0
+
+
+def record_current_releases(apps, schema_editor):
+    # 既存のアドオンの今のファイルを最初のリリースとして記録する（次の更新から差分を作れるように）
+    Addon = apps.get_model('project', 'Addon')
+    AddonRelease = apps.get_model('project', 'AddonRelease')
+    StoredBlob = apps.get_model('project', 'StoredBlob')
+    for addon in Addon.objects.exclude(download_file='').iterator():
+        name = addon.download_file.name
+        match = CAS_NAME_RE.match(name)
+        digest = match.group('sha256') if match else None
+        AddonRelease.objects.create(
+            addon=addon, version=addon.version, file=name,
+            sha256=digest or addon.download_sha256, size=_file_size(name, digest),
+        )
+        if digest:
+            StoredBlob.objects.filter(sha256=digest).update(ref_count=F('ref_count') + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0018_addon_packs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AddonRelease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.CharField(max_length=20, verbose_name='バージョン')),
+                ('file', models.FileField(max_length=255, upload_to='addons/files/', verbose_name='ファイル')),
+                ('sha256', models.CharField(blank=True, max_length=64, verbose_name='SHA-256')),
+                ('size', models.BigIntegerField(default=0, verbose_name='サイズ')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日')),
+                ('addon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='releases', to='project.addon')),
+            ],
+            options={
+                'verbose_name': 'リリース',
+                'verbose_name_plural': 'リリース',
+                'ordering': ['-created_at', '-pk'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AddonDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(blank=True, max_length=255, upload_to='addons/deltas/', verbose_name='差分ファイル')),
+                ('size', models.BigIntegerField(default=0, verbose_name='サイズ')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日')),
+                ('from_release', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deltas_from', to='project.addonrelease')),
+                ('to_release', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deltas_to', to='project.addonrelease')),
+            ],
+            options={
+                'verbose_name': '差分パッケージ',
+                'verbose_name_plural': '差分パッケージ',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='addonrelease',
+            constraint=models.UniqueConstraint(fields=('addon', 'version'), name='unique_addon_release_version'),
+        ),
+        migrations.AddConstraint(
+            model_name='addondelta',
+            constraint=models.UniqueConstraint(fields=('from_release', 'to_release'), name='unique_addon_delta'),
+        ),
+        migrations.RunPython(record_current_releases, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:19
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0019_addon_releases'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('session_key', models.CharField(blank=True, max_length=40)),
+                ('filename', models.CharField(max_length=255, verbose_name='ファイル名')),
+                ('size', models.BigIntegerField(verbose_name='サイズ')),
+                ('chunk_size', models.PositiveIntegerField(verbose_name='チャンクサイズ')),
+                ('received', models.BigIntegerField(default=0, verbose_name='受信済みバイト数')),
+                ('sha256', models.CharField(blank=True, max_length=64, verbose_name='SHA-256')),
+                ('status', models.CharField(choices=[('uploading', 'アップロード中'), ('complete', '完了')], default='uploading', max_length=20, verbose_name='状態')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'アップロードセッション',
+                'verbose_name_plural': 'アップロードセッション',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0020_uploadsession'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='banrecord',
+            index=models.Index(fields=['user', 'expires_at'], name='project_ban_user_expires_idx'),
+        ),
+    ]
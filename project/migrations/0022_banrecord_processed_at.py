@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0021_banrecord_user_expires_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='banrecord',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='期限切れの解除処理（unban_expired）が済んだ日時', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='banrecord',
+            index=models.Index(fields=['processed_at', 'expires_at'], name='project_ban_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0022_banrecord_processed_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchedulerLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('holder', models.CharField(max_length=200, verbose_name='持ち主')),
+                ('expires_at', models.DateTimeField(verbose_name='期限')),
+            ],
+            options={
+                'verbose_name': 'スケジューラのリース',
+                'verbose_name_plural': 'スケジューラのリース',
+            },
+        ),
+        migrations.CreateModel(
+            name='ScheduledRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='ジョブ名')),
+                ('scheduled_for', models.DateTimeField(verbose_name='予定日時')),
+                ('status', models.CharField(choices=[('running', '実行中'), ('done', '完了'), ('failed', '失敗')], default='running', max_length=20, verbose_name='状態')),
+                ('started_at', models.DateTimeField(verbose_name='開始日時')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='終了日時')),
+                ('output', models.TextField(blank=True, verbose_name='出力')),
+                ('error', models.TextField(blank=True, verbose_name='エラー')),
+            ],
+            options={
+                'verbose_name': '定期ジョブの実行記録',
+                'verbose_name_plural': '定期ジョブの実行記録',
+                'ordering': ['-scheduled_for'],
+                'constraints': [models.UniqueConstraint(fields=('name', 'scheduled_for'), name='project_scheduled_run_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0024_outboundemail'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='addon',
+            index=models.Index(condition=models.Q(('published', True)), fields=['created_at', 'id'], name='project_addon_pub_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='addon',
+            index=models.Index(condition=models.Q(('published', True)), fields=['addon_type', 'created_at', 'id'], name='project_addon_pub_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='addon',
+            index=models.Index(condition=models.Q(('published', True)), fields=['downloads', 'id'], name='project_addon_pub_dl_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='addon',
+            index=models.Index(fields=['created_at'], name='project_addon_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['addon', 'created_at', 'id'], name='project_comment_addon_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['created_at'], name='project_comment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contactmessage',
+            index=models.Index(fields=['email', 'created_at'], name='project_contact_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contactmessage',
+            index=models.Index(fields=['handled', 'created_at'], name='project_contact_handled_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contactmessage',
+            index=models.Index(fields=['created_at'], name='project_contact_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['resolved', 'created_at'], name='project_report_resolved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['created_at'], name='project_report_created_idx'),
+        ),
+    ]
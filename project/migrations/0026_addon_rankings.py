@@ -0,0 +1,63 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:41
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def compute_scores(apps, schema_editor):
+    # 最初のスコア。注目スコアはこれまでの全ダウンロード数から始めて、update_rankings のたびに減衰させる
+    Addon = apps.get_model('project', 'Addon')
+    Addon.objects.update(
+        popularity_score=F('downloads') + F('likes') * getattr(settings, 'RANKING_LIKE_WEIGHT', 20)
+        + F('comment_count') * getattr(settings, 'RANKING_COMMENT_WEIGHT', 10),
+        trending_score=F('downloads'),
+        ranked_downloads=F('downloads'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0025_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='addon',
+            name='popularity_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='人気スコア'),
+        ),
+        migrations.AddField(
+            model_name='addon',
+            name='ranked_downloads',
+            field=models.IntegerField(default=0, editable=False, verbose_name='前回のスコア計算時のダウンロード数'),
+        ),
+        migrations.AddField(
+            model_name='addon',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='注目スコア'),
+        ),
+        migrations.AddIndex(
+            model_name='addon',
+            index=models.Index(condition=models.Q(('published', True)), fields=['likes', 'id'], name='project_addon_pub_likes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='addon',
+            index=models.Index(condition=models.Q(('published', True)), fields=['updated_at', 'id'], name='project_addon_pub_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='addon',
+            index=models.Index(condition=models.Q(('published', True)), fields=['name', 'id'], name='project_addon_pub_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='addon',
+            index=models.Index(condition=models.Q(('published', True)), fields=['popularity_score', 'id'], name='project_addon_pub_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='addon',
+            index=models.Index(condition=models.Q(('published', True)), fields=['trending_score', 'id'], name='project_addon_pub_trending_idx'),
+        ),
+        migrations.RunPython(compute_scores, migrations.RunPython.noop),
+    ]
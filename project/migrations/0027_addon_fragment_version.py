@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0026_addon_rankings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='addon',
+            name='fragment_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='断片キャッシュの世代'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:02
+
+import project.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0027_addon_fragment_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='addondelta',
+            name='file',
+            field=models.FileField(blank=True, max_length=255, storage=project.storage.get_media_storage, upload_to='addons/deltas/', verbose_name='差分ファイル'),
+        ),
+        migrations.AlterField(
+            model_name='addonrelease',
+            name='file',
+            field=models.FileField(max_length=255, storage=project.storage.get_media_storage, upload_to='addons/files/', verbose_name='ファイル'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0028_addon_release_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='stored_file',
+            field=models.CharField(blank=True, max_length=255, verbose_name='保存したファイル'),
+        ),
+        migrations.AlterField(
+            model_name='uploadsession',
+            name='status',
+            field=models.CharField(choices=[('uploading', 'アップロード中'), ('storing', '保存中'), ('complete', '完了')], default='uploading', max_length=20, verbose_name='状態'),
+        ),
+    ]
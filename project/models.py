@@ -1,7 +1,40 @@
+import uuid
+
 from django.db import models
 from django.utils.timezone import now
 from django.urls import reverse
 
+from .storage import get_media_storage
+
+
+def file_changed(instance, field_name):
+    """保存しようとしている FileField が DB 上の値から変わったかを返す。"""
+    fieldfile = getattr(instance, field_name)
+    if (fieldfile and not fieldfile._committed) or instance.pk is None:
+        return True
+    old_name = type(instance)._default_manager.filter(pk=instance.pk).values_list(field_name, flat=True).first()
+    return (old_name or '') != (fieldfile.name or '')
+
+
+def changed_files(instance, field_names):
+    """field_names のうち DB 上の値から変わった FileField の名前を返す（新規作成時は値のあるものすべて）。"""
+    if instance.pk is None or instance._state.adding:
+        return [name for name in field_names if getattr(instance, name)]
+    old = type(instance)._default_manager.filter(pk=instance.pk).values(*field_names).first() or {}
+    return [
+        name for name in field_names
+        if not getattr(instance, name)._committed or (old.get(name) or '') != (getattr(instance, name).name or '')
+    ]
+
+
+# メディア処理（project.tasks.process_media）の状態
+MEDIA_STATUS_CHOICES = [
+    ('pending', '処理待ち'),
+    ('processing', '処理中'),
+    ('ready', '完了'),
+    ('failed', '失敗'),
+]
+
 
 class Addon(models.Model):
     """Minecraft Addon (Behavior Pack / Resource Pack)"""
@@ -12,6 +45,10 @@ class Addon(models.Model):
         ('world', 'ワールドテンプレート'),
         ('other', 'その他'),
     ]
+    # 別の経路で F() 更新されるため、通常の save() では書き込まない列
+    COUNTER_FIELDS = ('downloads', 'comment_count', 'fragment_version')
+    # バックグラウンドのジョブ・定期実行（update_rankings）が update() で書き込む列。これも通常の save() では書き込まない
+    WORKER_FIELDS = ('media_status', 'min_engine_code', 'popularity_score', 'trending_score', 'ranked_downloads')
 
     name = models.CharField('アドオン名', max_length=100)
     slug = models.SlugField('URL用の名前', unique=True)
@@ -23,14 +60,28 @@ class Addon(models.Model):
     author = models.CharField('作成者', max_length=100)
     
     minecraft_version = models.CharField('対応 Minecraft バージョン', max_length=50, default='1.21+')
+    # アップロードされたファイルの manifest.json から読み取った必要エンジンバージョン（1.20.30 → 1020030）
+    # project.manifests がパックの中で一番新しい min_engine_version を書き込む
+    min_engine_code = models.PositiveIntegerField('必要エンジンバージョン', null=True, blank=True, db_index=True, editable=False)
     
     # メディア
-    thumbnail = models.ImageField('サムネイル', upload_to='addons/thumbnails/', null=True, blank=True)
-    download_file = models.FileField('ダウンロードファイル', upload_to='addons/files/')
+    thumbnail = models.ImageField('サムネイル', upload_to='addons/thumbnails/', storage=get_media_storage, max_length=255, null=True, blank=True)
+    download_file = models.FileField('ダウンロードファイル', upload_to='addons/files/', storage=get_media_storage, max_length=255)
+    # ETag 用のファイル内容ハッシュ。初回配信時に計算して保存する（project.delivery を参照）
+    download_sha256 = models.CharField('ファイルの SHA-256', max_length=64, blank=True, editable=False)
+    media_status = models.CharField('メディア処理', max_length=20, choices=MEDIA_STATUS_CHOICES, default='ready', editable=False)
     
     # メタデータ
     downloads = models.IntegerField('ダウンロード数', default=0)
     likes = models.IntegerField('いいね数', default=0)
+    # コメント数（Comment の保存・削除時にシグナルで加減算する）
+    comment_count = models.IntegerField('コメント数', default=0)
+    # 詳細ページの断片キャッシュの世代（スクリーンショット・動画・コメントの変更時に F() で加算する。project/fragment_cache.py）
+    fragment_version = models.PositiveIntegerField('断片キャッシュの世代', default=0, editable=False)
+    # 一覧の人気順・注目順のスコア（`manage.py update_rankings` で定期的に計算する。project/ranking.py を参照）
+    popularity_score = models.FloatField('人気スコア', default=0, editable=False)
+    trending_score = models.FloatField('注目スコア', default=0, editable=False)
+    ranked_downloads = models.IntegerField('前回のスコア計算時のダウンロード数', default=0, editable=False)
     created_at = models.DateTimeField('作成日', auto_now_add=True)
     updated_at = models.DateTimeField('更新日', auto_now=True)
     published = models.BooleanField('公開', default=True)
@@ -42,6 +93,21 @@ class Addon(models.Model):
         ordering = ['-created_at']
         verbose_name = 'アドオン'
         verbose_name_plural = 'アドオン'
+        indexes = [
+            # 公開中のアドオンの一覧（ホーム・一覧の新着順、種類での絞り込み、ダウンロード数順）用。
+            # キーセットページネーションが末尾に id を足すので、id まで含める
+            models.Index(fields=['created_at', 'id'], name='project_addon_pub_created_idx', condition=models.Q(published=True)),
+            models.Index(fields=['addon_type', 'created_at', 'id'], name='project_addon_pub_type_idx', condition=models.Q(published=True)),
+            models.Index(fields=['downloads', 'id'], name='project_addon_pub_dl_idx', condition=models.Q(published=True)),
+            # 一覧のその他の並び順（project/ranking.py の SORT_OPTIONS）用
+            models.Index(fields=['likes', 'id'], name='project_addon_pub_likes_idx', condition=models.Q(published=True)),
+            models.Index(fields=['updated_at', 'id'], name='project_addon_pub_updated_idx', condition=models.Q(published=True)),
+            models.Index(fields=['name', 'id'], name='project_addon_pub_name_idx', condition=models.Q(published=True)),
+            models.Index(fields=['popularity_score', 'id'], name='project_addon_pub_popular_idx', condition=models.Q(published=True)),
+            models.Index(fields=['trending_score', 'id'], name='project_addon_pub_trending_idx', condition=models.Q(published=True)),
+            # 管理画面の一覧（非公開も含めて新着順）用
+            models.Index(fields=['created_at'], name='project_addon_created_idx'),
+        ]
 
     def __str__(self):
         return f'{self.name} ({self.get_addon_type_display()})'
@@ -49,17 +115,195 @@ class Addon(models.Model):
     def get_absolute_url(self):
         return reverse('addon_detail', kwargs={'slug': self.slug})
 
+    def save(self, *args, **kwargs):
+        # ファイルが差し替えられたらハッシュを計算し直す
+        if self.download_sha256 and file_changed(self, 'download_file'):
+            self.download_sha256 = ''
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # カウンタ列は F() で加算されるため、読み込み時の古い値で上書きしない
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.COUNTER_FIELDS + self.WORKER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def min_engine_version(self):
+        """min_engine_code を "1.20.30" の形に戻したもの。"""
+        if self.min_engine_code is None:
+            return ''
+        major, rest = divmod(self.min_engine_code, 1_000_000)
+        return f'{major}.{rest // 1000}.{rest % 1000}'
+
     def increment_downloads(self):
-        self.downloads += 1
-        self.save(update_fields=['downloads'])
+        # Addon 行を直接更新するとロック競合・取りこぼしが起きるため、
+        # シャードに記録して後でまとめて反映する（project.downloads を参照）
+        from .downloads import record_download
+        record_download(self)
+
+
+class AddonTypeStatistic(models.Model):
+    """公開中アドオンの件数・ダウンロード数の集計（種類ごとに 1 行）。
+
+    ホームページで毎回全件を集計しないよう、アドオンの保存・削除とダウンロード数の反映時に
+    差分で更新する（project.stats を参照）。`manage.py rebuild_site_stats` で作り直せる。
+    """
+    addon_type = models.CharField('種類', max_length=20, choices=Addon.ADDON_TYPE_CHOICES, unique=True)
+    addon_count = models.IntegerField('アドオン数', default=0)
+    total_downloads = models.BigIntegerField('合計ダウンロード数', default=0)
+    updated_at = models.DateTimeField('更新日', auto_now=True)
+
+    class Meta:
+        ordering = ['addon_type']
+        verbose_name = 'サイト統計'
+        verbose_name_plural = 'サイト統計'
+
+    def __str__(self):
+        return f'{self.get_addon_type_display()}: {self.addon_count} 件 / {self.total_downloads} DL'
+
+
+class AddonSearchDocument(models.Model):
+    """アドオン検索用のトークン列。
+
+    日本語は分かち書きされないため、名前・説明を文字 bigram に分割して保存し、
+    SQLite では FTS5、PostgreSQL では GIN インデックスで検索する（project.search を参照）。
+    """
+    addon = models.OneToOneField(Addon, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    title_tokens = models.TextField('名前・作成者のトークン', blank=True)
+    body_tokens = models.TextField('説明のトークン', blank=True)
+    updated_at = models.DateTimeField('更新日', auto_now=True)
+
+    class Meta:
+        verbose_name = '検索インデックス'
+        verbose_name_plural = '検索インデックス'
+
+    def __str__(self):
+        return f'SearchDocument({self.addon_id})'
+
+
+class DownloadCounterShard(models.Model):
+    """未反映のダウンロード数を保持するシャード行。
+
+    ダウンロードのたびに Addon 行を更新すると人気アドオンで行ロックが集中するため、
+    アドオンごとに複数の行へ分散して加算し、定期的に Addon.downloads へまとめて反映する。
+    """
+    addon = models.ForeignKey(Addon, on_delete=models.CASCADE, related_name='download_shards')
+    shard = models.PositiveSmallIntegerField('シャード番号')
+    count = models.PositiveIntegerField('未反映のダウンロード数', default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['addon', 'shard'], name='unique_download_counter_shard'),
+        ]
+        verbose_name = 'ダウンロード数シャード'
+        verbose_name_plural = 'ダウンロード数シャード'
+
+    def __str__(self):
+        return f'{self.addon_id}#{self.shard}: {self.count}'
+
+
+class AddonPack(models.Model):
+    """アドオンのファイルに含まれるパック（manifest.json 1 つ分）。project.manifests が作る。"""
+    addon = models.ForeignKey(Addon, on_delete=models.CASCADE, related_name='packs')
+    path = models.CharField('アーカイブ内のパス', max_length=255)
+    uuid = models.CharField('UUID', max_length=36, db_index=True)
+    name = models.CharField('パック名', max_length=200, blank=True)
+    version = models.CharField('バージョン', max_length=50, blank=True)
+    pack_type = models.CharField('種類', max_length=20, choices=Addon.ADDON_TYPE_CHOICES, default='other')
+    module_types = models.JSONField('モジュールの種類', default=list, blank=True)
+    min_engine_version = models.CharField('min_engine_version', max_length=50, blank=True)
+    min_engine_code = models.PositiveIntegerField('必要エンジンバージョン', null=True, blank=True, db_index=True)
+
+    class Meta:
+        ordering = ['addon', 'path']
+        verbose_name = 'パック'
+        verbose_name_plural = 'パック'
+
+    def __str__(self):
+        return f'{self.name or self.uuid} ({self.version})'
+
+
+class AddonPackDependency(models.Model):
+    """パックの依存先（manifest.json の dependencies）。"""
+    pack = models.ForeignKey(AddonPack, on_delete=models.CASCADE, related_name='dependencies')
+    # パックへの依存は uuid、スクリプト API（@minecraft/server など）への依存は module_name
+    uuid = models.CharField('UUID', max_length=36, blank=True, db_index=True)
+    module_name = models.CharField('モジュール名', max_length=100, blank=True)
+    version = models.CharField('バージョン', max_length=50, blank=True)
+
+    class Meta:
+        verbose_name = 'パックの依存関係'
+        verbose_name_plural = 'パックの依存関係'
+
+    def __str__(self):
+        return f'{self.pack} -> {self.uuid or self.module_name} {self.version}'
+
+
+class AddonRelease(models.Model):
+    """アップロードされたファイルの版（差分ダウンロードの元・先になる）。project.releases を参照。"""
+    addon = models.ForeignKey(Addon, on_delete=models.CASCADE, related_name='releases')
+    version = models.CharField('バージョン', max_length=20)
+    file = models.FileField('ファイル', upload_to='addons/files/', storage=get_media_storage, max_length=255)
+    sha256 = models.CharField('SHA-256', max_length=64, blank=True)
+    size = models.BigIntegerField('サイズ', default=0)
+    created_at = models.DateTimeField('作成日', auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at', '-pk']
+        verbose_name = 'リリース'
+        verbose_name_plural = 'リリース'
+        constraints = [
+            models.UniqueConstraint(fields=['addon', 'version'], name='unique_addon_release_version'),
+        ]
+
+    def __str__(self):
+        return f'{self.addon.name} v{self.version}'
+
+
+class AddonDelta(models.Model):
+    """2 つのリリース間の差分パッケージ。差分の方が大きくなる場合は file を空にして記録だけ残す。"""
+    from_release = models.ForeignKey(AddonRelease, on_delete=models.CASCADE, related_name='deltas_from')
+    to_release = models.ForeignKey(AddonRelease, on_delete=models.CASCADE, related_name='deltas_to')
+    file = models.FileField('差分ファイル', upload_to='addons/deltas/', storage=get_media_storage, max_length=255, blank=True)
+    size = models.BigIntegerField('サイズ', default=0)
+    created_at = models.DateTimeField('作成日', auto_now_add=True)
+
+    class Meta:
+        verbose_name = '差分パッケージ'
+        verbose_name_plural = '差分パッケージ'
+        constraints = [
+            models.UniqueConstraint(fields=['from_release', 'to_release'], name='unique_addon_delta'),
+        ]
+
+    def __str__(self):
+        return f'{self.from_release} -> v{self.to_release.version}'
+
+
+class StoredBlob(models.Model):
+    """内容ごとに 1 つだけ保存されたアップロードファイル（project.storage を参照）。"""
+    sha256 = models.CharField('SHA-256', max_length=64, unique=True)
+    name = models.CharField('保存先', max_length=255)
+    size = models.BigIntegerField('サイズ', default=0)
+    # この blob を参照しているモデルの列の数。0 のものは collect_blobs で削除される
+    ref_count = models.IntegerField('参照数', default=0)
+    created_at = models.DateTimeField('作成日', auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'ファイル実体'
+        verbose_name_plural = 'ファイル実体'
+
+    def __str__(self):
+        return f'{self.sha256[:12]} ({self.ref_count} 参照)'
 
 
 class AddonScreenshot(models.Model):
     """Screenshots for addon detail page"""
     addon = models.ForeignKey(Addon, on_delete=models.CASCADE, related_name='screenshots')
-    image = models.ImageField('スクリーンショット', upload_to='addons/screenshots/')
+    image = models.ImageField('スクリーンショット', upload_to='addons/screenshots/', storage=get_media_storage, max_length=255)
     caption = models.CharField('キャプション', max_length=255, blank=True)
     order = models.PositiveIntegerField('順序', default=0)
+    media_status = models.CharField('メディア処理', max_length=20, choices=MEDIA_STATUS_CHOICES, default='ready', editable=False)
 
     class Meta:
         ordering = ['order']
@@ -80,11 +324,13 @@ class AddonVideo(models.Model):
     
     addon = models.ForeignKey(Addon, on_delete=models.CASCADE, related_name='videos')
     video_type = models.CharField('動画タイプ', max_length=20, choices=VIDEO_TYPE_CHOICES, default='file')
-    video_file = models.FileField('動画ファイル', upload_to='addons/videos/', null=True, blank=True)
+    video_file = models.FileField('動画ファイル', upload_to='addons/videos/', storage=get_media_storage, max_length=255, null=True, blank=True)
+    video_sha256 = models.CharField('動画ファイルの SHA-256', max_length=64, blank=True, editable=False)
     video_url = models.URLField('動画URL（YouTubeなど）', null=True, blank=True)
     caption = models.CharField('キャプション', max_length=255, blank=True)
-    thumbnail = models.ImageField('サムネイル', upload_to='addons/video_thumbnails/', null=True, blank=True)
+    thumbnail = models.ImageField('サムネイル', upload_to='addons/video_thumbnails/', storage=get_media_storage, max_length=255, null=True, blank=True)
     order = models.PositiveIntegerField('順序', default=0)
+    media_status = models.CharField('メディア処理', max_length=20, choices=MEDIA_STATUS_CHOICES, default='ready', editable=False)
     created_at = models.DateTimeField('作成日', auto_now_add=True)
 
     class Meta:
@@ -95,6 +341,11 @@ class AddonVideo(models.Model):
     def __str__(self):
         return f'{self.addon.name} - Video {self.order}'
 
+    def save(self, *args, **kwargs):
+        if self.video_sha256 and file_changed(self, 'video_file'):
+            self.video_sha256 = ''
+        super().save(*args, **kwargs)
+
     def get_embed_url(self):
         """YouTubeのURLを埋め込み対応のURLに変換"""
         if self.video_type == 'youtube' and self.video_url:
@@ -118,6 +369,12 @@ class Comment(models.Model):
         ordering = ['-created_at']
         verbose_name = 'コメント'
         verbose_name_plural = 'コメント'
+        indexes = [
+            # アドオン詳細のコメント（新しい順、project/views.py の comment_page）用
+            models.Index(fields=['addon', 'created_at', 'id'], name='project_comment_addon_idx'),
+            # 管理画面の一覧用
+            models.Index(fields=['created_at'], name='project_comment_created_idx'),
+        ]
 
     def __str__(self):
         user = self.user.username if self.user else '匿名'
@@ -223,6 +480,11 @@ class Report(models.Model):
         ordering = ['-created_at']
         verbose_name = '通報'
         verbose_name_plural = '通報'
+        indexes = [
+            # 管理画面の一覧（対応済みかどうかでの絞り込み・新着順）用
+            models.Index(fields=['resolved', 'created_at'], name='project_report_resolved_idx'),
+            models.Index(fields=['created_at'], name='project_report_created_idx'),
+        ]
 
     def __str__(self):
         who = self.reporter.username if self.reporter else '匿名'
@@ -237,15 +499,32 @@ class BanRecord(models.Model):
     reason = models.CharField(max_length=255, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField(null=True, blank=True, help_text='NULL=永久BAN')
+    processed_at = models.DateTimeField(null=True, blank=True, editable=False, help_text='期限切れの解除処理（unban_expired）が済んだ日時')
 
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'BAN履歴'
         verbose_name_plural = 'BAN履歴'
+        indexes = [
+            # ユーザーの有効な BAN の検索（project/bans.py）用
+            models.Index(fields=['user', 'expires_at'], name='project_ban_user_expires_idx'),
+            # 未処理の期限切れ BAN の検索（unban_expired）用
+            models.Index(fields=['processed_at', 'expires_at'], name='project_ban_pending_idx'),
+        ]
 
     def __str__(self):
         return f'BAN: {self.user.username} by {self.banned_by.username if self.banned_by else "system"}'
 
+    def save(self, *args, **kwargs):
+        # 解除処理済みのレコードの期限を変えたら、新しい期限で unban_expired にもう一度処理させる
+        if self.processed_at is not None and self.pk is not None:
+            stored = BanRecord.objects.filter(pk=self.pk).values_list('expires_at', flat=True).first()
+            if stored != self.expires_at:
+                self.processed_at = None
+                if kwargs.get('update_fields') is not None:
+                    kwargs['update_fields'] = {*kwargs['update_fields'], 'processed_at'}
+        super().save(*args, **kwargs)
+
     @property
     def is_active(self):
         from django.utils.timezone import now
@@ -269,6 +548,13 @@ class ContactMessage(models.Model):
         ordering = ['-created_at']
         verbose_name = 'お問い合わせメッセージ'
         verbose_name_plural = 'お問い合わせメッセージ'
+        indexes = [
+            # 自分のお問い合わせ一覧（メールアドレスで絞り込み・新着順）用
+            models.Index(fields=['email', 'created_at'], name='project_contact_email_idx'),
+            # スタッフ向けの一覧・管理画面（対応済みかどうかでの絞り込み・新着順）用
+            models.Index(fields=['handled', 'created_at'], name='project_contact_handled_idx'),
+            models.Index(fields=['created_at'], name='project_contact_created_idx'),
+        ]
 
     def __str__(self):
         return f'{self.name} <{self.email}> - {self.subject or "(件名なし)"} ({self.created_at:%Y-%m-%d %H:%M})'
@@ -289,3 +575,151 @@ class ContactReply(models.Model):
 
     def __str__(self):
         return f'Reply to {self.contact.id} by {self.replied_by.username if self.replied_by else "(unknown)"} at {self.replied_at:%Y-%m-%d %H:%M}'
+
+
+class Job(models.Model):
+    """バックグラウンドで実行するジョブ（DB をキューとして使う）。
+
+    `project.jobs.enqueue()` で登録し、`manage.py run_jobs` のワーカーがプロセスプールで実行する。
+    失敗したジョブは間隔を空けて max_attempts 回まで再実行される。
+    """
+    STATUS_CHOICES = [
+        ('pending', '待機中'),
+        ('running', '実行中'),
+        ('done', '完了'),
+        ('failed', '失敗'),
+    ]
+
+    task = models.CharField('タスク名', max_length=100)
+    payload = models.JSONField('引数', default=dict, blank=True)
+    status = models.CharField('状態', max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField('実行回数', default=0)
+    max_attempts = models.PositiveIntegerField('最大実行回数', default=5)
+    run_after = models.DateTimeField('実行予定日時', default=now)
+    locked_at = models.DateTimeField('実行開始日時', null=True, blank=True)
+    last_error = models.TextField('最後のエラー', blank=True)
+    created_at = models.DateTimeField('作成日', auto_now_add=True)
+    finished_at = models.DateTimeField('完了日時', null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'ジョブ'
+        verbose_name_plural = 'ジョブ'
+        indexes = [models.Index(fields=['status', 'run_after'], name='project_job_due_idx')]
+
+    def __str__(self):
+        return f'{self.task} #{self.pk} ({self.get_status_display()})'
+
+
+class UploadSession(models.Model):
+    """分割アップロード（再開可能）のセッション。project.uploads を参照。"""
+    STATUS_CHOICES = [
+        ('uploading', 'アップロード中'),
+        ('storing', '保存中'),
+        ('complete', '完了'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey('auth.User', on_delete=models.CASCADE, null=True, blank=True, related_name='upload_sessions')
+    # 未ログインのアップロードはセッションで持ち主を判定する
+    session_key = models.CharField(max_length=40, blank=True)
+    filename = models.CharField('ファイル名', max_length=255)
+    size = models.BigIntegerField('サイズ')
+    chunk_size = models.PositiveIntegerField('チャンクサイズ')
+    # 先頭から連続して受け取ったバイト数（次のチャンクのオフセット）
+    received = models.BigIntegerField('受信済みバイト数', default=0)
+    sha256 = models.CharField('SHA-256', max_length=64, blank=True)
+    status = models.CharField('状態', max_length=20, choices=STATUS_CHOICES, default='uploading')
+    # ワーカー（store_upload）が download_file のストレージに保存したファイルの名前
+    stored_file = models.CharField('保存したファイル', max_length=255, blank=True)
+    created_at = models.DateTimeField('作成日', auto_now_add=True)
+    updated_at = models.DateTimeField('更新日', auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'アップロードセッション'
+        verbose_name_plural = 'アップロードセッション'
+
+    def __str__(self):
+        return f'{self.filename} ({self.received}/{self.size})'
+
+
+class SchedulerLease(models.Model):
+    """定期ジョブのスケジューラのリーダーを決めるリース（project.scheduler を参照）。"""
+    name = models.CharField(max_length=50, unique=True)
+    holder = models.CharField('持ち主', max_length=200)
+    expires_at = models.DateTimeField('期限')
+
+    class Meta:
+        verbose_name = 'スケジューラのリース'
+        verbose_name_plural = 'スケジューラのリース'
+
+    def __str__(self):
+        return f'{self.name}: {self.holder}'
+
+
+class ScheduledRun(models.Model):
+    """定期ジョブの実行記録。同じジョブの同じ予定時刻は 1 回しか実行しない。"""
+    STATUS_CHOICES = [
+        ('running', '実行中'),
+        ('done', '完了'),
+        ('failed', '失敗'),
+    ]
+
+    name = models.CharField('ジョブ名', max_length=100)
+    scheduled_for = models.DateTimeField('予定日時')
+    status = models.CharField('状態', max_length=20, choices=STATUS_CHOICES, default='running')
+    started_at = models.DateTimeField('開始日時')
+    finished_at = models.DateTimeField('終了日時', null=True, blank=True)
+    output = models.TextField('出力', blank=True)
+    error = models.TextField('エラー', blank=True)
+
+    class Meta:
+        ordering = ['-scheduled_for']
+        verbose_name = '定期ジョブの実行記録'
+        verbose_name_plural = '定期ジョブの実行記録'
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'scheduled_for'], name='project_scheduled_run_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} {self.scheduled_for:%Y-%m-%d %H:%M} ({self.get_status_display()})'
+
+    @property
+    def duration(self):
+        if self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+
+class OutboundEmail(models.Model):
+    """送信待ちのメール。`project.mail.queue_mail()` で登録し、ワーカーがまとめて送る。"""
+    STATUS_CHOICES = [
+        ('pending', '送信待ち'),
+        ('sending', '送信中'),
+        ('sent', '送信済み'),
+        ('failed', '失敗'),
+    ]
+
+    reply = models.ForeignKey(ContactReply, on_delete=models.SET_NULL, null=True, blank=True, related_name='emails')
+    subject = models.CharField('件名', max_length=255)
+    body = models.TextField('本文')
+    from_email = models.CharField('送信元', max_length=254)
+    to = models.JSONField('宛先', default=list)
+    status = models.CharField('状態', max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField('送信回数', default=0)
+    max_attempts = models.PositiveIntegerField('最大送信回数', default=5)
+    next_attempt_at = models.DateTimeField('送信予定日時', default=now)
+    locked_at = models.DateTimeField('送信開始日時', null=True, blank=True)
+    last_error = models.TextField('最後のエラー', blank=True)
+    created_at = models.DateTimeField('作成日', auto_now_add=True)
+    sent_at = models.DateTimeField('送信日時', null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = '送信メール'
+        verbose_name_plural = '送信メール'
+        indexes = [models.Index(fields=['status', 'next_attempt_at'], name='project_mail_due_idx')]
+
+    def __str__(self):
+        return f'{self.subject} → {", ".join(self.to)} ({self.get_status_display()})'
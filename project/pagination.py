@@ -0,0 +1,158 @@
+"""キーセット（カーソル）方式のページネーション。
+
+Django 標準の Paginator は COUNT(*) と OFFSET n を発行するため、後ろのページほど遅くなる。
+KeysetPaginationMixin を ListView に混ぜ、settings.KEYSET_PAGINATION を True にすると、
+並び順のキー（例: -created_at, id）で「直前に表示した行の続き」を WHERE 句で取得する。
+どのページも同じコストになる代わりに、ページ番号への直接ジャンプはできない。
+総件数はキャッシュした概数（KEYSET_COUNT_CACHE_TIMEOUT 秒）を表示に使う。
+"""
+import base64
+import binascii
+import hashlib
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+
+def keyset_ordering(queryset):
+    """QuerySet の並び順を (フィールド名, 降順か) のリストにし、一意になるよう id を末尾に足す。"""
+    ordering = []
+    for item in queryset.query.order_by or queryset.model._meta.ordering:
+        if not isinstance(item, str) or '__' in item.lstrip('-'):
+            raise ValueError(f'キーセットページネーションに使えない並び順です: {item!r}')
+        name = item.lstrip('-')
+        ordering.append(('id' if name == 'pk' else name, item.startswith('-')))
+    if not any(name == 'id' for name, _ in ordering):
+        # 同じ値の行が並んだときの順序を決めるため、直前のキーと同じ向きで id を足す
+        ordering.append(('id', ordering[-1][1] if ordering else False))
+    return ordering
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(values, direction):
+    payload = json.dumps({'v': [_encode_value(v) for v in values], 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, ordering):
+    """カーソル文字列を (値のリスト, 向き) に戻す。不正なら Http404。"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        raw_values, direction = payload['v'], payload['d']
+        if direction not in ('next', 'prev') or len(raw_values) != len(ordering):
+            raise ValueError
+        values = []
+        for (name, _desc), raw in zip(ordering, raw_values):
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                # 検索の関連度などの注釈値はそのまま使う
+                values.append(raw)
+            else:
+                values.append(field.to_python(raw))
+        return values, direction
+    except (ValueError, KeyError, TypeError, binascii.Error, ValidationError):
+        raise Http404('不正なカーソルです')
+
+
+def _after(ordering, values, reverse=False):
+    """並び順で values より後ろ（reverse なら前）の行を表す Q を作る。"""
+    condition = Q()
+    equal = Q()
+    for (name, desc), value in zip(ordering, values):
+        lookup = 'lt' if desc != reverse else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+class KeysetPage:
+    """テンプレートに page_obj として渡すページ。"""
+
+    def __init__(self, object_list, ordering, has_next, has_previous, approximate_count):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.approximate_count = approximate_count
+        self._ordering = ordering
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def _cursor(self, obj, direction):
+        return encode_cursor([getattr(obj, name) for name, _desc in self._ordering], direction)
+
+    @property
+    def next_cursor(self):
+        return self._cursor(self.object_list[-1], 'next') if self.has_next else None
+
+    @property
+    def previous_cursor(self):
+        return self._cursor(self.object_list[0], 'prev') if self.has_previous else None
+
+
+def approximate_count(queryset):
+    """件数をキャッシュから返す。無ければ数えてキャッシュする。"""
+    timeout = getattr(settings, 'KEYSET_COUNT_CACHE_TIMEOUT', 300)
+    key = 'listing-count:' + hashlib.md5(str(queryset.query).encode()).hexdigest()
+    return cache.get_or_set(key, queryset.count, timeout)
+
+
+def paginate_keyset(queryset, page_size, cursor=None, count=True):
+    """カーソルの続きを 1 ページ分取得する。count=False なら件数を数えない。"""
+    ordering = keyset_ordering(queryset)
+    order_by = [f'-{name}' if desc else name for name, desc in ordering]
+    count = approximate_count(queryset) if count else None
+    if not cursor:
+        rows = list(queryset.order_by(*order_by)[:page_size + 1])
+        return KeysetPage(rows[:page_size], ordering, len(rows) > page_size, False, count)
+
+    values, direction = decode_cursor(cursor, queryset.model, ordering)
+    if direction == 'next':
+        rows = list(queryset.filter(_after(ordering, values)).order_by(*order_by)[:page_size + 1])
+        return KeysetPage(rows[:page_size], ordering, len(rows) > page_size, True, count)
+
+    # 前のページは逆順に取得してから並べ直す
+    reversed_order = [name if desc else f'-{name}' for name, desc in ordering]
+    rows = list(queryset.filter(_after(ordering, values, reverse=True)).order_by(*reversed_order)[:page_size + 1])
+    page_rows = rows[:page_size][::-1]
+    return KeysetPage(page_rows, ordering, True, len(rows) > page_size, count)
+
+
+class KeysetPaginationMixin:
+    """settings.KEYSET_PAGINATION が True のとき ListView をカーソル方式でページ分割する。"""
+    cursor_kwarg = 'cursor'
+
+    def use_keyset_pagination(self):
+        return getattr(settings, 'KEYSET_PAGINATION', False)
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_keyset_pagination():
+            return super().paginate_queryset(queryset, page_size)
+        page = paginate_keyset(queryset, page_size, self.request.GET.get(self.cursor_kwarg))
+        return (None, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['keyset_pagination'] = self.use_keyset_pagination()
+        return context
@@ -0,0 +1,91 @@
+"""よく実行されるクエリの実行計画の確認（`manage.py explain_queries`）。
+
+設定中のデータベースで EXPLAIN を実行し、インデックスを使わずにテーブル全体を読む（シーケンシャルスキャン）
+クエリと、インデックスで並べられずにソートしているクエリを見つける。
+
+- SQLite    : EXPLAIN QUERY PLAN の「SCAN テーブル」（USING INDEX が無いもの）と「USE TEMP B-TREE FOR ORDER BY」
+- PostgreSQL: 「Seq Scan」と「Sort」。行数が少ないとインデックスがあっても Seq Scan を選ぶので、
+              enable_seqscan を切った上で実行計画を取る（それでも Seq Scan ならインデックスが無い）
+- MySQL     : EXPLAIN FORMAT=JSON の access_type が ALL のもの（ソートは using_filesort）
+"""
+import json
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.timezone import now
+
+from . import bans, ranking
+
+SORT = 'sort'
+SEQ_SCAN = 'seq_scan'
+
+
+def hot_queries():
+    """[(名前, QuerySet, ソートしてよいか), ...]。ビュー・認証・管理画面・定期実行のコマンドが発行するのと同じ条件にする。
+
+    ソートしてよいのは、絞り込んだ後の行がもともと少ないクエリ。
+    """
+    from .models import Addon, BanRecord, Comment, ContactMessage, Job, OutboundEmail, Report, Wiki
+
+    at = now()
+    addon_id = Addon.objects.values_list('pk', flat=True).first() or 0
+    published = Addon.objects.filter(published=True)
+    queries = [
+        ('home: 新着アドオン', published.order_by('-created_at')[:6], False),
+        ('addon_list: 新着順の次のページ', published.filter(Q(created_at__lt=at) | Q(created_at=at, id__lt=addon_id)).order_by('-created_at', '-id')[:13], False),
+        ('addon_list: 種類で絞り込み', published.filter(addon_type='behavior').order_by('-created_at', '-id')[:13], False),
+        ('addon_detail: スラッグ', published.filter(slug='example'), False),
+        ('addon_detail: コメント', Comment.objects.filter(addon_id=addon_id).order_by('-created_at', '-id')[:21], False),
+        ('auth: 有効な BAN', BanRecord.objects.filter(user_id=1).filter(bans.active_q(at)).order_by().values('expires_at'), False),
+        ('contact: 自分のお問い合わせ', ContactMessage.objects.filter(email='user@example.com').order_by('-created_at')[:50], False),
+        ('contact: スタッフ向けの一覧', ContactMessage.objects.order_by('-created_at')[:200], False),
+        ('admin: 未対応のお問い合わせ', ContactMessage.objects.filter(handled=False).order_by('-created_at')[:100], False),
+        ('admin: 未対応の通報', Report.objects.filter(resolved=False).order_by('-created_at')[:100], False),
+        ('admin: 通報の一覧', Report.objects.order_by('-created_at')[:100], False),
+        ('admin: アドオンの一覧', Addon.objects.order_by('-created_at')[:100], False),
+        ('admin: コメントの一覧', Comment.objects.order_by('-created_at')[:100], False),
+        ('wiki_list', Wiki.objects.order_by('title')[:21], False),
+        # 未処理の期限切れ BAN は unban_expired を実行するたびに無くなるので、ソートしても少ない
+        ('unban_expired: 未処理の期限切れ BAN', BanRecord.objects.filter(processed_at__isnull=True, expires_at__isnull=False, expires_at__lte=at)
+         .filter(pk__gt=0).order_by('pk').values_list('pk', 'user_id')[:1000], True),
+        ('run_jobs: 実行待ちのジョブ', Job.objects.filter(status='pending', run_after__lte=at).order_by('run_after', 'pk')[:10], False),
+        ('send_queued_mail: 送信待ちのメール', OutboundEmail.objects.filter(status='pending', next_attempt_at__lte=at).order_by('next_attempt_at', 'pk')[:50], False),
+    ]
+    # 一覧の並び順（検索語が無いとき）
+    for key, (label, _ordering) in ranking.SORT_OPTIONS.items():
+        queries.append((f'addon_list: {label}', ranking.order_addons(published, key)[:13], False))
+    return queries
+
+
+def explain(queryset):
+    """実行計画を (テキスト, 問題のリスト) で返す。問題は SEQ_SCAN（テーブル名つき）と SORT。"""
+    vendor = connection.vendor
+    if vendor == 'postgresql':
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain()
+        issues = [(SEQ_SCAN, table) for table in re.findall(r'Seq Scan on (\w+)', plan)]
+        issues += [(SORT, '')] if re.search(r'(?<!Incremental )\bSort\b', plan) else []
+    elif vendor == 'mysql':
+        plan = queryset.explain(format='json')
+        data = json.loads(plan)
+        issues = [(SEQ_SCAN, table['table_name']) for table in _mysql_tables(data) if table.get('access_type') == 'ALL']
+        issues += [(SORT, '')] if '"using_filesort": true' in plan else []
+    else:
+        plan = queryset.explain()
+        issues = [(SEQ_SCAN, table) for table in re.findall(r'\bSCAN (\w+)\b(?! USING)', plan)]
+        issues += [(SORT, '')] if 'USE TEMP B-TREE FOR ORDER BY' in plan else []
+    return plan, issues
+
+
+def _mysql_tables(data):
+    if isinstance(data, dict):
+        if 'table_name' in data:
+            yield data
+        for value in data.values():
+            yield from _mysql_tables(value)
+    elif isinstance(data, list):
+        for value in data:
+            yield from _mysql_tables(value)
@@ -0,0 +1,73 @@
+"""アドオン一覧の並び順と、人気順・注目順のスコア計算。
+
+一覧の ?sort= は SORT_OPTIONS のキーだけを受け付ける（知らない値は新着順）。
+どの並び順も公開中のアドオンの部分インデックス（models.Addon の Meta.indexes）で並べられるので、
+件数が増えてもソートの費用は変わらない。
+
+人気順・注目順はリクエストのたびに計算せず、`manage.py update_rankings`（定期実行）で
+Addon.popularity_score / trending_score に書き込んだ値で並べる。
+  - 人気スコア: ダウンロード数 + いいね数 × RANKING_LIKE_WEIGHT + コメント数 × RANKING_COMMENT_WEIGHT
+  - 注目スコア: 前回の計算からのダウンロード数の増分を足し、それまでの値は RANKING_TRENDING_DECAY 倍にする
+    （最近よくダウンロードされているアドオンほど高い。1 時間ごとに 0.9 倍なら半減期はおよそ 6.6 時間）
+"""
+from django.conf import settings
+from django.db.models import F, Max, Value
+from django.db.models.functions import Greatest
+
+# {キー: (表示名, 並び順)}。並び順の末尾の id はキーセットページネーションと同じ向きにする
+SORT_OPTIONS = {
+    'newest': ('新着順', ('-created_at', '-id')),
+    'trending': ('注目順', ('-trending_score', '-id')),
+    'popular': ('人気順', ('-popularity_score', '-id')),
+    'downloads': ('ダウンロード数順', ('-downloads', '-id')),
+    'likes': ('いいね数順', ('-likes', '-id')),
+    'updated': ('更新順', ('-updated_at', '-id')),
+    'name': ('名前順', ('name', 'id')),
+}
+DEFAULT_SORT = 'newest'
+# 検索語があるときだけ使える並び順
+RELEVANCE = 'relevance'
+# 以前の URL（?sort=-downloads など、フィールド名をそのまま渡していた頃）との互換
+SORT_ALIASES = {'-created_at': 'newest', '-downloads': 'downloads', '-likes': 'likes', '-updated_at': 'updated'}
+
+
+def sort_key(value, query=None):
+    """GET の sort を SORT_OPTIONS のキー（または RELEVANCE）にする。使えない値なら DEFAULT_SORT。"""
+    value = SORT_ALIASES.get(value, value)
+    if value == RELEVANCE:
+        return RELEVANCE if query else DEFAULT_SORT
+    return value if value in SORT_OPTIONS else DEFAULT_SORT
+
+
+def sort_choices():
+    """並び順の選択肢 [(キー, 表示名), ...]。"""
+    return [(key, label) for key, (label, _ordering) in SORT_OPTIONS.items()] + [(RELEVANCE, '関連度順')]
+
+
+def order_addons(queryset, key):
+    """sort_key() で決めた並び順で並べる。RELEVANCE は search_addons() で絞り込んだ QuerySet のみ。"""
+    if key == RELEVANCE:
+        return queryset.order_by('-search_rank', '-created_at')
+    return queryset.order_by(*SORT_OPTIONS[key][1])
+
+
+def update_rankings(batch_size=5000):
+    """全アドオンの人気スコア・注目スコアを計算し直す。更新した件数を返す。
+
+    id の範囲ごとに 1 回の UPDATE で計算するので、行を Python に読み込まない。
+    """
+    from .models import Addon
+
+    like_weight = getattr(settings, 'RANKING_LIKE_WEIGHT', 20)
+    comment_weight = getattr(settings, 'RANKING_COMMENT_WEIGHT', 10)
+    decay = getattr(settings, 'RANKING_TRENDING_DECAY', 0.9)
+    max_pk = Addon.objects.aggregate(max_pk=Max('pk'))['max_pk'] or 0
+    updated = 0
+    for start in range(0, max_pk, batch_size):
+        # 右辺は更新前の値で計算される（MySQL は左から順に代入するので ranked_downloads を最後にする）
+        updated += Addon.objects.filter(pk__gt=start, pk__lte=start + batch_size).update(
+            popularity_score=F('downloads') + F('likes') * like_weight + F('comment_count') * comment_weight,
+            trending_score=F('trending_score') * decay + Greatest(F('downloads') - F('ranked_downloads'), Value(0)),
+            ranked_downloads=F('downloads'),
+        )
+    return updated
@@ -0,0 +1,240 @@
+"""アドオンのリリース履歴と、バージョン間の差分パッケージ。
+
+ファイルが差し替えられると process_media が AddonRelease を作り、直前の ADDON_DELTA_BASE_VERSIONS 個の
+リリースからの差分を build_delta タスクで作る。`/addons/<slug>/download/?from=<今のバージョン>` で
+差分があればそれを返す（無ければ通常のファイル）。
+
+差分パッケージは zip で、delta.json に新しいアーカイブの全エントリを順番に並べる:
+
+    {
+      "format": "addon-delta/1",
+      "base":   {"version": "1.0.0", "sha256": "<元のアーカイブの SHA-256>"},
+      "target": {"version": "1.1.0", "sha256": "<新しいアーカイブの SHA-256>", "content_sha256": "..."},
+      "entries": [
+        {"path": "manifest.json", "sha256": "...", "size": 123, "data": "data/0"},
+        {"path": "textures/a.png", "sha256": "...", "size": 456, "from": "textures/a.png"}
+      ]
+    }
+
+"from" のエントリは元のアーカイブから（名前が変わっていてもよい）、"data" のエントリは差分パッケージからコピーする。
+復元後は各エントリの SHA-256 と content_sha256（全エントリの "path\\0sha256\\n" を連結したものの SHA-256）を確かめる。
+zip は圧縮し直すのでアーカイブ自体のバイト列は元と一致しない。apply_delta() が復元の実装。
+"""
+import hashlib
+import json
+import logging
+import tempfile
+import zipfile
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+
+from .delivery import stored_sha256
+from .jobs import task
+
+logger = logging.getLogger(__name__)
+
+DELTA_FORMAT = 'addon-delta/1'
+CHUNK_SIZE = 64 * 1024
+
+
+class DeltaError(ValueError):
+    pass
+
+
+def _entry_sha256(archive, info):
+    digest = hashlib.sha256()
+    with archive.open(info) as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _copy_entry(source, info, target, path):
+    zinfo = zipfile.ZipInfo(path, info.date_time)
+    zinfo.compress_type = target.compression
+    # 大きなファイルで ZIP64 が必要かどうかの判定に使われる
+    zinfo.file_size = info.file_size
+    with source.open(info) as src, target.open(zinfo, 'w') as dst:
+        for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+            dst.write(chunk)
+
+
+def content_sha256(entries):
+    """エントリ一覧（path と sha256）から、アーカイブの中身全体のチェックサムを作る。"""
+    digest = hashlib.sha256()
+    for entry in entries:
+        digest.update(f'{entry["path"]}\0{entry["sha256"]}\n'.encode())
+    return digest.hexdigest()
+
+
+def write_delta(old_file, new_file, out_file, base, target):
+    """old_file → new_file の差分パッケージを out_file に書く。データとして含めたバイト数を返す。
+
+    base / target は delta.json に書く {"version": ..., "sha256": ...}。
+    """
+    entries = []
+    data_size = 0
+    with zipfile.ZipFile(old_file) as old_zip, zipfile.ZipFile(new_file) as new_zip, \
+            zipfile.ZipFile(out_file, 'w', zipfile.ZIP_DEFLATED) as delta_zip:
+        # CRC とサイズが同じものだけ SHA-256 を比べる（中身を全部読まずに済む）
+        candidates = {}
+        for info in old_zip.infolist():
+            if not info.is_dir():
+                candidates.setdefault((info.CRC, info.file_size), []).append(info)
+        old_hashes = {}
+
+        for info in new_zip.infolist():
+            if info.is_dir():
+                continue
+            sha256 = _entry_sha256(new_zip, info)
+            entry = {'path': info.filename, 'sha256': sha256, 'size': info.file_size}
+            for old_info in sorted(candidates.get((info.CRC, info.file_size), []), key=lambda i: i.filename != info.filename):
+                if old_info.filename not in old_hashes:
+                    old_hashes[old_info.filename] = _entry_sha256(old_zip, old_info)
+                if old_hashes[old_info.filename] == sha256:
+                    entry['from'] = old_info.filename
+                    break
+            else:
+                entry['data'] = f'data/{len(entries)}'
+                _copy_entry(new_zip, info, delta_zip, entry['data'])
+                data_size += info.compress_size
+            entries.append(entry)
+
+        manifest = {
+            'format': DELTA_FORMAT,
+            'base': base,
+            'target': dict(target, content_sha256=content_sha256(entries)),
+            'entries': entries,
+        }
+        delta_zip.writestr('delta.json', json.dumps(manifest, ensure_ascii=False, indent=1))
+    return data_size
+
+
+def apply_delta(old_file, delta_file, out_file):
+    """差分パッケージを元のアーカイブに当てて新しいアーカイブを out_file に書く。delta.json の内容を返す。
+
+    元のアーカイブが違う・復元した内容のチェックサムが合わない場合は DeltaError。
+    """
+    with zipfile.ZipFile(delta_file) as delta_zip:
+        try:
+            manifest = json.loads(delta_zip.read('delta.json'))
+        except (KeyError, ValueError) as exc:
+            raise DeltaError('delta.json を読めません') from exc
+        if manifest.get('format') != DELTA_FORMAT:
+            raise DeltaError(f'未対応の形式です: {manifest.get("format")}')
+
+        digest = hashlib.sha256()
+        old_file.seek(0)
+        for chunk in iter(lambda: old_file.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+        if digest.hexdigest() != manifest['base']['sha256']:
+            raise DeltaError('元のアーカイブが差分パッケージの base と一致しません')
+        old_file.seek(0)
+
+        with zipfile.ZipFile(old_file) as old_zip, zipfile.ZipFile(out_file, 'w', zipfile.ZIP_DEFLATED) as out_zip:
+            for entry in manifest['entries']:
+                if 'from' in entry:
+                    _copy_entry(old_zip, old_zip.getinfo(entry['from']), out_zip, entry['path'])
+                else:
+                    _copy_entry(delta_zip, delta_zip.getinfo(entry['data']), out_zip, entry['path'])
+        with zipfile.ZipFile(out_file) as out_zip:
+            for entry in manifest['entries']:
+                if _entry_sha256(out_zip, out_zip.getinfo(entry['path'])) != entry['sha256']:
+                    raise DeltaError(f'{entry["path"]} のチェックサムが一致しません')
+        if content_sha256(manifest['entries']) != manifest['target']['content_sha256']:
+            raise DeltaError('アーカイブ全体のチェックサムが一致しません')
+    return manifest
+
+
+def record_release(addon):
+    """今の download_file をリリースとして記録し、過去のリリースからの差分作成を登録する。
+
+    内容が直前のリリースと同じなら何もしない。作った（更新した）リリースを返す。
+    """
+    from .models import AddonDelta, AddonRelease
+
+    if not addon.download_file:
+        return None
+    sha256 = stored_sha256(addon, 'download_file', 'download_sha256')
+    latest = addon.releases.first()
+    if latest is not None and latest.sha256 == sha256:
+        return None
+
+    with transaction.atomic():
+        release, created = AddonRelease.objects.get_or_create(
+            addon=addon, version=addon.version,
+            defaults={'file': addon.download_file.name, 'sha256': sha256, 'size': addon.download_file.size},
+        )
+        if not created:
+            # 同じバージョンのファイルが差し替えられた。作ってあった差分は使えない
+            AddonDelta.objects.filter(to_release=release).delete()
+            AddonDelta.objects.filter(from_release=release).delete()
+            release.file = addon.download_file.name
+            release.sha256 = sha256
+            release.size = addon.download_file.size
+            release.save()
+
+        bases = addon.releases.exclude(pk=release.pk)[:getattr(settings, 'ADDON_DELTA_BASE_VERSIONS', 3)]
+        for base in bases:
+            build_delta.delay(from_release=base.pk, to_release=release.pk)
+
+        # 古いリリースは消す（参照の無くなったファイルは collect_blobs が消す）
+        keep = getattr(settings, 'ADDON_RELEASE_HISTORY', 5)
+        old_ids = list(addon.releases.values_list('pk', flat=True)[keep:])
+        for old in AddonRelease.objects.filter(pk__in=old_ids):
+            old.delete()
+    return release
+
+
+@task('build_delta')
+def build_delta(from_release, to_release):
+    """2 つのリリースの差分パッケージを作って保存する。"""
+    from .models import AddonDelta, AddonRelease
+
+    base = AddonRelease.objects.filter(pk=from_release).first()
+    target = AddonRelease.objects.filter(pk=to_release).first()
+    if base is None or target is None:
+        return
+    max_ratio = getattr(settings, 'ADDON_DELTA_MAX_RATIO', 0.8)
+    with tempfile.TemporaryFile() as out, base.file.open('rb') as old_file, target.file.open('rb') as new_file:
+        try:
+            write_delta(
+                old_file, new_file, out,
+                base={'version': base.version, 'sha256': base.sha256},
+                target={'version': target.version, 'sha256': target.sha256},
+            )
+        except zipfile.BadZipFile:
+            logger.warning('zip ではないので差分を作れません: %s -> %s', base, target)
+            AddonDelta.objects.update_or_create(from_release=base, to_release=target, defaults={'file': '', 'size': 0})
+            return
+        size = out.tell()
+        delta = AddonDelta.objects.filter(from_release=base, to_release=target).first() or AddonDelta(from_release=base, to_release=target)
+        delta.size = size
+        if size < target.size * max_ratio:
+            out.seek(0)
+            delta.file.save(f'{target.addon.slug}-{base.version}-to-{target.version}.delta.zip', File(out), save=False)
+        else:
+            # 全体をダウンロードするのとあまり変わらないので配信しない
+            delta.file = ''
+        delta.save()
+
+
+def find_delta(addon, from_version):
+    """from_version から今のファイルへの差分パッケージ。無ければ None。"""
+    from .models import AddonDelta
+
+    current = addon.releases.first()
+    if current is None or current.version == from_version:
+        return None
+    sha256 = stored_sha256(addon, 'download_file', 'download_sha256')
+    if current.sha256 != sha256:
+        # 新しいファイルのリリースがまだ記録されていない
+        return None
+    return (
+        AddonDelta.objects.filter(to_release=current, from_release__version=from_version)
+        .exclude(file='')
+        .select_related('from_release', 'to_release')
+        .first()
+    )
@@ -0,0 +1,209 @@
+"""定期実行するメンテナンス処理のスケジューラ（外部の cron を使わない）。
+
+`manage.py runscheduler` を起動しておくと、SCHEDULED_JOBS に書いた管理コマンドを cron 形式のスケジュールで実行する。
+複数のインスタンスが動いていても、SchedulerLease の行（リース）を持っている 1 つ（リーダー）だけが実行する。
+実行結果は ScheduledRun に残る。
+
+    SCHEDULED_JOBS = {
+        'unban_expired': {'schedule': '*/5 * * * *', 'command': 'unban_expired', 'args': ['--batch-size', '1000']},
+    }
+
+スケジュールは「分 時 日 月 曜日」（曜日は 0=日曜）で、*・数値・範囲（1-5）・リスト（1,15）・間隔（*/5）が使える。
+時刻は TIME_ZONE で解釈する。止まっていた間の実行は溜めずに 1 回だけ実行する。
+ジョブの実行中はリースを延長しないので、各コマンドは SCHEDULER_LEASE_SECONDS 以内に終わるようにバッチの大きさを決める。
+"""
+import io
+import logging
+import os
+import socket
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.timezone import now
+
+logger = logging.getLogger(__name__)
+
+LEASE_NAME = 'scheduler'
+# (最小値, 最大値)。分・時・日・月・曜日の順（曜日の 7 は日曜）
+FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+
+class CronError(ValueError):
+    pass
+
+
+def _parse_field(text, low, high):
+    values = set()
+    for part in text.split(','):
+        expr, slash, step = part.partition('/')
+        try:
+            step = int(step) if step else 1
+            if expr == '*':
+                start, end = low, high
+            elif '-' in expr:
+                start, end = (int(v) for v in expr.split('-', 1))
+            else:
+                start = int(expr)
+                # 「5/15」は 5 から最大値まで 15 おき
+                end = high if slash else start
+        except ValueError:
+            raise CronError(f'読めない値です: {part}')
+        if step < 1 or start < low or end > high or start > end:
+            raise CronError(f'範囲外の値です: {part}')
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise CronError(f'「分 時 日 月 曜日」の 5 つを空白区切りで書いてください: {expression}')
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _parse_field(text, low, high) for text, (low, high) in zip(fields, FIELD_RANGES)
+        )
+        self.weekdays = {day % 7 for day in weekdays}
+        # 日と曜日の両方が指定されていればどちらかに合えばよい（cron と同じ）
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def _day_matches(self, dt):
+        day = dt.day in self.days
+        weekday = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def matches(self, dt):
+        dt = timezone.localtime(dt)
+        return (
+            dt.minute in self.minutes and dt.hour in self.hours
+            and dt.month in self.months and self._day_matches(dt)
+        )
+
+    def next_after(self, dt):
+        """dt より後で最初に実行する時刻（分単位）。"""
+        dt = timezone.localtime(dt).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months or not self._day_matches(dt):
+                dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+            elif dt.hour not in self.hours:
+                dt = (dt + timedelta(hours=1)).replace(minute=0)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                # 夏時間の切り替えなどで時差が変わった場合に合わせる
+                return timezone.localtime(dt)
+        raise CronError(f'実行される日時がありません: {self.expression}')
+
+    def latest_before(self, start, at):
+        """start より後、at 以前で最後に実行する時刻。無ければ None。"""
+        latest = None
+        candidate = self.next_after(start)
+        while candidate <= at:
+            latest = candidate
+            candidate = self.next_after(candidate)
+        return latest
+
+
+def scheduled_jobs():
+    """SCHEDULED_JOBS を {名前: (CronSchedule, コマンド名, 引数)} にする。"""
+    jobs = {}
+    for name, config in getattr(settings, 'SCHEDULED_JOBS', {}).items():
+        jobs[name] = (CronSchedule(config['schedule']), config.get('command', name), list(config.get('args', [])))
+    return jobs
+
+
+def make_holder():
+    """このプロセスを表すリースの持ち主名。"""
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def acquire_lease(holder, seconds=None):
+    """リーダーのリースを取る（持っていれば延長する）。取れたら True。"""
+    from .models import SchedulerLease
+
+    seconds = getattr(settings, 'SCHEDULER_LEASE_SECONDS', 600) if seconds is None else seconds
+    current = now()
+    expires_at = current + timedelta(seconds=seconds)
+    # 自分が持っているか、期限が切れているときだけ書き換える
+    updated = SchedulerLease.objects.filter(name=LEASE_NAME).filter(
+        Q(holder=holder) | Q(expires_at__lt=current)
+    ).update(holder=holder, expires_at=expires_at)
+    if updated:
+        return True
+    try:
+        with transaction.atomic():
+            SchedulerLease.objects.create(name=LEASE_NAME, holder=holder, expires_at=expires_at)
+    except IntegrityError:
+        # 他のインスタンスが持っている
+        return False
+    return True
+
+
+def release_lease(holder):
+    from .models import SchedulerLease
+
+    SchedulerLease.objects.filter(name=LEASE_NAME, holder=holder).delete()
+
+
+def fail_interrupted_runs():
+    """リースの期限以上実行中のまま（スケジューラが落ちたなど）の記録を失敗にする。"""
+    from .models import ScheduledRun
+
+    timeout = getattr(settings, 'SCHEDULER_LEASE_SECONDS', 600)
+    return ScheduledRun.objects.filter(status='running', started_at__lt=now() - timedelta(seconds=timeout)).update(
+        status='failed', error='スケジューラが停止したため中断されました', finished_at=now(),
+    )
+
+
+def purge_runs(days=None):
+    """days 日以上前の実行記録を削除する。"""
+    from .models import ScheduledRun
+
+    days = getattr(settings, 'SCHEDULER_HISTORY_DAYS', 30) if days is None else days
+    deleted, _ = ScheduledRun.objects.filter(scheduled_for__lt=now() - timedelta(days=days)).delete()
+    return deleted
+
+
+def due_time(name, schedule, since):
+    """ジョブを今実行すべきなら、その予定時刻を返す。
+
+    前回の予定時刻（記録が無ければ since）より後の予定のうち、今以前で最後のもの。
+    """
+    from .models import ScheduledRun
+
+    last = ScheduledRun.objects.filter(name=name).order_by('-scheduled_for').values_list('scheduled_for', flat=True).first()
+    return schedule.latest_before(last or since, now())
+
+
+def run(name, command, args, scheduled_for):
+    """ジョブを 1 回実行して記録する。他のインスタンスが同じ予定を実行済みなら None を返す。"""
+    from .models import ScheduledRun
+
+    try:
+        with transaction.atomic():
+            record = ScheduledRun.objects.create(name=name, scheduled_for=scheduled_for, started_at=now())
+    except IntegrityError:
+        return None
+    output = io.StringIO()
+    try:
+        call_command(command, *args, stdout=output, stderr=output)
+    except Exception:
+        logger.exception('定期ジョブ %s の実行に失敗しました', name)
+        record.status = 'failed'
+        record.error = traceback.format_exc()[-4000:]
+    else:
+        record.status = 'done'
+    record.output = output.getvalue()[-4000:]
+    record.finished_at = now()
+    record.save(update_fields=['status', 'output', 'error', 'finished_at'])
+    return record
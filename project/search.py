@@ -0,0 +1,186 @@
+"""アドオンの全文検索。
+
+検索対象の文字列を NFKC 正規化・小文字化したうえで、
+  - 日本語（ひらがな・カタカナ・漢字）の連続部分は 1 文字 + 2 文字（bigram）のトークン
+  - それ以外の英数字は単語単位のトークン
+に分割し、AddonSearchDocument に空白区切りで保存する。
+
+検索時は DB ごとのインデックスを使う:
+  - SQLite     : FTS5 仮想テーブル project_addon_fts（bm25 で順位付け）
+  - PostgreSQL : to_tsvector('simple', ...) の GIN インデックス（ts_rank で順位付け）
+  - その他     : トークン列への LIKE（インデックスは効かない）
+どの DB でも、検索結果の QuerySet には関連度 search_rank（大きいほど一致度が高い）が付く。
+"""
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.html import strip_tags
+
+FTS_TABLE = 'project_addon_fts'
+DOCUMENT_TABLE = 'project_addonsearchdocument'
+# 名前・作成者の一致を説明より重く評価する
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+PG_VECTOR_SQL = (
+    "to_tsvector('simple', coalesce(title_tokens, '') || ' ' || coalesce(body_tokens, ''))"
+)
+PG_RANKED_VECTOR_SQL = (
+    "setweight(to_tsvector('simple', coalesce(title_tokens, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(body_tokens, '')), 'D')"
+)
+
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3005\u3006'
+_TOKEN_RE = re.compile(rf'([{_CJK}]+)|([^\W_{_CJK}]+)')
+
+
+def _runs(text):
+    """(文字列, 日本語かどうか) の組を順に返す。"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    for match in _TOKEN_RE.finditer(text):
+        cjk, word = match.groups()
+        yield (cjk, True) if cjk else (word, False)
+
+
+def tokenize(text):
+    """インデックス用のトークン列を返す。"""
+    tokens = []
+    for run, is_cjk in _runs(text):
+        if not is_cjk:
+            tokens.append(run)
+            continue
+        # 1 文字検索にも対応できるよう unigram も入れておく
+        tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def query_terms(text):
+    """検索語を (トークン, 前方一致するか) のリストにする。"""
+    terms = []
+    for run, is_cjk in _runs(text):
+        if not is_cjk:
+            terms.append((run, True))
+        elif len(run) == 1:
+            terms.append((run, False))
+        else:
+            terms.extend((run[i:i + 2], False) for i in range(len(run) - 1))
+    # 同じトークンを何度も条件に入れない
+    return list(dict.fromkeys(terms))
+
+
+def build_document(name, author, description, long_description):
+    """(title_tokens, body_tokens) を返す。long_description は HTML なのでタグを除く。"""
+    title = ' '.join(tokenize(f'{name} {author}'))
+    body = ' '.join(tokenize(f'{description} {strip_tags(long_description or "")}'))
+    return title, body
+
+
+def write_fts_row(cursor, addon_id, title, body):
+    """SQLite の FTS5 テーブルの行を置き換える。"""
+    cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [addon_id])
+    cursor.execute(
+        f'INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES (%s, %s, %s)', [addon_id, title, body]
+    )
+
+
+def index_addon(addon):
+    """アドオン 1 件の検索インデックスを更新する（Addon の post_save から呼ばれる）。"""
+    from .models import AddonSearchDocument
+
+    title, body = build_document(addon.name, addon.author, addon.description, addon.long_description)
+    AddonSearchDocument.objects.update_or_create(
+        addon_id=addon.pk, defaults={'title_tokens': title, 'body_tokens': body}
+    )
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            write_fts_row(cursor, addon.pk, title, body)
+
+
+def index_addons(addons):
+    """新しく作ったアドオンをまとめて登録する（bulk_create したアドオン用。既存の行は置き換えない）。"""
+    from .models import AddonSearchDocument
+
+    documents = [
+        AddonSearchDocument(addon_id=addon.pk, title_tokens=title, body_tokens=body)
+        for addon in addons
+        for title, body in [build_document(addon.name, addon.author, addon.description, addon.long_description)]
+    ]
+    AddonSearchDocument.objects.bulk_create(documents)
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES (%s, %s, %s)',
+                [(d.addon_id, d.title_tokens, d.body_tokens) for d in documents],
+            )
+    return len(documents)
+
+
+def remove_addon(addon_id):
+    """削除されたアドオンを FTS5 テーブルから消す（検索ドキュメント自体は CASCADE で消える）。"""
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [addon_id])
+
+
+def _fts5_expression(terms):
+    parts = []
+    for token, prefix in terms:
+        quoted = '"' + token.replace('"', '""') + '"'
+        parts.append(quoted + '*' if prefix else quoted)
+    return ' AND '.join(parts)
+
+
+def _tsquery_expression(terms):
+    parts = []
+    for token, prefix in terms:
+        quoted = "'" + token.replace("'", "''").replace('\\', '\\\\') + "'"
+        parts.append(quoted + ':*' if prefix else quoted)
+    return ' & '.join(parts)
+
+
+def search_addons(queryset, text, rank=True):
+    """Addon の QuerySet を検索語で絞り込み、関連度 search_rank を付けて返す。
+
+    関連度は一致した行ごとに計算するので、関連度で並べないときは rank=False で省く（search_rank は 0 になる）。
+    """
+    no_rank = Value(0.0, output_field=FloatField())
+    terms = query_terms(text)
+    if not terms:
+        return queryset.annotate(search_rank=no_rank).none()
+
+    table = queryset.model._meta.db_table
+    if connection.vendor == 'sqlite':
+        expression = _fts5_expression(terms)
+        matches = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [expression])
+        # bm25 は小さいほど一致度が高いので符号を反転する
+        score = RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, {TITLE_WEIGHT}, {BODY_WEIGHT}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+            [expression],
+            output_field=FloatField(),
+        )
+        return queryset.filter(pk__in=matches).annotate(search_rank=score if rank else no_rank)
+
+    if connection.vendor == 'postgresql':
+        expression = _tsquery_expression(terms)
+        matches = RawSQL(
+            f"SELECT addon_id FROM {DOCUMENT_TABLE} WHERE {PG_VECTOR_SQL} @@ to_tsquery('simple', %s)",
+            [expression],
+        )
+        score = RawSQL(
+            f"SELECT ts_rank({PG_RANKED_VECTOR_SQL}, to_tsquery('simple', %s)) "
+            f"FROM {DOCUMENT_TABLE} WHERE addon_id = {table}.id",
+            [expression],
+            output_field=FloatField(),
+        )
+        return queryset.filter(pk__in=matches).annotate(search_rank=score if rank else no_rank)
+
+    condition = Q()
+    for token, _prefix in terms:
+        condition &= Q(search_document__title_tokens__contains=token) | Q(
+            search_document__body_tokens__contains=token
+        )
+    return queryset.filter(condition).annotate(search_rank=no_rank)
@@ -0,0 +1,295 @@
+"""負荷試験・ベンチマーク用のダミーデータ生成。
+
+同じ seed なら同じ内容のデータになる（乱数は random.Random(seed) だけを使う）。
+bulk_create でまとめて作るのでシグナルは発火しない。検索インデックス・サイト統計・コメント数・ランキングは最後にまとめて作る。
+ファイルは全アドオンで同じダミーのファイルを参照する（CAS ストレージなら実体は 1 つ）。
+"""
+import io
+import itertools
+import json
+import math
+import random
+import time
+import zipfile
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Count, DateTimeField, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
+
+from . import images, ranking, search, stats
+from .models import Addon, AddonScreenshot, AddonVideo, Comment, ContactMessage, Report, StoredBlob, Wiki
+from .storage import content_hash
+
+ADJECTIVES = ['Super', 'Mega', 'Tiny', 'Ancient', 'Frozen', 'Blazing', 'Hidden', 'Lucky', 'Ender', 'Sky', '便利な', 'リアルな', '最強の', 'かわいい']
+NOUNS = ['Tools', 'Mobs', 'Furniture', 'Biomes', 'Weapons', 'Dungeons', 'Farms', 'Vehicles', 'Magic', 'Shaders', '家具', '武器', '建築', 'ペット']
+WORDS = (
+    'block craft mob spawn biome redstone armor sword potion village nether end portal texture shader skin world '
+    'ブロック 追加 拡張 村人 ダンジョン 装備 魔法 乗り物 統合版 対応'
+).split()
+# ログに出す名前
+LABELS = {
+    'users': 'ユーザー', 'addons': 'アドオン', 'screenshots': 'スクリーンショット', 'videos': '動画', 'comments': 'コメント',
+    'wiki_pages': 'Wiki', 'reports': '通報', 'contact_messages': 'お問い合わせ',
+}
+# 種類ごとの出やすさ
+ADDON_TYPE_WEIGHTS = {'behavior': 45, 'resource': 25, 'skin': 10, 'world': 10, 'other': 10}
+
+
+class SeedError(Exception):
+    pass
+
+
+@contextmanager
+def _keep_timestamps(*models):
+    """auto_now / auto_now_add を止めて、作成日時などを指定した値のまま保存できるようにする。"""
+    saved = []
+    for model in models:
+        for field in model._meta.concrete_fields:
+            if isinstance(field, DateTimeField) and (field.auto_now or field.auto_now_add):
+                saved.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def placeholder_download():
+    """ダミーのアドオンファイル（manifest.json だけの .mcpack）を保存して、その名前を返す。"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('manifest.json', json.dumps({
+            'format_version': 2,
+            'header': {'name': 'seed', 'uuid': '00000000-0000-4000-8000-000000000000', 'version': [1, 0, 0], 'min_engine_version': [1, 20, 0]},
+            'modules': [{'type': 'data', 'uuid': '00000000-0000-4000-8000-000000000001', 'version': [1, 0, 0]}],
+        }))
+    field = Addon._meta.get_field('download_file')
+    return field.storage.save(field.generate_filename(None, 'seed.mcpack'), ContentFile(buffer.getvalue()))
+
+
+def placeholder_image(field):
+    """ダミーの PNG 画像を field のストレージに保存して、その名前を返す。"""
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (640, 360), (90, 140, 60)).save(buffer, 'PNG')
+    return field.storage.save(field.generate_filename(None, 'seed.png'), ContentFile(buffer.getvalue()))
+
+
+def placeholder_video():
+    """ダミーの動画ファイル（中身は再生できない）を保存して、その名前を返す。"""
+    field = AddonVideo._meta.get_field('video_file')
+    return field.storage.save(field.generate_filename(None, 'seed.mp4'), ContentFile(b'\x00\x00\x00\x18ftypmp42' + b'\x00' * 1024))
+
+
+def _retain(name, count):
+    """bulk_create ではシグナルが飛ばないので、共有ファイルの参照数をまとめて足す。"""
+    digest = content_hash(name)
+    if digest:
+        StoredBlob.objects.filter(sha256=digest).update(ref_count=F('ref_count') + count)
+
+
+def _bulk_create(model, rows, batch_size):
+    """rows を batch_size 件ずつ bulk_create する。作った件数を返す。"""
+    count = 0
+    with _keep_timestamps(model):
+        for batch in _batches(rows, batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            count += len(batch)
+    return count
+
+
+def seed_catalog(addons=20000, users=500, comments=None, screenshots=None, videos=None, wiki_pages=300,
+                 reports=None, contact_messages=None, seed=1, batch_size=2000, log=print):
+    """ダミーのカタログを作る。作った件数を {種類: 件数} で返す。
+
+    件数を省略したものはアドオン数から決める（コメントは 10 倍、スクリーンショットは 3 倍など）。
+    """
+    comments = addons * 10 if comments is None else comments
+    screenshots = addons * 3 if screenshots is None else screenshots
+    videos = addons // 5 if videos is None else videos
+    reports = addons // 20 if reports is None else reports
+    contact_messages = addons // 20 if contact_messages is None else contact_messages
+
+    rng = random.Random(seed)
+    prefix = f'seed-{seed}-'
+    if Addon.objects.filter(slug__startswith=prefix).exists():
+        raise SeedError(f'seed={seed} のデータは既にあります（別の seed を指定してください）')
+    started = now()
+    created = {}
+    # 本文は使い回す（1 件ずつ乱数で文章を作ると遅い）
+    texts = [_sentence(rng, rng.randint(3, 30)) for _ in range(1000)]
+
+    def step(name, count, since):
+        created[name] = count
+        log(f'{LABELS[name]}: {count} 件 ({time.monotonic() - since:.1f} 秒)')
+
+    def random_time(days):
+        return started - timedelta(seconds=rng.randrange(days * 86400))
+
+    # ユーザー（ログインはできない）
+    since = time.monotonic()
+    User.objects.bulk_create(
+        (User(username=f'seed{seed}_user{i}', email=f'seed{seed}_user{i}@example.com', password=UNUSABLE_PASSWORD_PREFIX + 'seed')
+         for i in range(users)),
+        batch_size=batch_size,
+    )
+    user_ids = list(User.objects.filter(username__startswith=f'seed{seed}_user').values_list('pk', flat=True))
+    step('users', len(user_ids), since)
+
+    def random_user():
+        return rng.choice(user_ids) if user_ids else None
+
+    # ダミーのファイル（全行で共有する）
+    download_name = placeholder_download()
+    thumbnail_name = placeholder_image(Addon._meta.get_field('thumbnail'))
+    screenshot_name = placeholder_image(AddonScreenshot._meta.get_field('image'))
+    video_name = placeholder_video()
+    video_thumbnail_name = placeholder_image(AddonVideo._meta.get_field('thumbnail'))
+    for fieldfile in (Addon(thumbnail=thumbnail_name).thumbnail, AddonScreenshot(image=screenshot_name).image):
+        images.ensure_derivatives(fieldfile)
+
+    # アドオン（古いものほど作成日時が前。ダウンロード数は一部に偏る）
+    since = time.monotonic()
+    types, weights = zip(*ADDON_TYPE_WEIGHTS.items())
+
+    def addon_rows():
+        for i in range(addons):
+            downloads = int(rng.paretovariate(1.2) * 50) - 50
+            created_at = started - timedelta(minutes=(addons - i) * 37)
+            yield Addon(
+                name=f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}',
+                slug=f'{prefix}{i}',
+                description=_sentence(rng, 20),
+                long_description=f'<p>{_sentence(rng, 80)}</p>',
+                addon_type=rng.choices(types, weights)[0],
+                version=f'1.{rng.randrange(10)}.{rng.randrange(10)}',
+                author=f'seed{seed}_user{rng.randrange(max(users, 1))}',
+                thumbnail=thumbnail_name,
+                download_file=download_name,
+                download_sha256=content_hash(download_name) or '',
+                downloads=downloads,
+                likes=downloads // rng.randint(5, 50),
+                published=rng.random() < 0.95,
+                owner_id=random_user(),
+                created_at=created_at,
+                updated_at=created_at + timedelta(days=rng.randrange(30)),
+            )
+
+    _bulk_create(Addon, addon_rows(), batch_size)
+    seeded = Addon.objects.filter(slug__startswith=prefix)
+    addon_dates = list(seeded.order_by('pk').values_list('pk', 'created_at', 'downloads'))
+    addon_ids = [pk for pk, _, _ in addon_dates]
+    step('addons', len(addon_dates), since)
+
+    def random_addon():
+        return rng.choice(addon_ids) if addon_ids else None
+
+    # スクリーンショット・動画（アドオンにランダムに割り当てる）
+    since = time.monotonic()
+    rows = (
+        AddonScreenshot(addon_id=random_addon(), image=screenshot_name, caption=_sentence(rng, 4), order=i % 6)
+        for i in range(screenshots if addon_ids else 0)
+    )
+    step('screenshots', _bulk_create(AddonScreenshot, rows, batch_size), since)
+
+    since = time.monotonic()
+
+    def video_rows():
+        for i in range(videos if addon_ids else 0):
+            video = AddonVideo(addon_id=random_addon(), caption=_sentence(rng, 4), order=i % 3, created_at=started)
+            # 7 割は YouTube、残りはアップロードされたファイル
+            if rng.random() < 0.7:
+                video.video_type = 'youtube'
+                video.video_url = f'https://www.youtube.com/watch?v=seed{seed}x{i}'
+            else:
+                video.video_type = 'file'
+                video.video_file = video_name
+                video.video_sha256 = content_hash(video_name) or ''
+                video.thumbnail = video_thumbnail_name
+            yield video
+
+    step('videos', _bulk_create(AddonVideo, video_rows(), batch_size), since)
+
+    # コメント（ダウンロード数の多いアドオンほど多い）
+    since = time.monotonic()
+    cum_weights = list(itertools.accumulate(math.sqrt(max(downloads, 0) + 1) for _, _, downloads in addon_dates))
+
+    def comment_rows():
+        for start in range(0, comments if addon_dates else 0, batch_size):
+            for pk, created_at, _ in rng.choices(addon_dates, cum_weights=cum_weights, k=min(batch_size, comments - start)):
+                yield Comment(
+                    addon_id=pk,
+                    user_id=random_user(),
+                    text=rng.choice(texts),
+                    created_at=min(started, created_at + timedelta(seconds=rng.randrange(90 * 86400))),
+                )
+
+    step('comments', _bulk_create(Comment, comment_rows(), batch_size), since)
+    counts = Comment.objects.filter(addon=OuterRef('pk')).order_by().values('addon').annotate(n=Count('pk')).values('n')
+    seeded.update(comment_count=Coalesce(Subquery(counts), Value(0)))
+
+    # Wiki・通報・お問い合わせ
+    since = time.monotonic()
+    rows = (
+        Wiki(title=f'{rng.choice(NOUNS)} ガイド {seed}-{i}', slug=f'{prefix}wiki-{i}', content=f'<p>{_sentence(rng, 150)}</p>',
+             created_by_id=random_user(), created_at=random_time(365), updated_at=started)
+        for i in range(wiki_pages)
+    )
+    step('wiki_pages', _bulk_create(Wiki, rows, batch_size), since)
+
+    since = time.monotonic()
+    rows = (
+        Report(reporter_id=random_user(), addon_id=random_addon(), description=rng.choice(texts),
+               resolved=rng.random() < 0.7, created_at=random_time(365))
+        for _ in range(reports)
+    )
+    step('reports', _bulk_create(Report, rows, batch_size), since)
+
+    since = time.monotonic()
+    rows = (
+        ContactMessage(name=f'seed{seed} contact {i}', email=f'seed{seed}_contact{i % 1000}@example.com',
+                       subject=_sentence(rng, 3), message=rng.choice(texts), handled=rng.random() < 0.6, created_at=random_time(365))
+        for i in range(contact_messages)
+    )
+    step('contact_messages', _bulk_create(ContactMessage, rows, batch_size), since)
+
+    # 共有ファイルの参照数（bulk_create ではシグナルが飛ばない）
+    file_videos = AddonVideo.objects.filter(addon__slug__startswith=prefix, video_type='file').count()
+    _retain(download_name, len(addon_ids))
+    _retain(thumbnail_name, len(addon_ids))
+    _retain(screenshot_name, created['screenshots'])
+    _retain(video_name, file_videos)
+    _retain(video_thumbnail_name, file_videos)
+
+    # 検索インデックスとサイト統計
+    since = time.monotonic()
+    for batch in _batches(seeded.only('pk', 'name', 'author', 'description', 'long_description').iterator(), batch_size):
+        search.index_addons(batch)
+    stats.rebuild()
+    ranking.update_rankings()
+    log(f'検索インデックス・サイト統計・ランキングを作りました ({time.monotonic() - since:.1f} 秒)')
+    return created
@@ -66,6 +66,7 @@ LOGIN_REDIRECT_URL = '/'
 
 
 MIDDLEWARE = [
+    'project.middleware.InstrumentationMiddleware',  # SQL 件数・処理時間の計測
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # 静的ファイル配信
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -74,6 +75,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'allauth.account.middleware.AccountMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'project.middleware.AnonymousPageCacheMiddleware',  # 未ログイン時の一覧ページキャッシュ
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -81,7 +83,8 @@ ROOT_URLCONF = 'project.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # 描画時間を計測する DjangoTemplates（project/metrics.py）
+        'BACKEND': 'project.metrics.InstrumentedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -177,6 +180,13 @@ DEFAULT_FROM_EMAIL = 'kazuma20130428@gamil.com'
 
 # 開発時はコンソール出力。実運用でメールを送る場合は SMTP 設定に変更してください。
 EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', '25'))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'False') == 'True'
+# 応答の遅い SMTP サーバーでワーカーが止まったままにならないように
+EMAIL_TIMEOUT = int(os.environ.get('EMAIL_TIMEOUT', '30'))
 
 # TinyMCE設定
 TINYMCE_DEFAULT_CONFIG = {
@@ -191,3 +201,139 @@ TINYMCE_DEFAULT_CONFIG = {
     'relative_urls': False,
 }
 
+
+# ダウンロード数の集計（project/downloads.py）
+# ダウンロードはアドオンごとに DOWNLOAD_COUNTER_SHARDS 個の行へ分散して記録し、
+# 定期実行の flush_downloads（SCHEDULED_JOBS）で Addon.downloads へまとめて反映する
+DOWNLOAD_COUNTER_SHARDS = int(os.environ.get('DOWNLOAD_COUNTER_SHARDS', '8'))
+
+# アップロードファイルの配信方法（project/delivery.py）
+# 'django'（FileResponse）/ 'nginx'（X-Accel-Redirect）/ 'sendfile'（X-Sendfile）
+FILE_DELIVERY_BACKEND = os.environ.get('FILE_DELIVERY_BACKEND', 'django')
+# nginx の internal location（MEDIA_ROOT を alias しておく）
+FILE_DELIVERY_ACCEL_PREFIX = os.environ.get('FILE_DELIVERY_ACCEL_PREFIX', '/protected/')
+
+# キャッシュ。複数ワーカーで共有するには REDIS_URL を設定する（redis パッケージが必要）
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# 一覧ページのキーセット（カーソル）ページネーション（project/pagination.py）
+KEYSET_PAGINATION = os.environ.get('KEYSET_PAGINATION', 'False') == 'True'
+# キーセット方式で表示する総件数（概数）のキャッシュ秒数
+KEYSET_COUNT_CACHE_TIMEOUT = 300
+
+# アドオン詳細ページの断片キャッシュの秒数（0 で無効。project/fragment_cache.py）
+ADDON_FRAGMENT_CACHE_TIMEOUT = int(os.environ.get('ADDON_FRAGMENT_CACHE_TIMEOUT', '3600'))
+
+# 未ログインユーザー向けのページキャッシュ（project/middleware.py）
+ANONYMOUS_PAGE_CACHE_VIEWS = ['home', 'addon_list', 'announcement', 'terms', 'wiki_list']
+# サーバー側キャッシュの秒数と、ブラウザに返す Cache-Control: max-age
+# 無効化（purge_pages）はキャッシュ上の世代で行うので、REDIS_URL が無いと他のプロセスにはこの秒数が過ぎるまで届かない
+ANONYMOUS_PAGE_CACHE_TIMEOUT = int(os.environ.get('ANONYMOUS_PAGE_CACHE_TIMEOUT', '300'))
+ANONYMOUS_PAGE_CACHE_MAX_AGE = 60
+
+# アップロード画像から生成する縮小版の幅（project/images.py）。元画像より大きいサイズは作らない
+IMAGE_DERIVATIVE_SIZES = {'card': 400, 'detail': 1024, 'full': 1920}
+
+# バックグラウンドジョブ（project/jobs.py）。ワーカーは `python manage.py run_jobs`
+# False にするとジョブをキューに入れず、リクエストのコミット後にその場で実行する
+JOB_QUEUE_ASYNC = os.environ.get('JOB_QUEUE_ASYNC', 'True') == 'True'
+JOB_WORKER_PROCESSES = int(os.environ.get('JOB_WORKER_PROCESSES', '2'))
+# 失敗時の最大実行回数と、再実行までの待ち秒数（失敗するたびに 2 倍）
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF = 30
+# この秒数以上実行中のままのジョブは、ワーカーが落ちたとみなして再実行する
+JOB_TIMEOUT = 600
+# 完了したジョブを残す日数
+JOB_RETENTION_DAYS = 7
+
+# アドオン関連のアップロードファイルを内容の SHA-256 でまとめて保存する（project/storage.py）
+# 参照されなくなったファイルは `python manage.py collect_blobs` で削除する
+CONTENT_ADDRESSED_STORAGE = os.environ.get('CONTENT_ADDRESSED_STORAGE', 'True') == 'True'
+
+# リリース履歴と差分ダウンロード（project/releases.py）
+# 新しいリリースごとに、直前の何個のリリースからの差分を作るか
+ADDON_DELTA_BASE_VERSIONS = 3
+# アドオンごとに残すリリースの数
+ADDON_RELEASE_HISTORY = 5
+# 差分がファイル全体のこの割合以上になる場合は差分を配信しない
+ADDON_DELTA_MAX_RATIO = 0.8
+
+# 大きなファイルの分割アップロード（project/uploads.py）
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', str(5 * 1024 * 1024)))
+# 受信中のファイルを置くディレクトリ（複数サーバーの場合は共有ディスクにする）
+UPLOAD_CHUNK_DIR = os.environ.get('UPLOAD_CHUNK_DIR', os.path.join(BASE_DIR, 'upload_chunks'))
+UPLOAD_MAX_SIZE = int(os.environ.get('UPLOAD_MAX_SIZE', str(1024 * 1024 * 1024)))
+# ユーザー（未ログインならブラウザのセッション）ごとに同時に持てるアップロードセッションの数
+UPLOAD_MAX_SESSIONS = int(os.environ.get('UPLOAD_MAX_SESSIONS', '3'))
+# この時間以上更新の無いアップロードは cleanup_uploads で削除する
+UPLOAD_SESSION_TTL_HOURS = 24
+
+# ユーザーごとの BAN の期限をキャッシュする秒数（project/bans.py）。BanRecord の変更時には破棄される。
+# 破棄は他のプロセスに届かないので、プロセスごとのキャッシュ（LocMemCache）では短くする（0 でキャッシュしない）
+BAN_CACHE_TIMEOUT = int(os.environ.get('BAN_CACHE_TIMEOUT', '86400' if os.environ.get('REDIS_URL') else '60'))
+
+# 定期実行するメンテナンス処理（project/scheduler.py）。スケジューラは `python manage.py runscheduler`
+# スケジュールは cron 形式（分 時 日 月 曜日）。各コマンドはリースの期限内に終わる大きさで実行する
+SCHEDULED_JOBS = {
+    'unban_expired': {'schedule': '*/5 * * * *', 'command': 'unban_expired', 'args': ['--batch-size', '1000']},
+    'flush_downloads': {'schedule': '*/5 * * * *', 'command': 'flush_downloads', 'args': ['--batch-size', '500']},
+    'cleanup_uploads': {'schedule': '15 * * * *', 'command': 'cleanup_uploads'},
+    'collect_blobs': {'schedule': '30 4 * * *', 'command': 'collect_blobs'},
+    # 送信に失敗したメールの再送（通常はキューに入った時点で run_jobs が送る）
+    'send_queued_mail': {'schedule': '* * * * *', 'command': 'send_queued_mail'},
+    # 一覧の人気順・注目順のスコア（RANKING_TRENDING_DECAY は 1 回の実行ごとの減衰率なので、間隔を変えたら合わせて変える）
+    'update_rankings': {'schedule': '0 * * * *', 'command': 'update_rankings'},
+}
+# リーダーのリースの秒数（リーダーが落ちたら、この時間が経ってから他のインスタンスが引き継ぐ）
+SCHEDULER_LEASE_SECONDS = 600
+# 実行記録を残す日数
+SCHEDULER_HISTORY_DAYS = 30
+
+# 送信メールのキュー（project/mail.py）。1 回の接続でまとめて送る数と、失敗時の再送
+MAIL_BATCH_SIZE = 50
+MAIL_MAX_ATTEMPTS = 5
+# 再送までの待ち秒数（失敗するたびに 2 倍）
+MAIL_RETRY_BACKOFF = 60
+# この秒数以上送信中のままのメールは、ワーカーが落ちたとみなして送り直す
+MAIL_SEND_TIMEOUT = 300
+
+# リクエストの計測（project/metrics.py）。スタッフ向けの一覧は /admin/metrics/、Prometheus 形式は /metrics
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True') == 'True'
+# 各プロセスの集計をキャッシュに書き出す間隔（秒）。全プロセス分を合計して表示できるのは REDIS_URL を設定したときだけ
+# （LocMemCache ではページを返したプロセスの分しか見えない）
+METRICS_FLUSH_INTERVAL = 10
+METRICS_RETENTION = 86400
+# 設定すると、ログインしなくても Authorization: Bearer <トークン> で /metrics を取得できる
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+# URL 名ごとの 1 リクエストあたりの SQL 件数の上限（超えたら警告。QUERY_BUDGET_DEFAULT は上記以外の上限で None なら無し）
+QUERY_BUDGETS = {
+    'home': 10,
+    'addon_list': 10,
+    'addon_detail': 15,
+    'addon_comments': 5,
+    'wiki_list': 5,
+    'wiki_detail': 5,
+}
+QUERY_BUDGET_DEFAULT = None
+# True なら上限を超えたときに例外にする（テストでは TEST_RUNNER が有効にしてテストを失敗させる）
+QUERY_BUDGET_RAISE = os.environ.get('QUERY_BUDGET_RAISE', 'False') == 'True'
+TEST_RUNNER = 'project.test_runner.QueryBudgetTestRunner'
+
+# アドオン一覧の人気順・注目順（project/ranking.py を参照）
+# 人気スコアでのいいね 1 件・コメント 1 件の重み（ダウンロード何回分か）
+RANKING_LIKE_WEIGHT = int(os.environ.get('RANKING_LIKE_WEIGHT', '20'))
+RANKING_COMMENT_WEIGHT = int(os.environ.get('RANKING_COMMENT_WEIGHT', '10'))
+# 注目スコアの update_rankings 1 回ごとの減衰率（1 時間ごとに 0.9 倍なら半減期はおよそ 6.6 時間）
+RANKING_TRENDING_DECAY = float(os.environ.get('RANKING_TRENDING_DECAY', '0.9'))
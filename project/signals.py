@@ -0,0 +1,147 @@
+"""モデルのシグナルハンドラ。ProjectConfig.ready() で読み込まれる。"""
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import bans, fragment_cache, search, stats, storage, tasks
+from .middleware import purge_pages
+from .models import Addon, AddonDelta, AddonRelease, AddonScreenshot, AddonVideo, Announcement, BanRecord, Comment, TermsPage, Wiki, changed_files
+
+
+@receiver(post_save, sender=Addon)
+def update_addon_search_index(sender, instance, raw=False, **kwargs):
+    # loaddata 中は関連テーブルが揃っていない可能性があるので更新しない
+    if raw:
+        return
+    search.index_addon(instance)
+
+
+@receiver(post_delete, sender=Addon)
+def remove_addon_search_index(sender, instance, **kwargs):
+    search.remove_addon(instance.pk)
+
+
+@receiver(pre_save, sender=Addon)
+def remember_addon_statistics(sender, instance, raw=False, **kwargs):
+    # 保存前の状態を覚えておき、post_save で差分だけ統計に反映する
+    if not raw:
+        instance._stats_before = stats.stored_contribution(instance.pk)
+
+
+@receiver(post_save, sender=Addon)
+def update_addon_statistics(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    stats.apply_addon_change(instance.pk, getattr(instance, '_stats_before', None), stats.stored_contribution(instance.pk))
+
+
+@receiver(pre_delete, sender=Addon)
+def remove_addon_statistics(sender, instance, **kwargs):
+    stats.apply_addon_change(instance.pk, stats.stored_contribution(instance.pk), None)
+
+
+@receiver(post_save, sender=Comment)
+def increment_comment_count(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Addon.objects.filter(pk=instance.addon_id).update(comment_count=F('comment_count') + 1)
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_comment_count(sender, instance, **kwargs):
+    Addon.objects.filter(pk=instance.addon_id, comment_count__gt=0).update(comment_count=F('comment_count') - 1)
+
+
+# 断片キャッシュの無効化（Addon 自体の保存は updated_at がキーに入っているので不要）
+@receiver(post_save, sender=AddonScreenshot)
+@receiver(post_delete, sender=AddonScreenshot)
+@receiver(post_save, sender=AddonVideo)
+@receiver(post_delete, sender=AddonVideo)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_addon_fragments_for_related(sender, instance, **kwargs):
+    fragment_cache.invalidate(instance.addon_id)
+
+
+# 未ログイン向けページキャッシュの無効化（対象は settings.ANONYMOUS_PAGE_CACHE_VIEWS）
+@receiver(post_save, sender=Addon)
+@receiver(post_delete, sender=Addon)
+def purge_addon_pages(sender, instance, **kwargs):
+    purge_pages('home', 'addon_list')
+
+
+@receiver(post_save, sender=Announcement)
+@receiver(post_delete, sender=Announcement)
+def purge_announcement_pages(sender, instance, **kwargs):
+    purge_pages('announcement')
+
+
+@receiver(post_save, sender=TermsPage)
+@receiver(post_delete, sender=TermsPage)
+def purge_terms_pages(sender, instance, **kwargs):
+    purge_pages('terms')
+
+
+@receiver(post_save, sender=Wiki)
+@receiver(post_delete, sender=Wiki)
+def purge_wiki_pages(sender, instance, **kwargs):
+    purge_pages('wiki_list')
+
+
+
+def detect_media_changes(sender, instance, raw=False, **kwargs):
+    # post_save でジョブを登録するため、保存前に DB の値と比べておく
+    instance._media_changed = not raw and bool(changed_files(instance, tasks.MEDIA_FIELDS[sender]))
+
+
+def enqueue_media_processing(sender, instance, raw=False, **kwargs):
+    if raw or not getattr(instance, '_media_changed', False):
+        return
+    instance._media_changed = False
+    if hasattr(instance, 'media_status'):
+        # 通常の save() では書き込まない列なので update で書く
+        sender._default_manager.filter(pk=instance.pk).update(media_status='pending')
+        instance.media_status = 'pending'
+    tasks.process_media.delay(model=sender._meta.label_lower, pk=instance.pk)
+
+
+for _model in tasks.MEDIA_FIELDS:
+    pre_save.connect(detect_media_changes, sender=_model, dispatch_uid=f'media-changes-{_model.__name__}')
+    post_save.connect(enqueue_media_processing, sender=_model, dispatch_uid=f'media-processing-{_model.__name__}')
+
+
+# CAS ストレージ（project.storage）の blob の参照数
+def remember_stored_files(sender, instance, raw=False, **kwargs):
+    fields = storage.cas_fields(sender)
+    if instance.pk is None or instance._state.adding:
+        instance._stored_files = {}
+    else:
+        instance._stored_files = sender._default_manager.filter(pk=instance.pk).values(*fields).first() or {}
+
+
+def update_blob_references(sender, instance, raw=False, **kwargs):
+    old_files = getattr(instance, '_stored_files', {})
+    for field_name in storage.cas_fields(sender):
+        new_name = getattr(instance, field_name).name or ''
+        old_name = old_files.get(field_name) or ''
+        if new_name != old_name:
+            storage.retain(new_name)
+            storage.release(old_name)
+    instance._stored_files = {name: getattr(instance, name).name for name in storage.cas_fields(sender)}
+
+
+def release_blob_references(sender, instance, **kwargs):
+    for field_name in storage.cas_fields(sender):
+        storage.release(getattr(instance, field_name).name)
+
+
+for _model in (Addon, AddonScreenshot, AddonVideo, AddonRelease, AddonDelta):
+    if storage.cas_fields(_model):
+        pre_save.connect(remember_stored_files, sender=_model, dispatch_uid=f'stored-files-{_model.__name__}')
+        post_save.connect(update_blob_references, sender=_model, dispatch_uid=f'blob-references-{_model.__name__}')
+        post_delete.connect(release_blob_references, sender=_model, dispatch_uid=f'blob-release-{_model.__name__}')
+
+
+@receiver(post_save, sender=BanRecord)
+@receiver(post_delete, sender=BanRecord)
+def invalidate_ban_cache(sender, instance, **kwargs):
+    bans.invalidate(instance.user_id)
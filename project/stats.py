@@ -0,0 +1,100 @@
+"""サイト統計（公開中アドオン数・合計ダウンロード数）の管理。
+
+AddonTypeStatistic に種類ごとの集計を持ち、次のタイミングで差分を加算する:
+  - Addon の保存・削除（signals.py から apply_addon_change を呼ぶ）
+  - ダウンロード数の反映（downloads.flush_download_counts から add_downloads を呼ぶ）
+読み出しは高々種類数の行を読むだけなので、カタログの規模に依存しない。
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from .models import Addon, AddonTypeStatistic
+
+
+def contribution(addon_type, published):
+    """1 件のアドオンがどの種類の集計に入るか。非公開なら None。"""
+    return addon_type if published else None
+
+
+def stored_contribution(addon_pk):
+    """DB に保存されている状態での寄与（保存前のスナップショット用）。"""
+    if addon_pk is None:
+        return None
+    row = Addon.objects.filter(pk=addon_pk).values_list('addon_type', 'published').first()
+    return contribution(*row) if row else None
+
+
+def _add(addon_type, count_delta, downloads_delta):
+    if not count_delta and not downloads_delta:
+        return
+    rows = AddonTypeStatistic.objects.filter(addon_type=addon_type)
+    changes = {
+        'addon_count': F('addon_count') + count_delta,
+        'total_downloads': F('total_downloads') + downloads_delta,
+    }
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            AddonTypeStatistic.objects.create(
+                addon_type=addon_type, addon_count=count_delta, total_downloads=downloads_delta
+            )
+    except IntegrityError:
+        rows.update(**changes)
+
+
+def apply_addon_change(addon_pk, before, after):
+    """アドオンの保存・削除による寄与の変化（件数と、種類・公開状態の変更）を集計に反映する。
+
+    ダウンロード数の増分は add_downloads だけが足す。ここでは入る集計が変わったときに、
+    その時点の DB のダウンロード数を移すだけにする（保存の前後で読んだ差を足すと、
+    間に flush_download_counts が入ったとき二重に数えてしまう）。
+    """
+    if before == after:
+        return
+    downloads = Addon.objects.filter(pk=addon_pk).values_list('downloads', flat=True).first() or 0
+    if before:
+        _add(before, -1, -downloads)
+    if after:
+        _add(after, 1, downloads)
+
+
+def add_downloads(downloads_by_addon):
+    """{addon_id: 件数} のダウンロードを、公開中のアドオンについて種類ごとに加算する。"""
+    per_type = {}
+    published = Addon.objects.filter(pk__in=list(downloads_by_addon), published=True)
+    for addon_id, addon_type in published.values_list('pk', 'addon_type'):
+        per_type[addon_type] = per_type.get(addon_type, 0) + downloads_by_addon[addon_id]
+    for addon_type, downloads in sorted(per_type.items()):
+        _add(addon_type, 0, downloads)
+
+
+def site_totals():
+    """{'addon_count', 'total_downloads', 'by_type': {種類: (件数, DL 数)}} を返す。"""
+    by_type = {
+        row.addon_type: (row.addon_count, row.total_downloads)
+        for row in AddonTypeStatistic.objects.all()
+    }
+    return {
+        'addon_count': sum(count for count, _ in by_type.values()),
+        'total_downloads': sum(downloads for _, downloads in by_type.values()),
+        'by_type': by_type,
+    }
+
+
+def rebuild():
+    """公開中アドオンを集計し直して統計を置き換える。"""
+    rows = (
+        Addon.objects.filter(published=True)
+        .values('addon_type')
+        .annotate(count=Count('pk'), downloads=Sum('downloads'))
+        .order_by()
+    )
+    with transaction.atomic():
+        AddonTypeStatistic.objects.all().delete()
+        AddonTypeStatistic.objects.bulk_create(
+            AddonTypeStatistic(
+                addon_type=row['addon_type'], addon_count=row['count'], total_downloads=row['downloads'] or 0
+            )
+            for row in rows
+        )
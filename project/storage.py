@@ -0,0 +1,146 @@
+"""内容の SHA-256 で重複をまとめるファイルストレージ。
+
+アップロードされたファイルは保存時にハッシュを計算し、`blobs/ab/cd/<sha256><拡張子>` に 1 つだけ置く。
+同じ内容のファイルが既にあれば書き込まずにそれを使う。
+
+モデルに保存される名前は `cas/ab/cd/<sha256><拡張子>/<元のファイル名>` で、
+元のファイル名（ダウンロード時の名前）を残しつつ、実体は blobs/ 以下の共有ファイルを指す。
+`cas/` 以下のそれ以外のパス（派生画像 `cas/.../derivatives/...` など）は通常のファイルとして扱う。
+
+各 blob を参照しているモデルの列の数は StoredBlob.ref_count で数える（project.signals を参照）。
+参照されなくなった blob は `manage.py collect_blobs` で削除する。
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db.models import F, FileField
+
+MAX_EXT_LENGTH = 16
+MAX_FILENAME_LENGTH = 150
+CAS_NAME_RE = re.compile(r'^cas/([0-9a-f]{2})/([0-9a-f]{2})/(?P<sha256>[0-9a-f]{64})(?P<ext>[^/]*)/(?P<filename>[^/]+)$')
+
+
+def content_hash(name):
+    """CAS の名前から内容の SHA-256 を取り出す。CAS の名前でなければ None。"""
+    match = CAS_NAME_RE.match(name or '')
+    return match.group('sha256') if match else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def blob_name(self, name):
+        """名前に対応する実際のファイルのパス（CAS の名前でなければそのまま）。"""
+        match = CAS_NAME_RE.match(name)
+        if not match:
+            return name
+        digest = match.group('sha256')
+        return f'blobs/{digest[:2]}/{digest[2:4]}/{digest}{match.group("ext")}'
+
+    def _save(self, name, content):
+        if name.startswith('cas/') or name.startswith('blobs/'):
+            return super()._save(name, content)
+
+        # 一時ファイルに書きながらハッシュを計算する
+        tmp_dir = self.path('blobs/tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    size += len(chunk)
+                    tmp.write(chunk)
+            sha256 = digest.hexdigest()
+            filename = posixpath.basename(name)
+            stem, ext = posixpath.splitext(filename)
+            ext = ext.lower()[:MAX_EXT_LENGTH]
+            # 名前全体が列の長さ（255）に収まるようにする
+            filename = stem[:MAX_FILENAME_LENGTH - len(ext)] + ext
+            cas_name = f'cas/{sha256[:2]}/{sha256[2:4]}/{sha256}{ext}/{filename}'
+            blob = self.blob_name(cas_name)
+            if not super().exists(blob):
+                os.makedirs(os.path.dirname(self.path(blob)), exist_ok=True)
+                file_move_safe(tmp_path, self.path(blob), allow_overwrite=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(self.path(blob), self.file_permissions_mode)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        from .models import StoredBlob
+        StoredBlob.objects.get_or_create(sha256=sha256, defaults={'name': blob, 'size': size})
+        return cas_name
+
+    def get_available_name(self, name, max_length=None):
+        # 元のファイル名のまま CAS の名前に変換するので、連番を付けない
+        if name.startswith('cas/') or name.startswith('blobs/'):
+            return super().get_available_name(name, max_length)
+        return name
+
+    def path(self, name):
+        # open / exists / size / get_modified_time などは path() 経由で blob を指す
+        return super().path(self.blob_name(name))
+
+    def url(self, name):
+        return super().url(self.blob_name(name))
+
+    def delete(self, name):
+        # blob は他の行からも参照されているかもしれないので、ここでは消さない（collect_blobs が消す）
+        if CAS_NAME_RE.match(name or ''):
+            return
+        super().delete(name)
+
+
+cas_storage = ContentAddressedStorage()
+
+
+def get_media_storage():
+    """アップロードファイル用のストレージ。CONTENT_ADDRESSED_STORAGE=False なら通常のストレージ。"""
+    if getattr(settings, 'CONTENT_ADDRESSED_STORAGE', True):
+        return cas_storage
+    return default_storage
+
+
+def _change_ref_count(name, delta):
+    from .models import StoredBlob
+
+    digest = content_hash(name)
+    if digest:
+        StoredBlob.objects.filter(sha256=digest).update(ref_count=F('ref_count') + delta)
+
+
+def retain(name):
+    """blob を参照する列が 1 つ増えたことを記録する。"""
+    _change_ref_count(name, 1)
+
+
+def release(name):
+    """blob を参照する列が 1 つ減ったことを記録する。"""
+    _change_ref_count(name, -1)
+
+
+def find_duplicates(name):
+    """同じ内容のファイルが既に他の行から参照されていれば、その StoredBlob を返す。"""
+    from .models import StoredBlob
+
+    digest = content_hash(name)
+    if not digest:
+        return None
+    return StoredBlob.objects.filter(sha256=digest, ref_count__gt=0).first()
+
+
+def cas_fields(model):
+    """モデルの FileField のうち、CAS ストレージを使っている列の名前。"""
+    return [
+        f.name for f in model._meta.concrete_fields
+        if isinstance(f, FileField) and isinstance(f.storage, ContentAddressedStorage)
+    ]
@@ -0,0 +1,95 @@
+"""バックグラウンドで実行するタスク（project.jobs を参照）。"""
+from django.apps import apps
+
+from . import fragment_cache, images, mail, manifests, releases, uploads
+from .delivery import stored_sha256
+from .jobs import task
+from .middleware import purge_pages
+from .models import Addon, AddonScreenshot, AddonVideo, Announcement, Wiki
+
+# 派生画像（縮小版・WebP）を生成する画像フィールド
+IMAGE_FIELDS = {
+    Addon: ['thumbnail'],
+    AddonScreenshot: ['image'],
+    AddonVideo: ['thumbnail'],
+    Wiki: ['image'],
+    Announcement: ['image'],
+}
+
+# ETag 用にハッシュを計算しておくファイル: (ファイルの列, ハッシュの列)
+HASH_FIELDS = {
+    Addon: [('download_file', 'download_sha256')],
+    AddonVideo: [('video_file', 'video_sha256')],
+}
+
+# 処理対象の列。ここに含まれる列が変わったら process_media を登録する
+MEDIA_FIELDS = {
+    model: IMAGE_FIELDS.get(model, []) + [file_attr for file_attr, _ in HASH_FIELDS.get(model, [])]
+    for model in IMAGE_FIELDS.keys() | HASH_FIELDS.keys()
+}
+
+
+# 処理が終わったら捨てるページキャッシュ（project.middleware.purge_pages の URL 名）
+PAGE_CACHE_VIEWS = {
+    Addon: ['home', 'addon_list'],
+    Wiki: ['wiki_list'],
+    Announcement: ['announcement'],
+}
+
+
+def _purge_caches(model, pk):
+    # update() ではシグナルが飛ばないので、処理前に描画した HTML（元の画像や処理中の表示）をここで捨てる。
+    # 断片キャッシュの世代は DB にあるので Web のプロセスにも届くが、ページキャッシュの世代はキャッシュにあるので、
+    # REDIS_URL が無い（LocMemCache）ときは ANONYMOUS_PAGE_CACHE_TIMEOUT が過ぎるまで古いページが残る
+    if model is Addon:
+        fragment_cache.invalidate(pk)
+    elif model in (AddonScreenshot, AddonVideo):
+        addon_id = model._default_manager.filter(pk=pk).values_list('addon_id', flat=True).first()
+        if addon_id:
+            fragment_cache.invalidate(addon_id)
+    purge_pages(*PAGE_CACHE_VIEWS.get(model, []))
+
+
+def _set_media_status(model, pk, status):
+    if any(f.name == 'media_status' for f in model._meta.concrete_fields):
+        model._default_manager.filter(pk=pk).update(media_status=status)
+    if status in ('ready', 'failed'):
+        _purge_caches(model, pk)
+
+
+def mark_media_failed(model, pk):
+    _set_media_status(apps.get_model(model), pk, 'failed')
+
+
+@task('process_media', on_failure=mark_media_failed)
+def process_media(model, pk):
+    """アップロードされたファイルの後処理（派生画像の生成・ハッシュの計算・manifest.json の読み取り・リリースの記録）。
+
+    model は 'project.addon' のようなラベル。
+    """
+    model = apps.get_model(model)
+    instance = model._default_manager.filter(pk=pk).first()
+    if instance is None:
+        return
+    _set_media_status(model, pk, 'processing')
+    for field_name in IMAGE_FIELDS.get(model, []):
+        images.ensure_derivatives(getattr(instance, field_name))
+    for file_attr, hash_attr in HASH_FIELDS.get(model, []):
+        if getattr(instance, file_attr):
+            stored_sha256(instance, file_attr, hash_attr)
+    if model is Addon:
+        manifests.index_addon(instance)
+        releases.record_release(instance)
+    _set_media_status(model, pk, 'ready')
+
+
+@task('send_queued_mail')
+def send_queued_mail():
+    """送信待ちのメールをまとめて送る（失敗したものは定期実行の send_queued_mail コマンドで送り直す）。"""
+    mail.send_queued()
+
+
+@task('store_upload', on_failure=uploads.mark_store_failed)
+def store_upload(session_id):
+    """分割アップロードが揃ったファイルを確かめてストレージに保存する（project/uploads.py を参照）。"""
+    uploads.store_completed(session_id)
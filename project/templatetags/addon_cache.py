@@ -0,0 +1,31 @@
+from django import template
+
+from project import fragment_cache
+
+register = template.Library()
+
+
+class AddonFragmentNode(template.Node):
+    def __init__(self, nodelist, addon, name):
+        self.nodelist = nodelist
+        self.addon = addon
+        self.name = name
+
+    def render(self, context):
+        addon = self.addon.resolve(context)
+        name = self.name.resolve(context)
+        return fragment_cache.get_or_render(addon, name, lambda: self.nodelist.render(context))
+
+
+@register.tag('addonfragment')
+def do_addon_fragment(parser, token):
+    """閲覧者に依存しない部分をアドオン単位でキャッシュする。
+
+    {% addonfragment addon "media" %} ... {% endaddonfragment %}
+    """
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' にはアドオンと断片名を指定してください")
+    nodelist = parser.parse(('endaddonfragment',))
+    parser.delete_first_token()
+    return AddonFragmentNode(nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]))
@@ -0,0 +1,48 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from project import images
+
+register = template.Library()
+
+
+def _srcset(fieldfile, manifest, key):
+    storage = fieldfile.storage
+    return ', '.join(f'{storage.url(entry[key])} {entry["width"]}w' for entry in manifest.values())
+
+
+@register.filter
+def derivative_url(fieldfile, size='card'):
+    """派生画像の URL。未生成なら元画像の URL を返す。{{ video.thumbnail|derivative_url:"detail" }}"""
+    if not fieldfile:
+        return ''
+    entry = images.load_manifest(fieldfile).get(size)
+    return fieldfile.storage.url(entry['fallback']) if entry else fieldfile.url
+
+
+@register.simple_tag
+def responsive_image(fieldfile, size='card', alt='', sizes='', **attrs):
+    """派生画像の srcset（WebP + JPEG/PNG）付きの <picture> を出力する。
+
+    {% responsive_image addon.thumbnail "card" alt=addon.name style="..." %}
+    img の data-full には元画像の URL を入れる（拡大表示用）。派生画像が無ければ通常の <img>。
+    """
+    if not fieldfile:
+        return ''
+    attrs.setdefault('loading', 'lazy')
+    extra = format_html_join('', ' {}="{}"', sorted(attrs.items()))
+    manifest = images.load_manifest(fieldfile)
+    if not manifest:
+        return format_html('<img src="{}" alt="{}" data-full="{}"{}>', fieldfile.url, alt, fieldfile.url, extra)
+
+    entry = manifest.get(size) or list(manifest.values())[-1]
+    sizes = sizes or f'(max-width: 768px) 100vw, {entry["width"]}px'
+    return format_html(
+        '<picture style="display: contents;">'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" data-full="{}"{}>'
+        '</picture>',
+        _srcset(fieldfile, manifest, 'webp'), sizes,
+        fieldfile.storage.url(entry['fallback']), _srcset(fieldfile, manifest, 'fallback'), sizes,
+        alt, fieldfile.url, extra,
+    )
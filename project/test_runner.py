@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class QueryBudgetTestRunner(DiscoverRunner):
+    """テスト中は QUERY_BUDGETS を超えたリクエストを例外にする（project/metrics.py）。
+
+    `manage.py test` でも `django-admin test` でも TEST_RUNNER から使われる。
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.QUERY_BUDGET_RAISE = True
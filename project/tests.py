@@ -0,0 +1,360 @@
+import io
+import json
+import tempfile
+import zipfile
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.db.models.signals import pre_save
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+
+from . import delivery, fragment_cache, manifests, stats, tasks
+from .models import Addon, AddonScreenshot, AddonVideo, BanRecord, Comment, UploadSession, Wiki
+from .pagination import encode_cursor, paginate_keyset
+
+
+class AddonDetailQueryCountTests(TestCase):
+    """アドオン詳細ページの SQL 件数がスクリーンショット・動画・コメントの件数に依存しないこと。"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('commenter', password='x')
+        self.empty = self.make_addon('empty', 0)
+        self.one = self.make_addon('one', 1)
+        self.full = self.make_addon('full', 10)
+
+    def make_addon(self, slug, related):
+        addon = Addon.objects.create(
+            name=slug, slug=slug, description='説明', version='1.0.0', author='作者',
+            download_file=f'addons/files/{slug}.mcpack',
+        )
+        for i in range(related):
+            AddonScreenshot.objects.create(addon=addon, image=f'addons/screenshots/{slug}-{i}.png', order=i)
+            AddonVideo.objects.create(addon=addon, video_type='youtube', video_url=f'https://www.youtube.com/watch?v={slug}{i}', order=i)
+            Comment.objects.create(addon=addon, user=self.user, text=f'コメント {i}')
+        return addon
+
+    def get_detail(self, addon):
+        # 断片キャッシュに無い（初めて描画する）ときの件数を比べる
+        cache.clear()
+        response = self.client.get(reverse('addon_detail', args=[addon.slug]))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def count_queries(self, addon):
+        with CaptureQueriesContext(connection) as queries:
+            self.get_detail(addon)
+        return len(queries)
+
+    def assert_constant_queries(self):
+        self.get_detail(self.empty)
+        empty = self.count_queries(self.empty)
+        one = self.count_queries(self.one)
+        with self.assertNumQueries(one):
+            self.get_detail(self.full)
+        # コメントが 0 件ならコメント一覧のクエリを省くので 1 件少ない
+        self.assertEqual(empty, one - 1)
+
+    def test_anonymous(self):
+        self.assert_constant_queries()
+
+    def test_logged_in(self):
+        self.client.force_login(self.user)
+        self.assert_constant_queries()
+
+
+class FragmentCacheTests(TestCase):
+    def test_comment_edit_replaces_cached_fragment(self):
+        user = User.objects.create_user('commenter', password='x')
+        addon = Addon.objects.create(
+            name='addon', slug='addon', description='説明', version='1.0.0', author='作者',
+            download_file='addons/files/addon.mcpack',
+        )
+        comment = Comment.objects.create(addon=addon, user=user, text='編集前')
+        url = reverse('addon_detail', args=[addon.slug])
+        self.assertContains(self.client.get(url), '編集前')
+        # コメント数も updated_at も変わらない編集。世代は DB にあるので他のプロセスでも同じキーになる
+        comment.text = '編集後'
+        comment.save()
+        self.assertEqual(Addon.objects.get(pk=addon.pk).fragment_version, 2)
+        self.assertContains(self.client.get(url), '編集後')
+
+
+    def test_media_processing_changes_key(self):
+        addon = Addon.objects.create(
+            name='addon', slug='addon', description='説明', version='1.0.0', author='作者',
+            download_file='addons/files/addon.mcpack',
+        )
+        screenshot = AddonScreenshot.objects.create(addon=addon, image='addons/screenshots/addon.png')
+        before = fragment_cache.fragment_key(Addon.objects.get(pk=addon.pk), 'media')
+        # ワーカーは update() で書き込むのでシグナルは飛ばない
+        tasks._set_media_status(AddonScreenshot, screenshot.pk, 'ready')
+        self.assertNotEqual(fragment_cache.fragment_key(Addon.objects.get(pk=addon.pk), 'media'), before)
+
+
+
+class SiteStatisticsTests(TestCase):
+    def test_flush_during_save_is_counted_once(self):
+        addon = Addon.objects.create(
+            name='addon', slug='addon', description='説明', version='1.0.0', author='作者',
+            download_file='addons/files/addon.mcpack', addon_type='behavior', downloads=10,
+        )
+
+        def flush(sender, instance, **kwargs):
+            # 保存前のスナップショットを取った後に flush_download_counts が走った場合
+            Addon.objects.filter(pk=instance.pk).update(downloads=F('downloads') + 5)
+            stats.add_downloads({instance.pk: 5})
+
+        pre_save.connect(flush, sender=Addon)
+        self.addCleanup(pre_save.disconnect, flush, sender=Addon)
+        addon.addon_type = 'resource'
+        addon.save()
+
+        self.assertEqual(stats.site_totals()['by_type'], {'behavior': (0, 0), 'resource': (1, 15)})
+
+
+@override_settings(QUERY_BUDGET_RAISE=True)
+class QueryBudgetTests(TestCase):
+    """QUERY_BUDGETS の上限内に収まること（超えると InstrumentationMiddleware が QueryBudgetExceeded を送出する）。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='x')
+        for i in range(25):
+            addon = Addon.objects.create(
+                name=f'addon {i}', slug=f'addon-{i}', description='説明', version='1.0.0', author='作者',
+                download_file=f'addons/files/addon-{i}.mcpack', owner=cls.user,
+            )
+            Comment.objects.create(addon=addon, user=cls.user, text='コメント')
+            Wiki.objects.create(title=f'ページ {i}', slug=f'page-{i}', content='内容', created_by=cls.user, updated_by=cls.user)
+
+    def assert_within_budget(self):
+        urls = [
+            reverse('home'),
+            reverse('addon_list'),
+            reverse('addon_detail', args=['addon-0']),
+            reverse('addon_comments', args=['addon-0']),
+            reverse('wiki_list'),
+            reverse('wiki_detail', args=['page-0']),
+        ]
+        for url in urls:
+            cache.clear()
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_anonymous(self):
+        self.assert_within_budget()
+
+    def test_logged_in(self):
+        self.client.force_login(self.user)
+        self.assert_within_budget()
+
+
+class UploadSessionTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(
+            UPLOAD_CHUNK_DIR=directory.name, MEDIA_ROOT=directory.name, UPLOAD_CHUNK_SIZE=4, UPLOAD_MAX_SESSIONS=2,
+            JOB_QUEUE_ASYNC=False,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def start(self):
+        return self.client.post(reverse('upload_session_create'), {'filename': 'a.mcpack', 'size': 8})
+
+    def test_malformed_content_length(self):
+        session_id = self.start().json()['id']
+        url = reverse('upload_session_chunk', args=[session_id, 0])
+        response = self.client.put(url, b'abcd', content_type='application/octet-stream', CONTENT_LENGTH='abc')
+        self.assertEqual(response.status_code, 400)
+
+    def test_open_sessions_are_limited(self):
+        self.assertEqual(self.start().status_code, 201)
+        self.assertEqual(self.start().status_code, 201)
+        self.assertEqual(self.start().status_code, 429)
+
+    def test_completed_upload_is_stored_by_the_job(self):
+        session_id = self.start().json()['id']
+        for offset, chunk in ((0, b'abcd'), (4, b'efgh')):
+            url = reverse('upload_session_chunk', args=[session_id, offset])
+            self.client.put(url, chunk, content_type='application/octet-stream')
+        # 保存はジョブ（JOB_QUEUE_ASYNC=False ならコミット後）で行い、complete のリクエストでは行わない
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('upload_session_complete', args=[session_id]))
+            self.assertEqual(response.json()['status'], 'storing')
+        session = UploadSession.objects.get(pk=session_id)
+        self.assertEqual(session.status, 'complete')
+        with Addon._meta.get_field('download_file').storage.open(session.stored_file) as f:
+            self.assertEqual(f.read(), b'abcdefgh')
+
+        response = self.client.post(reverse('addon_upload'), {
+            'name': 'addon', 'slug': 'addon', 'description': '説明', 'addon_type': 'behavior', 'version': '1.0.0',
+            'author': '作者', 'minecraft_version': '1.21+', 'published': 'on', 'upload_session': session_id,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Addon.objects.get(slug='addon').download_file.name, session.stored_file)
+        self.assertFalse(UploadSession.objects.exists())
+
+
+class BanRecordTests(TestCase):
+    def test_changing_expiry_clears_processed_at(self):
+        user = User.objects.create_user('banned', password='x', is_active=False)
+        record = BanRecord.objects.create(user=user, expires_at=now() - timedelta(hours=1))
+        call_command('unban_expired', stdout=StringIO())
+        record.refresh_from_db()
+        self.assertIsNotNone(record.processed_at)
+
+        # 管理画面で期限を延ばしてから、その期限も過ぎた場合
+        user.is_active = False
+        user.save()
+        record.expires_at = now() - timedelta(minutes=1)
+        record.save()
+        self.assertIsNone(record.processed_at)
+        call_command('unban_expired', stdout=StringIO())
+        user.refresh_from_db()
+        self.assertTrue(user.is_active)
+
+
+class ManifestTests(SimpleTestCase):
+    def zip_bytes(self, members):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for name, data in members.items():
+                archive.writestr(name, data)
+        return buffer.getvalue()
+
+    def manifest(self, name):
+        return json.dumps({'header': {'name': name, 'uuid': name, 'version': [1, 0, 0]}, 'modules': [{'type': 'data'}]})
+
+    def test_reads_nested_archives(self):
+        pack = self.zip_bytes({'manifest.json': self.manifest('inner')})
+        addon = self.zip_bytes({'manifest.json': self.manifest('outer'), 'packs/inner.mcpack': pack})
+        result = manifests.read_manifests(io.BytesIO(addon))
+        self.assertEqual([m['path'] for m in result], ['manifest.json', 'packs/inner.mcpack/manifest.json'])
+
+    def test_skips_highly_compressed_nested_archive(self):
+        # 展開すると 10MB になるが、圧縮後は数 KB の「入れ子のアーカイブ」
+        addon = self.zip_bytes({'manifest.json': self.manifest('outer'), 'bomb.mcpack': b'\0' * (10 * 1024 * 1024)})
+        with self.assertLogs('project.manifests', 'WARNING') as logs:
+            result = manifests.read_manifests(io.BytesIO(addon))
+        self.assertEqual([m['path'] for m in result], ['manifest.json'])
+        self.assertIn('bomb.mcpack', logs.output[0])
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(5):
+            Addon.objects.create(
+                name=f'addon {i}', slug=f'addon-{i}', description='説明', version='1.0.0', author='作者',
+                download_file=f'addons/files/addon-{i}.mcpack',
+            )
+        # created_at が同じ行は id で順序が決まる
+        Addon.objects.update(created_at=now())
+
+    def test_equal_created_at_is_broken_by_id(self):
+        queryset = Addon.objects.order_by('-created_at')
+        expected = list(queryset.order_by('-created_at', '-id').values_list('pk', flat=True))
+        seen, pages, cursor = [], [], None
+        while True:
+            page = paginate_keyset(queryset, 2, cursor)
+            pages.append(page)
+            seen += [addon.pk for addon in page]
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, expected)
+
+        # 最後のページから前に戻っても同じ行になる
+        previous = paginate_keyset(queryset, 2, pages[-1].previous_cursor)
+        self.assertEqual([addon.pk for addon in previous], [addon.pk for addon in pages[-2]])
+
+    def test_bad_cursor(self):
+        queryset = Addon.objects.order_by('-created_at')
+        for cursor in ('!!!', encode_cursor(['not a date', 1], 'next'), encode_cursor([1], 'next'), encode_cursor([1, 1], 'up')):
+            with self.subTest(cursor=cursor), self.assertRaises(Http404):
+                paginate_keyset(queryset, 2, cursor)
+        with self.settings(KEYSET_PAGINATION=True):
+            self.assertEqual(self.client.get(reverse('addon_list'), {'cursor': '!!!'}).status_code, 404)
+
+
+class WikiListPaginationTests(TestCase):
+    def test_page_links_keep_query(self):
+        user = User.objects.create_user('writer', password='x')
+        for i in range(25):
+            Wiki.objects.create(title=f'ページ {i}', slug=f'page-{i}', content='内容', created_by=user, updated_by=user)
+        response = self.client.get(reverse('wiki_list'), {'q': 'ページ'})
+        self.assertContains(response, '?q=%E3%83%9A%E3%83%BC%E3%82%B8&amp;page=2')
+
+
+@override_settings(FILE_DELIVERY_BACKEND='django')
+class RangeRequestTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(MEDIA_ROOT=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.file = Addon().download_file
+        self.file.save('addon.mcpack', ContentFile(b'0123456789'), save=False)
+        self.sha256 = delivery.file_sha256(self.file)
+        self.etag = f'"{self.sha256}"'
+
+    def get(self, **headers):
+        request = RequestFactory().get('/', headers=headers)
+        response = delivery.serve_file(request, self.file, sha256=self.sha256)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, body
+
+    def test_single_range(self):
+        response, body = self.get(range='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, b'2345')
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+
+    def test_suffix_range(self):
+        response, body = self.get(range='bytes=-3')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, b'789')
+        self.assertEqual(response['Content-Range'], 'bytes 7-9/10')
+
+    def test_multiple_ranges(self):
+        response, body = self.get(range='bytes=0-1, 4-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response['Content-Type'].startswith('multipart/byteranges; boundary='))
+        self.assertEqual(int(response['Content-Length']), len(body))
+        self.assertIn(b'Content-Range: bytes 0-1/10\r\n\r\n01\r\n', body)
+        self.assertIn(b'Content-Range: bytes 4-5/10\r\n\r\n45\r\n', body)
+
+    def test_unsatisfiable_range(self):
+        response, _body = self.get(range='bytes=20-30')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_malformed_range_returns_whole_file(self):
+        for header in ('bytes=5-2', 'bytes=a-b', 'items=0-1'):
+            with self.subTest(range=header):
+                response, body = self.get(range=header)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(body, b'0123456789')
+
+    def test_if_range(self):
+        response, body = self.get(range='bytes=2-5', if_range=self.etag)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, b'2345')
+        # ファイルが変わっていたら（ETag が違えば）全体を返す
+        response, body = self.get(range='bytes=2-5', if_range='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, b'0123456789')
@@ -0,0 +1,205 @@
+"""大きなアドオンファイルの分割アップロード（途中から再開できる）。
+
+1. POST   /upload/sessions/                       {"filename", "size", "sha256"(任意)} → セッションを作る
+2. PUT    /upload/sessions/<id>/chunks/<offset>/  本文にチャンク、X-Chunk-SHA256 にその SHA-256
+3. GET    /upload/sessions/<id>/                  受信済みバイト数（途中から再開するときに使う）
+4. POST   /upload/sessions/<id>/complete/         全体のサイズを確かめて、ストレージへの保存をジョブに登録する
+   （ワーカーが全体の SHA-256 を確かめて保存すると status が complete になるので、3 で待つ）
+5. アップロードフォームの upload_session に ID を入れて送信すると、保存済みのファイルが download_file になる
+
+チャンクは UPLOAD_CHUNK_SIZE ごとに区切り、先頭から順に送る（受信済みの範囲は送り直してもよい）。
+受け取ったチャンクは UPLOAD_CHUNK_DIR の一時ファイルに直接書き込み、メモリにはまとめて載せない。
+最大 UPLOAD_MAX_SIZE のファイルを読み直すのはジョブ（store_upload）だけで、Web のリクエストでは行わない。
+放置されたセッションは `manage.py cleanup_uploads` で削除する。
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.utils.timezone import now
+
+from .jobs import enqueue
+
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def chunk_size():
+    return getattr(settings, 'UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024)
+
+
+def partial_path(session):
+    directory = getattr(settings, 'UPLOAD_CHUNK_DIR', os.path.join(tempfile.gettempdir(), 'addon-uploads'))
+    return os.path.join(directory, f'{session.pk}.part')
+
+
+def sessions_for(request):
+    """リクエストのユーザー（未ログインならブラウザのセッション）が持つアップロードセッション。"""
+    from .models import UploadSession
+
+    if request.user.is_authenticated:
+        return UploadSession.objects.filter(user=request.user)
+    if not request.session.session_key:
+        return UploadSession.objects.none()
+    return UploadSession.objects.filter(user=None, session_key=request.session.session_key)
+
+
+def start_session(request, filename, size, sha256=''):
+    from .models import UploadSession
+
+    filename = posixpath.basename(str(filename).replace('\\', '/'))[:200]
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError('size が不正です')
+    if not filename:
+        raise UploadError('filename が必要です')
+    max_size = getattr(settings, 'UPLOAD_MAX_SIZE', 1024 * 1024 * 1024)
+    if size <= 0 or size > max_size:
+        raise UploadError(f'ファイルサイズは {max_size} バイトまでです', status=413)
+    sha256 = str(sha256 or '').lower()
+    if sha256 and len(sha256) != 64:
+        raise UploadError('sha256 が不正です')
+
+    if request.user.is_authenticated:
+        owner = {'user': request.user}
+    else:
+        if not request.session.session_key:
+            request.session.save()
+        owner = {'user': None, 'session_key': request.session.session_key}
+    # セッションごとに UPLOAD_MAX_SIZE までのファイルを確保するので、同時に持てる数を制限する
+    max_sessions = getattr(settings, 'UPLOAD_MAX_SESSIONS', 3)
+    if UploadSession.objects.filter(**owner).count() >= max_sessions:
+        raise UploadError(f'同時に進められるアップロードは {max_sessions} 件までです（完了したものを使うか、時間をおいてください）', status=429)
+    session = UploadSession.objects.create(filename=filename, size=size, chunk_size=chunk_size(), sha256=sha256, **owner)
+    os.makedirs(os.path.dirname(partial_path(session)), exist_ok=True)
+    with open(partial_path(session), 'wb') as f:
+        f.truncate(size)
+    return session
+
+
+def write_chunk(session, offset, stream, length, expected_sha256=''):
+    """offset から length バイトのチャンクを stream から読んで書き込む。"""
+    from .models import UploadSession
+
+    if session.status != 'uploading':
+        raise UploadError('このアップロードは既に完了しています', status=409)
+    if offset % session.chunk_size or offset > session.received:
+        # 先頭から順に送ってもらう（received が次のオフセット）
+        raise UploadError(f'オフセット {session.received} から送ってください', status=409)
+    if length != min(session.chunk_size, session.size - offset):
+        raise UploadError('チャンクのサイズが不正です')
+
+    # チェックサムを確かめてからファイルに書く（送り直しで受信済みの範囲を壊さないように）
+    digest = hashlib.sha256()
+    with tempfile.SpooledTemporaryFile(max_size=READ_SIZE * 16) as buffer:
+        remaining = length
+        while remaining:
+            data = stream.read(min(READ_SIZE, remaining))
+            if not data:
+                raise UploadError('チャンクが途中で途切れました')
+            digest.update(data)
+            buffer.write(data)
+            remaining -= len(data)
+        if expected_sha256 and digest.hexdigest() != expected_sha256.lower():
+            raise UploadError('チャンクのチェックサムが一致しません', status=422)
+        buffer.seek(0)
+        with open(partial_path(session), 'r+b') as f:
+            f.seek(offset)
+            for data in iter(lambda: buffer.read(READ_SIZE), b''):
+                f.write(data)
+
+    end = offset + length
+    UploadSession.objects.filter(pk=session.pk, received__lt=end).update(received=end, updated_at=now())
+    session.received = max(session.received, end)
+    return session
+
+
+def complete_session(session):
+    """すべて受け取ったかを確かめて、ストレージへの保存をジョブに登録する。"""
+    from .models import UploadSession
+
+    if session.status != 'uploading':
+        return session
+    if session.received != session.size:
+        raise UploadError(f'まだ {session.size - session.received} バイト残っています', status=409)
+    if UploadSession.objects.filter(pk=session.pk, status='uploading').update(status='storing', updated_at=now()):
+        enqueue('store_upload', session_id=str(session.pk))
+    session.status = 'storing'
+    return session
+
+
+def store_completed(session_id):
+    """受け取ったファイル全体の SHA-256 を確かめて、download_file のストレージに保存する（ワーカーで実行）。"""
+    from .models import Addon, UploadSession
+
+    session = UploadSession.objects.filter(pk=session_id, status='storing').first()
+    if session is None:
+        return
+    field = Addon._meta.get_field('download_file')
+    with open(partial_path(session), 'rb') as f:
+        if session.sha256:
+            digest = hashlib.sha256()
+            for data in iter(lambda: f.read(READ_SIZE), b''):
+                digest.update(data)
+            if digest.hexdigest() != session.sha256:
+                # どこかのチャンクが壊れている。最初から送り直してもらう
+                UploadSession.objects.filter(pk=session.pk).update(status='uploading', received=0, updated_at=now())
+                return
+            f.seek(0)
+        name = field.storage.save(field.generate_filename(None, session.filename), File(f, name=session.filename))
+    UploadSession.objects.filter(pk=session.pk).update(status='complete', stored_file=name, updated_at=now())
+    os.remove(partial_path(session))
+
+
+def mark_store_failed(session_id):
+    """保存に失敗し続けたときは、complete をもう一度呼べるように戻す。"""
+    from .models import UploadSession
+
+    UploadSession.objects.filter(pk=session_id, status='storing').update(status='uploading', updated_at=now())
+
+
+def discard(session, delete_stored=False):
+    """セッションと一時ファイルを削除する。delete_stored なら保存済みのファイル（アドオンに使われなかったもの）も消す。"""
+    from .models import Addon
+
+    try:
+        os.remove(partial_path(session))
+    except FileNotFoundError:
+        pass
+    if delete_stored and session.stored_file:
+        Addon._meta.get_field('download_file').storage.delete(session.stored_file)
+    session.delete()
+
+
+def cleanup_stale_sessions(hours=None):
+    """hours 時間以上更新の無いセッションを削除する。削除した数を返す。"""
+    from .models import UploadSession
+
+    hours = getattr(settings, 'UPLOAD_SESSION_TTL_HOURS', 24) if hours is None else hours
+    stale = UploadSession.objects.filter(updated_at__lt=now() - timedelta(hours=hours))
+    count = 0
+    for session in stale.iterator():
+        discard(session, delete_stored=True)
+        count += 1
+    return count
+
+
+def session_json(session):
+    return {
+        'id': str(session.pk),
+        'filename': session.filename,
+        'size': session.size,
+        'chunk_size': session.chunk_size,
+        'received': session.received,
+        'status': session.status,
+    }
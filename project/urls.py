@@ -23,11 +23,19 @@ from .views import (
     AddonListView,
     AddonDetailView,
     download_addon,
+    addon_video,
     publish_addon,
     AddonCreateView,
     AddonUpdateView,
     admin_command_console,
+    metrics_dashboard,
+    metrics_endpoint,
     post_comment,
+    addon_comments,
+    upload_session_create,
+    upload_session_detail,
+    upload_session_chunk,
+    upload_session_complete,
     contact_view,
     contact_toggle_handled,
     contact_reply,
@@ -41,6 +49,11 @@ from .views import (
 )
 
 urlpatterns = [
+    # 管理者用コマンドコンソール（admin.site.urls より先に置かないと管理サイト側で 404 になる）
+    path('admin/commands/', admin_command_console, name='admin_command_console'),
+    # リクエストの計測結果（project/metrics.py）
+    path('admin/metrics/', metrics_dashboard, name='metrics_dashboard'),
+    path('metrics', metrics_endpoint, name='metrics'),
     path('admin/', admin.site.urls),
     # ホームページ
     path('', HomeView.as_view(), name='home'),
@@ -48,11 +61,18 @@ urlpatterns = [
     path('addons/', AddonListView.as_view(), name='addon_list'),
     path('addons/<slug:slug>/', AddonDetailView.as_view(), name='addon_detail'),
     path('addons/<slug:slug>/download/', download_addon, name='download_addon'),
+    path('addons/<slug:slug>/videos/<int:pk>/', addon_video, name='addon_video'),
     path('addons/<slug:slug>/publish/', publish_addon, name='publish_addon'),
     # アップロードフォーム
     path('upload/', AddonCreateView.as_view(), name='addon_upload'),
     path('upload/<slug:slug>/edit/', AddonUpdateView.as_view(), name='addon_edit'),
+    # 大きなファイルの分割アップロード（project/uploads.py）
+    path('upload/sessions/', upload_session_create, name='upload_session_create'),
+    path('upload/sessions/<uuid:pk>/', upload_session_detail, name='upload_session_detail'),
+    path('upload/sessions/<uuid:pk>/chunks/<int:offset>/', upload_session_chunk, name='upload_session_chunk'),
+    path('upload/sessions/<uuid:pk>/complete/', upload_session_complete, name='upload_session_complete'),
     path('addons/<slug:slug>/comment/', post_comment, name='post_comment'),
+    path('addons/<slug:slug>/comments/', addon_comments, name='addon_comments'),
     path('contact/', contact_view, name='contact'),
     path('contact/toggle/<int:pk>/', contact_toggle_handled, name='contact_toggle_handled'),
     path('contact/reply/<int:pk>/', contact_reply, name='contact_reply'),
@@ -65,8 +85,6 @@ urlpatterns = [
     path('wiki/<slug:slug>/edit/', WikiUpdateView.as_view(), name='wiki_edit'),
     path('accounts/', include('allauth.urls')),
     path('tinymce/', include('tinymce.urls')),
-    # 管理者用コマンドコンソール
-    path('admin/commands/', admin_command_console, name='admin_command_console'),
 ]
 
 # メディアファイルの配信（開発環境用）
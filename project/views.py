@@ -1,5 +1,6 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import FileResponse, HttpResponseRedirect
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse
+from django.views.decorators.http import require_GET, require_POST, require_http_methods
 from django.views.generic import ListView, DetailView, TemplateView
 from django.views.generic.edit import CreateView, UpdateView
 from django.contrib import messages
@@ -7,17 +8,27 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
 from django.db.models import Q
-from django.db import ProgrammingError, OperationalError
+from django.db import ProgrammingError, OperationalError, transaction
+from django.utils.functional import SimpleLazyObject
 from django.utils.text import slugify
 from django.contrib.admin.views.decorators import staff_member_required
-from .models import Addon, Comment, ContactMessage
+from .models import Addon, AddonVideo, Comment, ContactMessage
 from .forms import AddonForm, CommentForm
 from .forms import ContactForm, ReportForm, WikiForm
+from .delivery import serve_file, stored_sha256
+from .search import search_addons
+from .manifests import engine_code
+from .releases import find_delta
+from .storage import content_hash
+from . import bans, mail, metrics, ranking, uploads
+from .pagination import KeysetPaginationMixin, paginate_keyset
+from .stats import site_totals
 from .models import TermsPage, Report, Announcement, Wiki
-from django.core.mail import send_mail
 from django.conf import settings
 from django.utils.timezone import now
 from datetime import timedelta
+import hmac
+import json
 import re
 from .models import BanRecord
 from django.contrib.auth.decorators import login_required
@@ -33,8 +44,10 @@ class HomeView(TemplateView):
         # 一時的に例外を握りつぶして空のデータでフォールバックする。
         try:
             context['latest_addons'] = Addon.objects.filter(published=True)[:6]
-            context['addon_count'] = Addon.objects.filter(published=True).count()
-            context['total_downloads'] = sum(a.downloads for a in Addon.objects.filter(published=True))
+            # 件数・合計ダウンロード数は集計テーブルから読む（project/stats.py）
+            totals = site_totals()
+            context['addon_count'] = totals['addon_count']
+            context['total_downloads'] = totals['total_downloads']
         except (ProgrammingError, OperationalError):
             # 本番DBにテーブルがない等の初期化前の状態向けフォールバック
             context['latest_addons'] = []
@@ -43,7 +56,7 @@ class HomeView(TemplateView):
         return context
 
 
-class AddonListView(ListView):
+class AddonListView(KeysetPaginationMixin, ListView):
     """アドオン一覧"""
     model = Addon
     template_name = 'addon_list.html'
@@ -53,34 +66,48 @@ class AddonListView(ListView):
     def get_queryset(self):
         queryset = Addon.objects.filter(published=True)
         
-        # 検索
+        # 検索（全文検索インデックスを使う。project/search.py を参照）。関連度は関連度順のときだけ計算する
         query = self.request.GET.get('q')
+        sort = ranking.sort_key(self.request.GET.get('sort', ''), query)
         if query:
-            queryset = queryset.filter(
-                Q(name__icontains=query) |
-                Q(author__icontains=query) |
-                Q(description__icontains=query)
-            )
+            queryset = search_addons(queryset, query, rank=sort == ranking.RELEVANCE)
         
         # フィルタリング
         addon_type = self.request.GET.get('type')
         if addon_type:
             queryset = queryset.filter(addon_type=addon_type)
+
+        # 対応バージョン・パック UUID（manifest.json から読み取った値。project/manifests.py を参照）
+        engine = engine_code(self.request.GET.get('engine', ''))
+        if engine:
+            queryset = queryset.filter(min_engine_code__lte=engine)
+        pack_uuid = self.request.GET.get('pack', '').strip().lower()
+        if pack_uuid:
+            queryset = queryset.filter(packs__uuid=pack_uuid).distinct()
         
-        # ソート
-        sort_by = self.request.GET.get('sort', '-created_at')
-        queryset = queryset.order_by(sort_by)
-        
-        return queryset
+        # ソート（決められた並び順だけ。知らない値は新着順。project/ranking.py を参照）
+        return ranking.order_addons(queryset, sort)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['addon_types'] = Addon.ADDON_TYPE_CHOICES
         context['current_type'] = self.request.GET.get('type', '')
         context['search_query'] = self.request.GET.get('q', '')
+        context['sort_choices'] = ranking.sort_choices()
+        context['current_sort'] = ranking.sort_key(self.request.GET.get('sort', ''), self.request.GET.get('q'))
+        context['current_engine'] = self.request.GET.get('engine', '')
         return context
 
 
+COMMENTS_PAGE_SIZE = 20
+
+
+def comment_page(addon, cursor=None):
+    """アドオンのコメントを新しい順に 1 ページ分返す（created_at, id のカーソル）。"""
+    comments = Comment.objects.filter(addon=addon).select_related('user').order_by('-created_at', '-id')
+    return paginate_keyset(comments, COMMENTS_PAGE_SIZE, cursor, count=False)
+
+
 class AddonDetailView(DetailView):
     """アドオン詳細"""
     model = Addon
@@ -89,6 +116,7 @@ class AddonDetailView(DetailView):
     slug_field = 'slug'
     
     def get_queryset(self):
+        # 関連データ（スクリーンショット・動画・コメント）は get_context_data で 1 種類 1 クエリずつ読む
         return Addon.objects.filter(published=True)
     
     def get_context_data(self, **kwargs):
@@ -96,15 +124,18 @@ class AddonDetailView(DetailView):
         addon = self.object
         user = self.request.user
 
-        # スクリーンショット一覧
+        # スクリーンショット・動画・コメントは断片キャッシュ（addonfragment）に無いときだけ
+        # テンプレートから評価されるよう、遅延評価のまま渡す（各 1 クエリ）
         context['screenshots'] = addon.screenshots.all()
+        context['videos'] = addon.videos.all()
+        # コメントは最初のページだけ描画し、続きはスクロール時に addon_comments から読み込む
+        context['comment_page'] = SimpleLazyObject(lambda: comment_page(addon))
 
-        # ログインしているかチェックして安全に処理
-        context['is_owner'] = user.is_authenticated and addon.owner == user
+        # ログインしているかチェックして安全に処理（owner を読み込まないよう id で比較）
+        context['is_owner'] = user.is_authenticated and addon.owner_id == user.pk
         # Provide both names so templates using either 'form' or 'comment_form' work
         context['comment_form'] = CommentForm()
         context['form'] = context['comment_form']
-        context['comments'] = Comment.objects.filter(addon=addon).order_by('-created_at')
 
         return context
 
@@ -113,25 +144,48 @@ class AddonDetailView(DetailView):
 def download_addon(request, slug):
     """アドオンをダウンロード"""
     addon = get_object_or_404(Addon, slug=slug, published=True)
-    addon.increment_downloads()
-    
-    # ファイルをレスポンスとして返す
-    file_handle = addon.download_file.open('rb')
-    response = FileResponse(file_handle)
-    # ファイル名がパスを含む可能性があるためbasenameを取得
-    import os
-    from urllib.parse import quote
-    filename = os.path.basename(addon.download_file.name)
-    # Set both filename (ascii fallback) and filename* (UTF-8) for modern browsers
-    try:
-        filename_ascii = filename.encode('ascii')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    except UnicodeEncodeError:
-        response['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(filename)}"
+    # ?from=<手元のバージョン> なら、差分パッケージがあればそれを返す（project/releases.py を参照）
+    delta = find_delta(addon, request.GET['from']) if request.GET.get('from') else None
+    if delta is not None:
+        response = serve_file(request, delta.file, as_attachment=True, sha256=content_hash(delta.file.name))
+    else:
+        response = serve_file(
+            request, addon.download_file, as_attachment=True,
+            sha256=stored_sha256(addon, 'download_file', 'download_sha256'),
+        )
+    # 304 や途中からの再開（Range）は新しいダウンロードとして数えない
+    if response.status_code == 200 or response.get('Content-Range', '').startswith('bytes 0-'):
+        addon.increment_downloads()
     return response
 
 
-class AddonCreateView(CreateView):
+def addon_video(request, slug, pk):
+    """アップロードされた動画ファイルを配信する"""
+    video = get_object_or_404(
+        AddonVideo, pk=pk, addon__slug=slug, addon__published=True, video_type='file'
+    )
+    if not video.video_file:
+        raise Http404('動画ファイルがありません')
+    return serve_file(
+        request, video.video_file, sha256=stored_sha256(video, 'video_file', 'video_sha256')
+    )
+
+
+class UploadSessionFormMixin:
+    """分割アップロード（project/uploads.py）したファイルをフォームで受け取れるようにする"""
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['upload_sessions'] = uploads.sessions_for(self.request)
+        return kwargs
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['upload_chunk_size'] = uploads.chunk_size()
+        return context
+
+
+class AddonCreateView(UploadSessionFormMixin, CreateView):
     """アドオンをアップロードするフォームビュー"""
     model = Addon
     form_class = AddonForm
@@ -153,10 +207,12 @@ class AddonCreateView(CreateView):
             instance.slug = slug
         instance.save()
         form.save_m2m()
+        if form.upload_session is not None:
+            uploads.discard(form.upload_session)
         return HttpResponseRedirect(instance.get_absolute_url())
 
 
-class AddonUpdateView(LoginRequiredMixin, UpdateView):
+class AddonUpdateView(LoginRequiredMixin, UploadSessionFormMixin, UpdateView):
     """アドオンを編集（所有者のみ）"""
     model = Addon
     form_class = AddonForm
@@ -177,10 +233,71 @@ class AddonUpdateView(LoginRequiredMixin, UpdateView):
             instance.owner = self.request.user
         instance.save()
         form.save_m2m()
+        if form.upload_session is not None:
+            uploads.discard(form.upload_session)
         messages.success(self.request, 'アドオン情報を更新しました。')
         return HttpResponseRedirect(instance.get_absolute_url())
 
 
+def _upload_error(error, session=None):
+    data = {'error': str(error)}
+    if session is not None:
+        data.update(uploads.session_json(session))
+    return JsonResponse(data, status=error.status)
+
+
+@require_POST
+def upload_session_create(request):
+    """分割アップロードを始める（project/uploads.py を参照）"""
+    try:
+        data = json.loads(request.body or b'{}') if request.content_type == 'application/json' else request.POST
+        session = uploads.start_session(request, data.get('filename', ''), data.get('size'), data.get('sha256', ''))
+    except ValueError:
+        return JsonResponse({'error': 'JSON が不正です'}, status=400)
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    return JsonResponse(uploads.session_json(session), status=201)
+
+
+@require_GET
+def upload_session_detail(request, pk):
+    """アップロードの進み具合（再開するときのオフセット）"""
+    session = get_object_or_404(uploads.sessions_for(request), pk=pk)
+    return JsonResponse(uploads.session_json(session))
+
+
+@require_http_methods(['PUT'])
+def upload_session_chunk(request, pk, offset):
+    """チャンクを 1 つ受け取る。本文は読みながら一時ファイルに書き込む"""
+    session = get_object_or_404(uploads.sessions_for(request), pk=pk)
+    try:
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            raise uploads.UploadError('Content-Length が不正です')
+        uploads.write_chunk(session, offset, request, length, request.headers.get('X-Chunk-SHA256', ''))
+    except uploads.UploadError as e:
+        return _upload_error(e, session)
+    return JsonResponse(uploads.session_json(session))
+
+
+@require_POST
+def upload_session_complete(request, pk):
+    session = get_object_or_404(uploads.sessions_for(request), pk=pk)
+    try:
+        uploads.complete_session(session)
+    except uploads.UploadError as e:
+        return _upload_error(e, session)
+    return JsonResponse(uploads.session_json(session))
+
+
+def addon_comments(request, slug):
+    """コメント一覧の続き（HTML 断片）を返す。詳細ページの無限スクロールから呼ばれる。"""
+    addon = get_object_or_404(Addon, slug=slug, published=True)
+    page = comment_page(addon, request.GET.get('cursor'))
+    return render(request, 'comment_list.html', {'addon': addon, 'comment_page': page})
+
+
 @login_required
 def post_comment(request, slug):
     addon = get_object_or_404(Addon, slug=slug, published=True)
@@ -224,6 +341,7 @@ def admin_command_console(request):
     /unban username                       -> BAN解除
     /banlist                              -> 現在のBAN一覧
     /kick username                        -> 一時的にキック（メッセージのみ）
+    /cachestats [reset]                   -> 詳細ページの断片キャッシュのヒット率
     """
     output = []
     if request.method == 'POST':
@@ -263,17 +381,28 @@ def admin_command_console(request):
                         u = User.objects.get(username=username)
                         u.is_active = True
                         u.save(update_fields=['is_active'])
-                        # mark current ban records expired
-                        BanRecord.objects.filter(user=u, expires_at__isnull=True).update(expires_at=now())
+                        # 有効な BAN（永久・期限付き）をすべて今で期限切れにする（ユーザーは戻したので処理済みにする）
+                        BanRecord.objects.filter(user=u).filter(bans.active_q()).update(expires_at=now(), processed_at=now())
+                        # update() ではシグナルが飛ばないので、BAN のキャッシュを直接捨てる
+                        bans.invalidate(u.pk)
                         output.append(f'ユーザー {username} のBANを解除しました')
                     except User.DoesNotExist:
                         output.append(f'ユーザー {username} が見つかりません')
                 else:
                     output.append('使い方: /unban username')
             elif cmd.startswith('/banlist'):
-                bans = BanRecord.objects.all()[:50]
-                for b in bans:
+                records = BanRecord.objects.all()[:50]
+                for b in records:
                     output.append(f'{b.user.username} by {b.banned_by.username if b.banned_by else "system"} expires={b.expires_at}')
+            elif cmd.startswith('/cachestats'):
+                # アドオン詳細ページの断片キャッシュのヒット率（/cachestats reset で 0 に戻す）
+                from . import fragment_cache
+                if cmd.split()[1:2] == ['reset']:
+                    fragment_cache.reset_stats()
+                    output.append('断片キャッシュの統計をリセットしました')
+                else:
+                    st = fragment_cache.stats()
+                    output.append(f'断片キャッシュ: hits={st["hits"]} misses={st["misses"]} hit_ratio={st["hit_ratio"]:.1%}')
             elif cmd.startswith('/kick'):
                 parts = cmd.split()
                 if len(parts) >= 2:
@@ -286,6 +415,22 @@ def admin_command_console(request):
     return render(request, 'admin/command_console.html', {'output': output})
 
 
+@staff_member_required
+def metrics_dashboard(request):
+    """URL 名ごとの SQL 件数・DB 時間・描画時間・処理時間の一覧（スタッフ用）。"""
+    rows = metrics.dashboard_rows(metrics.collect())
+    return render(request, 'admin/metrics.html', {'rows': rows})
+
+
+def metrics_endpoint(request):
+    """Prometheus 形式の集計。スタッフか、METRICS_TOKEN を Authorization: Bearer で送ったときだけ見られる。"""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorization = request.headers.get('Authorization', '')
+    if not (request.user.is_staff or (token and hmac.compare_digest(authorization, f'Bearer {token}'))):
+        return HttpResponse(status=403)
+    return HttpResponse(metrics.prometheus_text(metrics.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 def contact_view(request):
     """問い合わせページ。フォーム送信をDBの `ContactMessage` に保存し、管理画面で確認できるようにする。"""
     from .models import ContactMessage
@@ -317,7 +462,7 @@ def contact_view(request):
     # 管理者向けに最近の問い合わせ一覧も渡す
     contact_list = None
     if request.user.is_staff:
-        contact_list = ContactMessage.objects.all().order_by('-created_at')[:200]
+        contact_list = ContactMessage.objects.all().order_by('-created_at').prefetch_related('replies__replied_by', 'replies__emails')[:200]
     else:
         # ログインユーザーは自分が送った問い合わせ（メール一致）を表示
         if request.user.is_authenticated:
@@ -349,7 +494,8 @@ def contact_reply(request, pk):
       - reply_subject (任意)
       - reply_message (必須)
     送信元は settings.DEFAULT_FROM_EMAIL を使い、送信先は問い合わせのメールアドレス。
-    送信成功時は問い合わせを対応済みにして handled_by を設定する。
+    メールはその場では送らず送信キューに入れ（project.mail）、問い合わせを対応済みにして handled_by を設定する。
+    送信状況は返信履歴に表示される。
     """
     from django.shortcuts import get_object_or_404
     if request.method != 'POST':
@@ -365,23 +511,21 @@ def contact_reply(request, pk):
     # 送信元アドレス
     from_addr = getattr(settings, 'DEFAULT_FROM_EMAIL', None) or cm.email
 
-    try:
-        send_mail(reply_subject, reply_message, from_addr, [cm.email], fail_silently=False)
+    with transaction.atomic():
         # マーク対応済み
         cm.handled = True
         cm.handled_by = request.user
         cm.save(update_fields=['handled', 'handled_by'])
         # DBに返信を保存
         from .models import ContactReply
-        ContactReply.objects.create(
+        reply = ContactReply.objects.create(
             contact=cm,
             subject=reply_subject,
             message=reply_message,
             replied_by=request.user
         )
-        messages.success(request, f'返信を送信しました: {cm.email}')
-    except Exception as e:
-        messages.error(request, f'返信の送信に失敗しました: {e}')
+        mail.queue_mail(reply_subject, reply_message, [cm.email], from_email=from_addr, reply=reply)
+    messages.success(request, f'返信を送信キューに入れました: {cm.email}')
 
     return redirect('contact')
 
@@ -418,7 +562,7 @@ def report_view(request):
     return render(request, 'report.html', {'form': form})
 
 
-class WikiListView(ListView):
+class WikiListView(KeysetPaginationMixin, ListView):
     """Wiki ページ一覧"""
     model = Wiki
     template_name = 'wiki_list.html'
@@ -426,7 +570,8 @@ class WikiListView(ListView):
     paginate_by = 20
 
     def get_queryset(self):
-        queryset = Wiki.objects.all()
+        # 一覧に作成者名を表示するので、ページごとに 1 クエリで読み込む
+        queryset = Wiki.objects.select_related('created_by')
         query = self.request.GET.get('q')
         if query:
             queryset = queryset.filter(
@@ -448,6 +593,10 @@ class WikiDetailView(DetailView):
     context_object_name = 'wiki'
     slug_field = 'slug'
 
+    def get_queryset(self):
+        # 作成者・更新者の名前を表示するので一緒に読み込む
+        return Wiki.objects.select_related('created_by', 'updated_by')
+
 
 class WikiCreateView(LoginRequiredMixin, CreateView):
     """Wiki ページ作成"""